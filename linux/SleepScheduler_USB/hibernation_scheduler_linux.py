@@ -2,7 +2,6 @@
 import sys
 import os
 import time
-import subprocess
 import json
 from datetime import datetime, timedelta
 import tkinter as tk
@@ -13,6 +12,46 @@ import threading
 import getpass
 from pathlib import Path
 
+# Общие модули лежат рядом со скриптом (установка в /opt) или уровнем выше (исходники)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+for _module_dir in (APP_DIR, os.path.dirname(APP_DIR)):
+    if _module_dir not in sys.path:
+        sys.path.append(_module_dir)
+
+import control_api
+import history_store
+import sleep_planner
+import task_model
+import task_planner
+import timeline_view
+import tk_watchdog
+import status_reporter
+import privileged_helper
+from control_client import ControlClient
+from history_store import HistoryStore
+from power_actions import ResumeWatcher
+from schedule_model import (
+    ACTIONS, make_task, validate_task, task_title, next_task_fires
+)
+
+# GUI работает от имени пользователя: свои данные - в его каталогах,
+# операции с правами root выполняет privileged_helper (sleep-scheduler-helper.socket)
+RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
+DATA_DIR = os.path.expanduser("~/.local/share/sleep-scheduler")
+CACHE_DIR = os.path.expanduser("~/.cache/sleep-scheduler")
+CONTROL_SOCKET = os.path.join(RUNTIME_DIR, "sleep-scheduler.sock")
+HISTORY_FILE = os.path.join(DATA_DIR, "history.sqlite")
+FIRED_FILE = os.path.join(DATA_DIR, "fired.json")
+DEBUG_DIR = os.path.join(CACHE_DIR, "debug")
+REPORT_SPOOL = os.path.join(CACHE_DIR, "report-spool")
+# Ожидание ответа помощника; действие питания может выполняться дольше
+HELPER_TIMEOUT = 10
+ACTION_TIMEOUT = 60
+# Названия действий и повторов - только для интерфейса и файла, решения - по кодам task_model
+POWER_LABELS = [task_model.ACTION_LABELS[code] for code in task_model.POWER_ACTIONS]
+TASK_ACTION_LABELS = POWER_LABELS + [task_model.ACTION_LABELS[task_model.AUTO_MODE]]
+REPEAT_CHOICES = [task_model.REPEAT_LABELS[mask] for mask in task_model.REPEAT_ORDER]
+
 # Фикс для отображения GUI на некоторых Linux-системах
 if 'DISPLAY' not in os.environ:
     os.environ['DISPLAY'] = ':0'
@@ -36,27 +75,6 @@ def resource_path(relative_path):
     
     return full_path
 
-# Проверка прав доступа (корректный запуск с root-правами)
-if os.geteuid() != 0:
-    print("Перезапуск приложения с правами root...")
-    try:
-        # Используем pkexec для графического запроса пароля
-        result = subprocess.run(
-            ['pkexec', sys.executable] + sys.argv,
-            stdin=sys.stdin,
-            stdout=sys.stdout,
-            stderr=sys.stderr
-        )
-        sys.exit(result.returncode)
-    except Exception as e:
-        print(f"Ошибка при перезапуске: {e}")
-        messagebox.showerror(
-            "Ошибка запуска", 
-            f"Не удалось запустить с правами root: {str(e)}\n"
-            "Попробуйте запустить в терминале: \nsudo sleep-scheduler"
-        )
-    sys.exit(1)
-
 # Инициализация графической среды
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
@@ -101,25 +119,39 @@ class SchedulerApp(ctk.CTk):
         self.tabview.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
         self.tabview.add("Управление")
         self.tabview.add("Планировщик")
+        self.tabview.add("План")
         self.tabview.add("Настройки")
         
         self.control_tab = self.tabview.tab("Управление")
         self.schedule_tab = self.tabview.tab("Планировщик")
+        self.timeline_tab = self.tabview.tab("План")
         self.settings_tab = self.tabview.tab("Настройки")
         
         # Инициализация интерфейса
         self.setup_control_tab()
         self.setup_schedule_tab()
+        self.setup_timeline_tab()
         self.setup_settings_tab()
         
         # Загрузка настроек
-        self.settings_file = "/etc/sleep-scheduler.json"
+        self.settings_file = privileged_helper.SETTINGS_FILE
         self.settings = {
             "time_format": "24ч",
             "autostart": 1,
             "schedules": []
         }
+        # Задачи меняются из GUI, планировщика и API управления
+        self.schedules_lock = threading.RLock()
+        # Отложенные действия: id -> (таймер, действие, время выполнения)
+        self.pending_actions = {}
+        self.pending_counter = 0
+        self.control_server = None
+        self.reporter = None
+        # Выполненные срабатывания задач - чтобы ничего не сработало дважды
+        self.fired = task_planner.FiredLog(FIRED_FILE)
+        self.open_history()
         self.load_settings()
+        self.start_reporter()
 
         # Флаг работы фонового потока
         self.running = True
@@ -128,6 +160,13 @@ class SchedulerApp(ctk.CTk):
         self.check_thread = threading.Thread(target=self.check_scheduled_events, daemon=True)
         self.check_thread.start()
         
+        # Сторож цикла событий и профилирование по сигналу (SIGUSR1/SIGUSR2)
+        self.watchdog = tk_watchdog.LoopWatchdog(self, DEBUG_DIR, log=self.print_log)
+        self.watchdog.start()
+        self.diagnostics = tk_watchdog.Diagnostics(DEBUG_DIR, log=self.print_log)
+        self.diagnostics.install_signals()
+        
+        self.start_control_server()
         self.print_log(f"Приложение запущено под {self.get_system_info()}")
 
     def print_log(self, message):
@@ -142,8 +181,7 @@ class SchedulerApp(ctk.CTk):
             self.control_tab.grid_rowconfigure(i, weight=0 if i < 5 else 1)
             
         # Кнопки действий
-        actions = ["Выключить", "Перезагрузка", "Сон", "Гибернация"]
-        for i, action in enumerate(actions):
+        for i, action in enumerate(POWER_LABELS):
             btn = ctk.CTkButton(
                 self.control_tab,
                 text=action,
@@ -191,10 +229,10 @@ class SchedulerApp(ctk.CTk):
         # Выбор действия
         ctk.CTkLabel(form_frame, text="Действие:", anchor="w").grid(
             row=row, column=0, padx=5, pady=5, sticky="w")
-        self.action_var = tk.StringVar(value="Выключить")
+        self.action_var = tk.StringVar(value=POWER_LABELS[0])
         action_menu = ctk.CTkComboBox(
             form_frame,
-            values=["Выключить", "Перезагрузка", "Сон", "Гибернация"],
+            values=TASK_ACTION_LABELS,
             variable=self.action_var,
             width=150
         )
@@ -215,10 +253,10 @@ class SchedulerApp(ctk.CTk):
         # Выбор повторения
         ctk.CTkLabel(form_frame, text="Повтор:", anchor="w").grid(
             row=row, column=4, padx=5, pady=5, sticky="w")
-        self.repeat_var = tk.StringVar(value="Один раз")
+        self.repeat_var = tk.StringVar(value=REPEAT_CHOICES[0])
         repeat_menu = ctk.CTkComboBox(
             form_frame,
-            values=["Один раз", "Ежедневно", "По будням", "По выходным"],
+            values=REPEAT_CHOICES,
             variable=self.repeat_var,
             width=150
         )
@@ -241,6 +279,34 @@ class SchedulerApp(ctk.CTk):
         self.task_scroll.grid_columnconfigure(0, weight=1)
         self.task_container = self.task_scroll
 
+    def setup_timeline_tab(self):
+        """Вкладка плана: срабатывания задач и отложенные действия на 7 дней"""
+        ctk.CTkLabel(
+            self.timeline_tab,
+            text="▮ задача   ▮ отложенное действие   | сейчас  (наведите на метку для подробностей)",
+            font=("Arial", 11), anchor="w"
+        ).pack(fill="x", padx=10, pady=(5, 0))
+        canvas = tk.Canvas(
+            self.timeline_tab, highlightthickness=0,
+            bg="#242424" if ctk.get_appearance_mode() == "Dark" else "#ebebeb"
+        )
+        canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        self.timeline = timeline_view.Timeline(canvas)
+        self.after(60000, self.tick_timeline)
+
+    def refresh_timeline(self):
+        """Перерисовка изменившихся событий шкалы (только из потока Tk)"""
+        now = datetime.now()
+        with self.schedules_lock:
+            tasks = list(self.settings.get("schedules", []))
+            pending = dict(self.pending_actions)
+        self.timeline.set_events(timeline_view.task_events(tasks, pending, now), now)
+
+    def tick_timeline(self):
+        """Сдвиг отметки "сейчас" и удаление прошедших событий раз в минуту"""
+        self.refresh_timeline()
+        self.after(60000, self.tick_timeline)
+
     def setup_settings_tab(self):
         """Настройка вкладки с параметрами"""
         self.settings_tab.grid_columnconfigure(0, weight=1)
@@ -342,6 +408,15 @@ class SchedulerApp(ctk.CTk):
             fg_color="#5BC0DE"
         )
         self.reload_btn.pack(side="left", padx=20)
+        
+        self.export_btn = ctk.CTkButton(
+            btn_frame,
+            text="Экспорт в systemd",
+            command=self.export_systemd,
+            width=200,
+            height=40
+        )
+        self.export_btn.pack(side="left", padx=20)
 
     def get_system_info(self):
         """Получение информации об ОС"""
@@ -365,35 +440,50 @@ class SchedulerApp(ctk.CTk):
             self.log(f"Ошибка получения системной информации: {str(e)}")
             return "Неизвестная Linux-система"
 
-    def execute_action(self, action):
-        """Выполнение действия с системой"""
-        # Команды для Linux систем
-        commands = {
-            "Выключить": "systemctl poweroff",
-            "Перезагрузка": "systemctl reboot",
-            "Сон": "systemctl suspend",
-            "Гибернация": "systemctl hibernate"
-        }
+    def execute_action(self, action, source=history_store.MANUAL):
+        """Выполнение действия с системой (source - ID задачи или manual)"""
+        if task_model.ACTION_BY_LABEL.get(action) == task_model.AUTO_MODE:
+            action = self.plan_auto(source)
         
         custom_msg = ""
-        if action == "Гибернация":
-            # Проверка поддержки гибернации
-            if subprocess.run("systemctl hibernate".split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL).returncode != 0:
-                custom_msg = "\n\n⚠️ Гибернация не настроена!\nТребуется:\n1. Достаточный размер swap-раздела\n2. Настройка ядра\nПопробуйте: sudo systemctl hibernate"
+        if task_model.ACTION_BY_LABEL.get(action) == task_model.HIBERNATE:
+            custom_msg = "\n\n⚠️ Гибернация не настроена?\nТребуется:\n1. Достаточный размер swap-раздела\n2. Настройка ядра\nПопробуйте: sudo systemctl hibernate"
         
-        self.log(f"Инициировано: {action}{custom_msg}")
+        self.log(f"Инициировано: {action}")
+        self.emit_event("action_started", action=action)
         
         # Запускаем команду с задержкой 1с для отправки лога
         def delayed_execute():
             time.sleep(1)
+            if self.reporter:
+                self.reporter.suspend()
             try:
-                subprocess.run(commands[action].split(), check=True)
+                # systemctl выполняет помощник с правами root
+                self.helper_call("power.action", timeout=ACTION_TIMEOUT, action=action)
+                self.record_history(history_store.FIRED, action, source)
+                self.emit_event("action_done", action=action)
             except Exception as e:
                 self.log(f"Ошибка выполнения: {str(e)}{custom_msg}")
+                self.record_history(history_store.FAILED, action, source, str(e))
+                self.emit_event("action_failed", action=action, error=str(e))
                 messagebox.showerror("Ошибка действия", f"{str(e)}{custom_msg}")
         
         threading.Thread(target=delayed_execute, daemon=True).start()
 
+    def plan_auto(self, source):
+        """Выбор режима сна для "Авто"; у задач нет времени включения - срок неизвестен"""
+        decision = sleep_planner.plan(None)
+        try:
+            if task_model.ACTION_BY_LABEL.get(decision["mode"]) == task_model.SUSPEND_HIBERNATE \
+                    and decision.get("delay"):
+                self.helper_call("sleep.hibernate_delay", seconds=max(60, int(decision["delay"])))
+        except Exception as e:
+            self.log(f"Задержка гибернации не задана: {str(e)}")
+        self.record_history(history_store.PLANNED, decision["mode"], source,
+                            json.dumps(decision, ensure_ascii=False, default=str))
+        self.log(f"Авто: {sleep_planner.describe(decision)} ({decision['reason']})")
+        return decision["mode"]
+
     def log(self, message):
         """Логирование в текстовом поле"""
         timestamp = datetime.now().strftime("[%H:%M:%S]")
@@ -413,10 +503,10 @@ class SchedulerApp(ctk.CTk):
         
         ctk.CTkLabel(dialog, text="Выберите действие:", font=("Arial", 14)).pack(pady=10)
         
-        action_var = tk.StringVar(value="Выключить")
+        action_var = tk.StringVar(value=POWER_LABELS[0])
         action_menu = ctk.CTkComboBox(
             dialog,
-            values=["Выключить", "Перезагрузка", "Сон", "Гибернация"],
+            values=TASK_ACTION_LABELS,
             variable=action_var,
             width=200
         )
@@ -449,9 +539,7 @@ class SchedulerApp(ctk.CTk):
                     raise ValueError("Отрицательное время")
                 
                 if minutes > 0:
-                    self.log(f"Запланировано '{action}' через {minutes} мин.")
-                    # Планируем выполнение в отдельном потоке
-                    threading.Timer(minutes * 60, self.execute_action, args=[action]).start()
+                    self.schedule_pending(action, minutes)
                     messagebox.showinfo(
                         "Действие запланировано", 
                         f"{action} будет выполнен через {minutes} минут"
@@ -476,82 +564,88 @@ class SchedulerApp(ctk.CTk):
             command=dialog.destroy, fg_color="gray", width=120
         ).pack(side="right", padx=20)
 
+    def schedule_pending(self, action, minutes):
+        """Отложенное выполнение действия, возвращает ID для отмены"""
+        with self.schedules_lock:
+            self.pending_counter += 1
+            pending_id = self.pending_counter
+            due = datetime.now() + timedelta(minutes=minutes)
+            timer = threading.Timer(minutes * 60, self.run_pending, args=[pending_id])
+            timer.daemon = True
+            self.pending_actions[pending_id] = (timer, action, due)
+            timer.start()
+        self.after(0, self.refresh_timeline)
+        self.log(f"Запланировано '{action}' через {minutes} мин.")
+        self.record_history(history_store.DEFERRED, action, detail=f"{minutes} мин")
+        self.emit_event("action_pending", id=pending_id, action=action, due=due.isoformat())
+        return pending_id
+
+    def run_pending(self, pending_id):
+        """Срабатывание отложенного действия"""
+        with self.schedules_lock:
+            pending = self.pending_actions.pop(pending_id, None)
+        self.after(0, self.refresh_timeline)
+        if pending:
+            self.execute_action(pending[1])
+
+    def cancel_pending(self, ids=None):
+        """Отмена отложенных действий (всех, если ids не заданы)"""
+        with self.schedules_lock:
+            targets = list(self.pending_actions) if ids is None else [i for i in ids if i in self.pending_actions]
+            cancelled = []
+            for pending_id in targets:
+                timer, action, _ = self.pending_actions.pop(pending_id)
+                timer.cancel()
+                cancelled.append(pending_id)
+                self.log(f"Отменено отложенное действие: {action}")
+                self.emit_event("action_cancelled", id=pending_id, action=action)
+        if cancelled and self.running:
+            self.after(0, self.refresh_timeline)
+        return cancelled
+
     def add_schedule(self):
         """Добавление задачи в планировщик"""
-        action = self.action_var.get()
-        time_str = self.time_var.get()
-        repeat = self.repeat_var.get()
-        
         try:
-            # Проверка формата времени
-            datetime.strptime(time_str, "%H:%M")
-            
-            # Генерируем уникальный ID задания
-            task_id = f"{action}-{time_str}-{int(time.time())}"
-            task_name = f"{action} в {time_str} ({repeat})"
-            
-            # Создаем UI элемент задачи
-            task_frame = ctk.CTkFrame(
-                self.task_container, 
-                fg_color=("gray90", "gray10")
-            )
-            task_frame.pack(fill="x", padx=5, pady=2)
-            
-            ctk.CTkLabel(
-                task_frame, text=task_name, 
-                font=("Arial", 12),
-                anchor="w"
-            ).pack(side="left", padx=10, pady=5, fill="x", expand=True)
-            
-            delete_btn = ctk.CTkButton(
-                task_frame, 
-                text="Удалить", 
-                width=80,
-                height=24,
-                font=("Arial", 10),
-                fg_color="#D9534F",
-                hover_color="#C9302C",
-                command=lambda t=task_id, f=task_frame: self.delete_schedule(t, f)
-            )
-            delete_btn.pack(side="right", padx=5, pady=2)
-            
-            # Сохраняем задачу в настройках
-            self.settings["schedules"].append({
-                "id": task_id,
-                "action": action,
-                "time": time_str,
-                "repeat": repeat
-            })
-            
-            self.save_settings()
-            self.log(f"Добавлена задача: {task_name}")
-            
+            with self.schedules_lock:
+                existing_ids = {t["id"] for t in self.settings["schedules"]}
+                task = make_task(self.action_var.get(), self.time_var.get(),
+                                 self.repeat_var.get(), existing_ids)
+                self.settings["schedules"].append(task)
         except ValueError:
             messagebox.showerror("Ошибка", "Неверный формат времени!\nИспользуйте ЧЧ:ММ (например 22:30)")
+            return
+        
+        self.add_task_ui(task)
+        self.mark_conflicts()
+        self.refresh_timeline()
+        self.save_settings()
+        self.log(f"Добавлена задача: {task_title(task)}")
+        self.emit_event("task_added", task=task)
+        self.warn_conflicts([task], show=True)
 
     def delete_schedule(self, task_id, frame):
         """Удаление задачи из планировщика"""
-        self.settings["schedules"] = [t for t in self.settings["schedules"] if t["id"] != task_id]
+        with self.schedules_lock:
+            self.settings["schedules"] = [t for t in self.settings["schedules"] if t["id"] != task_id]
         frame.destroy()
+        self.mark_conflicts()
+        self.refresh_timeline()
         self.save_settings()
         self.log(f"Задача удалена")
+        self.emit_event("task_removed", id=task_id)
 
     def check_scheduled_events(self):
         """Фоновая проверка задач по расписанию"""
         while self.running:
-            now = datetime.now().strftime("%H:%M")
-            
-            # Проверяем каждое задание
-            for task in list(self.settings["schedules"]):
-                if self.should_execute(task, now):
-                    self.log(f"Выполнение по расписанию: {task['action']}")
-                    self.execute_action(task["action"])
-                    
-                    # Удаляем разовые задания
-                    if task["repeat"] == "Один раз":
-                        self.settings["schedules"].remove(task)
-                        self.save_settings()
-                        self.remove_task_from_ui(task["id"])
+            try:
+                with self.schedules_lock:
+                    tasks = list(self.settings["schedules"])
+                due = task_planner.due_tasks(tasks, datetime.now(), self.fired)
+                if due:
+                    self.run_due(due)
+            except Exception as e:
+                # Ошибка одной проверки не должна останавливать планировщик
+                self.log(f"Ошибка проверки расписания: {str(e)}")
             
             # Проверяем каждые 15 секунд
             for _ in range(15):
@@ -559,22 +653,33 @@ class SchedulerApp(ctk.CTk):
                     break
                 time.sleep(1)
 
-    def should_execute(self, task, current_time):
-        """Определяет, нужно ли выполнять задачу сейчас"""
-        if task["time"] != current_time:
-            return False
-            
-        today = datetime.today()
-        weekday = today.weekday()  # 0=пн, 6=вс
+    def run_due(self, due):
+        """Выполнение одного действия за все совпавшие задачи"""
+        (task, occurrence), merged = task_planner.resolve(due)
+        try:
+            # Отмечаем до выполнения: после перезагрузки задача не повторится
+            self.fired.add([(t["id"], moment) for t, moment in due])
+        except OSError as e:
+            self.log(f"Ошибка записи выполненных задач: {str(e)}")
+        for other, _ in merged:
+            self.log(f"Задача поглощена: {task_title(other)} -> {task['action']}")
+            self.emit_event("task_merged", task=other, into=task["id"])
+            self.record_history(history_store.MERGED, other["action"], other["id"], task["id"])
         
-        if task["repeat"] == "Ежедневно":
-            return True
-        elif task["repeat"] == "По будням":
-            return weekday < 5  # Пн-Пт
-        elif task["repeat"] == "По выходным":
-            return weekday >= 5  # Сб-Вс
-        else:  # Один раз
-            return True
+        self.log(f"Выполнение по расписанию: {task['action']}")
+        self.emit_event("task_fired", task=task)
+        self.record_history(history_store.SCHEDULED, task["action"], task["id"])
+        self.execute_action(task["action"], task["id"])
+        
+        # Удаляем разовые задания
+        one_shot = [t for t, _ in due if task_model.REPEAT_BY_LABEL[t["repeat"]] == task_model.ONE_SHOT]
+        if one_shot:
+            with self.schedules_lock:
+                self.settings["schedules"] = [t for t in self.settings["schedules"] if t not in one_shot]
+            self.save_settings()
+            for t in one_shot:
+                self.after(0, self.remove_task_from_ui, t["id"])
+            self.after(0, self.mark_conflicts)
 
     def remove_task_from_ui(self, task_id):
         """Удаляет задачу из интерфейса"""
@@ -594,6 +699,10 @@ class SchedulerApp(ctk.CTk):
         except Exception as e:
             self.log(f"Ошибка загрузки настроек: {str(e)}")
         finally:
+            valid, invalid = task_planner.split_valid(self.settings.get("schedules", []))
+            for task, error in invalid:
+                self.log(f"Задача пропущена: {task} ({error})")
+            self.settings["schedules"] = valid
             self.update_ui_from_settings()
 
     def update_ui_from_settings(self):
@@ -603,42 +712,93 @@ class SchedulerApp(ctk.CTk):
             widget.destroy()
             
         for task in self.settings.get("schedules", []):
-            task_frame = ctk.CTkFrame(
-                self.task_container, 
-                fg_color=("gray90", "gray10")
-            )
-            task_frame.pack(fill="x", padx=5, pady=2)
-            task_frame.task_id = task["id"]  # Сохраняем ID для последующего удаления
-            
-            task_name = f"{task['action']} в {task['time']} ({task['repeat']})"
-            ctk.CTkLabel(
-                task_frame, text=task_name, 
-                font=("Arial", 12),
-                anchor="w"
-            ).pack(side="left", padx=10, pady=5, fill="x", expand=True)
-            
-            delete_btn = ctk.CTkButton(
-                task_frame, 
-                text="Удалить", 
-                width=80,
-                height=24,
-                font=("Arial", 10),
-                fg_color="#D9534F",
-                hover_color="#C9302C",
-                command=lambda t=task['id'], f=task_frame: self.delete_schedule(t, f)
+            self.add_task_ui(task)
+        self.mark_conflicts()
+        self.refresh_timeline()
+
+    def add_task_ui(self, task):
+        """Добавление строки задачи в список"""
+        task_frame = ctk.CTkFrame(
+            self.task_container, 
+            fg_color=("gray90", "gray10")
+        )
+        task_frame.pack(fill="x", padx=5, pady=2)
+        task_frame.task_id = task["id"]  # Сохраняем ID для последующего удаления
+        
+        task_frame.title_label = ctk.CTkLabel(
+            task_frame, text=task_title(task), 
+            font=("Arial", 12),
+            anchor="w"
+        )
+        task_frame.title_label.pack(side="left", padx=10, pady=5, fill="x", expand=True)
+        task_frame.task = task
+        
+        delete_btn = ctk.CTkButton(
+            task_frame, 
+            text="Удалить", 
+            width=80,
+            height=24,
+            font=("Arial", 10),
+            fg_color="#D9534F",
+            hover_color="#C9302C",
+            command=lambda t=task['id'], f=task_frame: self.delete_schedule(t, f)
+        )
+        delete_btn.pack(side="right", padx=5, pady=2)
+
+    def task_conflicts(self):
+        """Конфликты между текущими задачами"""
+        with self.schedules_lock:
+            return task_planner.conflicts(list(self.settings["schedules"]))
+
+    def mark_conflicts(self):
+        """Пометка конфликтующих задач в списке"""
+        found = self.task_conflicts()
+        for widget in self.task_container.winfo_children():
+            if not hasattr(widget, 'title_label'):
+                continue
+            title = task_title(widget.task)
+            if widget.task_id in found:
+                widget.title_label.configure(text=f"⚠ {title}", text_color="#E0A800")
+            else:
+                widget.title_label.configure(text=title, text_color=("gray10", "gray90"))
+
+    def warn_conflicts(self, tasks, show=False):
+        """Предупреждение о задачах, совпадающих с добавленными"""
+        found = self.task_conflicts()
+        with self.schedules_lock:
+            by_id = {t["id"]: t for t in self.settings["schedules"]}
+        lines = []
+        for task in tasks:
+            others = [by_id[i] for i in sorted(found.get(task["id"], ())) if i in by_id]
+            if others:
+                lines.append(f"{task_title(task)} совпадает с: " + ", ".join(task_title(t) for t in others))
+        if not lines:
+            return
+        for line in lines:
+            self.log(f"Конфликт задач: {line}")
+        if show:
+            messagebox.showwarning(
+                "Конфликт задач",
+                "\n".join(lines) + "\n\nВ одно время выполняется одно действие "
+                "(Выключить > Перезагрузка > Гибернация > Авто > Сон), "
+                "задача в пределах нескольких минут после сна может не выполниться."
             )
-            delete_btn.pack(side="right", padx=5, pady=2)
+
+    def helper_call(self, method, timeout=HELPER_TIMEOUT, **params):
+        """Операция с правами root: через помощник, а если GUI сам под root и помощника нет - в процессе"""
+        if os.path.exists(privileged_helper.HELPER_SOCKET):
+            with ControlClient(privileged_helper.HELPER_SOCKET, timeout=timeout) as client:
+                return client.call(method, **params)
+        if os.geteuid() == 0:
+            return privileged_helper.call_local(method, **params)
+        raise RuntimeError("Помощник sleep-scheduler-helper не установлен (запустите install.sh)")
 
     def save_settings(self):
-        """Сохраняем настройки в файл"""
+        """Сохраняем настройки в /etc через помощник"""
         try:
-            # Создаем временный файл для безопасной записи
-            temp_file = self.settings_file + ".tmp"
-            with open(temp_file, "w") as f:
-                json.dump(self.settings, f, indent=2)
-            
-            # Заменяем оригинальный файл
-            os.replace(temp_file, self.settings_file)
+            with self.schedules_lock:
+                settings = json.loads(json.dumps(self.settings))
+            self.helper_call("settings.write", settings=settings)
             self.log("Настройки успешно сохранены")
             return True
         except Exception as e:
@@ -646,29 +806,243 @@ class SchedulerApp(ctk.CTk):
             messagebox.showerror(
                 "Ошибка сохранения", 
                 f"Не удалось сохранить настройки: {str(e)}\n"
-                "Убедитесь, что программа запущена с правами администратора"
+                f"Убедитесь, что вы в группе {privileged_helper.ALLOWED_GROUP} и служба "
+                "sleep-scheduler-helper.socket включена"
             )
             return False
 
     def restart_service(self):
         """Перезапуск системного сервиса (для применения настроек)"""
         try:
-            subprocess.run(["systemctl", "daemon-reload"], check=True)
+            self.helper_call("systemd.reload")
             self.log("Системные службы обновлены")
             messagebox.showinfo("Службы обновлены", "Настройки были успешно применены")
-        except subprocess.CalledProcessError as e:
+        except Exception as e:
             self.log(f"Ошибка перезагрузки служб: {str(e)}")
             messagebox.showerror("Ошибка", f"Не удалось обновить службы: {str(e)}")
 
+    def export_systemd(self):
+        """Экспорт задач в таймеры systemd, после чего приложение можно закрыть"""
+        try:
+            # Помощник экспортирует сохраненный /etc/sleep-scheduler.json
+            if not self.save_settings():
+                return
+            result = self.helper_call("systemd.export", timeout=ACTION_TIMEOUT)
+            changed, removed = result["changed"], result["removed"]
+            self.log(f"Экспорт в systemd: записано {len(changed)}, удалено {len(removed)} юнитов")
+            messagebox.showinfo(
+                "Экспорт в systemd",
+                "Расписание перенесено в таймеры systemd.\n"
+                "Приложение можно закрыть - задачи выполнит systemd."
+            )
+        except Exception as e:
+            self.log(f"Ошибка экспорта в systemd: {str(e)}")
+            messagebox.showerror("Ошибка", f"Не удалось экспортировать расписание: {str(e)}")
+
+    def start_control_server(self):
+        """Запуск API управления на Unix-сокете"""
+        try:
+            self.control_server = control_api.ControlServer(CONTROL_SOCKET, self)
+            self.control_server.start()
+            self.log(f"API управления: {CONTROL_SOCKET}")
+        except Exception as e:
+            self.control_server = None
+            self.log(f"API управления недоступен: {str(e)}")
+
+    def emit_event(self, event_type, **data):
+        """Публикация события для подписчиков API"""
+        if self.control_server:
+            self.control_server.publish(event_type, time=datetime.now().isoformat(), **data)
+        if self.reporter:
+            self.reporter.report(event_type, **data)
+
+    def start_reporter(self):
+        """Отправка состояния сборщику, если в настройках задан report_url"""
+        url = self.settings.get("report_url")
+        if not url:
+            return
+        self.reporter = status_reporter.StatusReporter(url, REPORT_SPOOL, app="sleep-scheduler",
+                                                       status=self.report_status, log=self.print_log)
+        self.reporter.start()
+
+    def report_status(self):
+        """Сводка для сборщика (из потока отправки)"""
+        with self.schedules_lock:
+            tasks = list(self.settings["schedules"])
+            pending = [{"id": pending_id, "action": action, "due": due.isoformat()}
+                       for pending_id, (_, action, due) in sorted(self.pending_actions.items())]
+        fires = next_task_fires(tasks, datetime.now(), 1)
+        return {
+            "tasks": tasks,
+            "pending": pending,
+            "next_fire": {"time": fires[0][0].isoformat(), "task_id": fires[0][1]["id"],
+                          "action": fires[0][1]["action"]} if fires else None,
+        }
+
+    def open_history(self):
+        """Открытие журнала событий и запуск отслеживания пробуждений"""
+        self.history = None
+        self.resume_watcher = None
+        try:
+            self.history = HistoryStore(HISTORY_FILE)
+            self.resume_watcher = ResumeWatcher(self.on_resume)
+            self.resume_watcher.start()
+        except Exception as e:
+            self.print_log(f"Журнал событий недоступен: {e}")
+
+    def record_history(self, kind, action=None, source=None, detail=None):
+        """Запись события в журнал; ошибки журнала не мешают выполнению действий"""
+        if self.history is None:
+            return
+        try:
+            self.history.record(kind, action, source, detail)
+        except Exception as e:
+            self.print_log(f"Ошибка записи в журнал: {e}")
+
+    def on_resume(self, suspended_at, resumed_at, slept):
+        """Пробуждение системы (из потока ResumeWatcher)"""
+        self.history.record_sleep(suspended_at, resumed_at)
+        if self.reporter:
+            self.reporter.resume(suspended_at, resumed_at)
+        self.after(0, self.log, f"Пробуждение после сна: {slept / 60:.0f} мин.")
+
+    # Методы API управления (вызываются из потока сервера)
+
+    def rpc_tasks_list(self):
+        with self.schedules_lock:
+            return {"tasks": list(self.settings["schedules"])}
+
+    def rpc_tasks_add(self, tasks):
+        with self.schedules_lock:
+            existing_ids = {t["id"] for t in self.settings["schedules"]}
+            # Сначала проверяем весь пакет, чтобы не применить его частично
+            created = []
+            for item in tasks:
+                task = make_task(item.get("action"), item.get("time"), item.get("repeat", REPEAT_CHOICES[0]),
+                                 existing_ids)
+                existing_ids.add(task["id"])
+                created.append(task)
+            self.settings["schedules"].extend(created)
+        self.save_settings()
+        for task in created:
+            self.after(0, self.add_task_ui, task)
+            self.log(f"Добавлена задача (API): {task_title(task)}")
+            self.emit_event("task_added", task=task)
+        self.after(0, self.mark_conflicts)
+        self.after(0, self.warn_conflicts, created)
+        found = self.task_conflicts()
+        return {"tasks": created, "conflicts": {
+            task["id"]: sorted(found[task["id"]]) for task in created if task["id"] in found
+        }}
+
+    def rpc_tasks_remove(self, ids):
+        with self.schedules_lock:
+            removed = [t["id"] for t in self.settings["schedules"] if t["id"] in ids]
+            self.settings["schedules"] = [t for t in self.settings["schedules"] if t["id"] not in ids]
+        if removed:
+            self.save_settings()
+            self.after(0, self.update_ui_from_settings)
+        for task_id in removed:
+            self.emit_event("task_removed", id=task_id)
+        return {"removed": removed}
+
+    def rpc_tasks_update(self, tasks):
+        with self.schedules_lock:
+            by_id = {t["id"]: t for t in self.settings["schedules"]}
+            changes = []
+            for item in tasks:
+                if item.get("id") not in by_id:
+                    raise ValueError(f"Задача не найдена: {item.get('id')}")
+                updated = {**by_id[item["id"]], **item}
+                validate_task(updated)
+                changes.append(updated)
+            for updated in changes:
+                by_id[updated["id"]].update(updated)
+        self.save_settings()
+        self.after(0, self.update_ui_from_settings)
+        for updated in changes:
+            self.emit_event("task_updated", task=updated)
+        return {"tasks": changes}
+
+    def rpc_fires_next(self, count=10):
+        with self.schedules_lock:
+            tasks = list(self.settings["schedules"])
+        fires = next_task_fires(tasks, datetime.now(), int(count))
+        return {"fires": [
+            {"time": fire.isoformat(), "task_id": task["id"], "action": task["action"]}
+            for fire, task in fires
+        ]}
+
+    def rpc_actions_execute(self, action, delay_minutes=0):
+        if action not in ACTIONS:
+            raise ValueError(f"Неизвестное действие: {action}")
+        if delay_minutes:
+            return {"pending_id": self.schedule_pending(action, float(delay_minutes))}
+        self.execute_action(action)
+        return {"pending_id": None}
+
+    def rpc_actions_pending(self):
+        with self.schedules_lock:
+            return {"pending": [
+                {"id": pending_id, "action": action, "due": due.isoformat()}
+                for pending_id, (_, action, due) in sorted(self.pending_actions.items())
+            ]}
+
+    def rpc_actions_cancel(self, ids=None):
+        return {"cancelled": self.cancel_pending(ids)}
+
+    def rpc_history_range(self, start, end, kinds=None, limit=100, offset=0):
+        if self.history is None:
+            raise RuntimeError("Журнал событий недоступен")
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+        limit = min(int(limit), 1000)
+        return {
+            "total": self.history.count(start, end, kinds),
+            "events": self.history.query(start, end, kinds, limit, int(offset)),
+        }
+
+    def rpc_history_report(self, days=7):
+        if self.history is None:
+            raise RuntimeError("Журнал событий недоступен")
+        end_date = datetime.now().date() + timedelta(days=1)
+        start_date = end_date - timedelta(days=int(days))
+        compliance = self.history.weekday_compliance(start_date, end_date)
+        return {
+            "hours_asleep": [
+                {"date": date.isoformat(), "hours": round(hours, 2)}
+                for date, hours in self.history.hours_asleep_per_day(start_date, end_date)
+            ],
+            "compliance": [
+                {"weekday": weekday, "done": done, "due": due, "ratio": ratio}
+                for weekday, (done, due, ratio) in sorted(compliance.items())
+            ],
+            "summary": self.history.summary(start_date, end_date),
+        }
+
+    def rpc_debug_profile(self, seconds=10):
+        return self.diagnostics.profile_for(self, float(seconds))
+
+    def rpc_debug_memory(self):
+        return {"path": self.diagnostics.memory_snapshot()}
+
+    def rpc_debug_stats(self):
+        return self.watchdog.stats()
+
     def on_closing(self):
         """Действия при закрытии приложения"""
         self.log("Завершение работы приложения...")
         self.running = False
+        self.cancel_pending()
+        self.watchdog.stop()
+        if self.resume_watcher:
+            self.resume_watcher.stop()
+        if self.control_server:
+            self.control_server.stop()
+        if self.reporter:
+            self.reporter.stop()
         time.sleep(0.5)  # Даем время потокам остановиться
         
-        # Сохраняем настройки только если это основной процесс
-        if os.geteuid() == 0:
-            self.save_settings()
+        self.save_settings()
         
         self.destroy()
         self.print_log("Приложение корректно завершено")
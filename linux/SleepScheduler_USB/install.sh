@@ -5,6 +5,10 @@ APP_NAME="SleepScheduler"
 INSTALL_DIR="/opt/$APP_NAME"
 BIN_PATH="/usr/local/bin/sleep-scheduler"
 DESKTOP_FILE="/usr/share/applications/sleep-scheduler.desktop"
+# Группа пользователей, которым помощник выполняет операции с правами root
+HELPER_GROUP="sleep-scheduler"
+# Общие модули планировщика (в исходниках лежат уровнем выше)
+SHARED_MODULES="schedule_model.py systemd_units.py control_client.py control_api.py history_store.py power_actions.py sleep_planner.py task_model.py task_planner.py energy_meter.py wake_planner.py tk_watchdog.py timeline_view.py status_reporter.py privileged_helper.py"
 
 # Проверка прав
 if [ "$EUID" -ne 0 ]; then
@@ -18,16 +22,31 @@ mkdir -p $INSTALL_DIR
 
 # Копировать файлы
 cp hibernation_scheduler_linux.py "$INSTALL_DIR/"
+for module in $SHARED_MODULES; do
+    cp "../$module" "$INSTALL_DIR/" 2>/dev/null || cp "$module" "$INSTALL_DIR/"
+done
 cp sleep_scheduler.png "$INSTALL_DIR/" 2>/dev/null || true
 
 # Установщик зависимостей
 apt install -y python3-pip python3-tk
 pip3 install customtkinter pillow
 
-# Создать скрипт запуска
+# Привилегированный помощник: запускается systemd по подключению к сокету
+groupadd -f "$HELPER_GROUP"
+if [ -n "$SUDO_USER" ]; then
+    usermod -aG "$HELPER_GROUP" "$SUDO_USER"
+    echo "Пользователь $SUDO_USER добавлен в группу $HELPER_GROUP (войдите в систему заново)"
+fi
+cp sleep-scheduler-helper.socket sleep-scheduler-helper.service /etc/systemd/system/
+# Настройки читает GUI без прав root
+[ -f /etc/sleep-scheduler.json ] && chmod 644 /etc/sleep-scheduler.json
+systemctl daemon-reload
+systemctl enable --now sleep-scheduler-helper.socket
+
+# Создать скрипт запуска (GUI работает без прав root)
 echo '#!/bin/sh
 cd /opt/SleepScheduler
-exec sudo python3 hibernation_scheduler_linux.py' > $BIN_PATH
+exec python3 hibernation_scheduler_linux.py' > $BIN_PATH
 chmod +x $BIN_PATH
 
 # Создать ярлык .desktop
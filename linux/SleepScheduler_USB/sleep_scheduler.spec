@@ -4,7 +4,7 @@ from PyInstaller.utils.hooks import collect_data_files
 block_cipher = None
 
 a = Analysis(['hibernation_scheduler_linux.py'],
-             pathex=[],
+             pathex=['..'],
              binaries=[],
              datas=collect_data_files('customtkinter'),
              hiddenimports=[],
@@ -0,0 +1,296 @@
+"""Прогрев страничного кэша для программ автозапуска
+
+При обычном запуске программы собирается список файлов, которые она
+открыла или отобразила в память (/proc/<pid>/maps и /proc/<pid>/fd всех
+процессов ее сеанса) - без strace и прав root. После загрузки или пробуждения
+эти файлы заранее подгружаются posix_fadvise(WILLNEED) из нескольких
+потоков в пределах бюджета ввода-вывода (объем за прогрев и скорость),
+а программа запускается, как только выданы запросы на ее собственные файлы.
+
+Время запуска - до момента, когда процессы программы перестали открывать
+новые файлы и читать с диска (read_bytes в /proc/<pid>/io) на SETTLE секунд.
+Для каждой программы хранятся последние времена холодного (без профиля)
+и прогретого запуска.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from schedule_model import CONFIG_DIR
+
+PROFILES_FILE = os.path.join(CONFIG_DIR, "warmup.json")
+# Бюджет прогрева: объем за один прогрев и скорость выдачи запросов
+MAX_BYTES = 1024 * 1024 * 1024
+RATE = 64 * 1024 * 1024
+# Файл подгружается кусками - чтобы ограничение скорости работало и на больших файлах
+CHUNK = 8 * 1024 * 1024
+WORKERS = 4
+# Наблюдение за запуском
+POLL = 0.2
+SETTLE = 2.0
+LAUNCH_TIMEOUT = 120
+# Сколько времен запуска хранить
+KEEP_TIMES = 10
+# Программа ждет прогрева своих файлов не дольше
+WAIT_WARMUP = 15
+BOOT_ID = "/proc/sys/kernel/random/boot_id"
+SKIP_PREFIXES = ("/proc/", "/sys/", "/dev/", "/run/", "/tmp/", "/memfd:")
+
+
+def session_pids(sid):
+    """Процессы сеанса sid по /proc/*/stat
+
+    Программа запускается в новом сеансе, поэтому в него попадают и потомки
+    скриптов-запускальщиков, которые сами сразу завершаются.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы
+        fields = stat[stat.rfind(")") + 2:].split()
+        if int(fields[3]) == sid:
+            pids.append(int(entry))
+    return pids
+
+
+def touched_files(pids):
+    """Обычные файлы, отображенные в память или открытые процессами"""
+    files = set()
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/maps") as f:
+                for line in f:
+                    parts = line.split(None, 5)
+                    if len(parts) == 6 and parts[5].startswith("/"):
+                        files.add(parts[5].rstrip("\n"))
+        except OSError:
+            pass
+        try:
+            for fd in os.listdir(f"/proc/{pid}/fd"):
+                try:
+                    target = os.readlink(f"/proc/{pid}/fd/{fd}")
+                except OSError:
+                    continue
+                if target.startswith("/"):
+                    files.add(target)
+        except OSError:
+            pass
+    return {path for path in files
+            if not path.startswith(SKIP_PREFIXES) and not path.endswith(" (deleted)")
+            and os.path.isfile(path)}
+
+
+def read_bytes(pids):
+    """Прочитано с диска процессами (байты)"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/io") as f:
+                for line in f:
+                    if line.startswith("read_bytes:"):
+                        total += int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+def watch_launch(process, timeout=LAUNCH_TIMEOUT, settle=SETTLE, poll=POLL):
+    """Наблюдение за запуском: (секунды до успокоения, затронутые файлы)"""
+    start = time.monotonic()
+    files = set()
+    last_bytes = -1
+    quiet_since = start
+    while True:
+        now = time.monotonic()
+        process.poll()  # не оставляем зомби
+        pids = session_pids(process.pid)
+        new_files = touched_files(pids) - files
+        current_bytes = read_bytes(pids)
+        if new_files or current_bytes != last_bytes:
+            files |= new_files
+            last_bytes = current_bytes
+            quiet_since = now
+        if not pids or now - quiet_since >= settle or now - start >= timeout:
+            return quiet_since - start, files
+        time.sleep(poll)
+
+
+class RateLimiter:
+    """Ограничение скорости выдачи запросов (байт в секунду) для всех потоков"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def acquire(self, size):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + size / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def prefetch_file(path, limiter, chunk=CHUNK):
+    """Подгрузка файла в страничный кэш, возвращает объем"""
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY)
+    try:
+        size = os.fstat(fd).st_size
+        offset = 0
+        while offset < size:
+            length = min(chunk, size - offset)
+            limiter.acquire(length)
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+            offset += length
+        return size
+    finally:
+        os.close(fd)
+
+
+class WarmupProfiles:
+    """Профили программ: затронутые файлы и времена запуска"""
+
+    def __init__(self, path=PROFILES_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"boot_id": None, "programs": {}}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.data.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        self.profiles = self.data["programs"]
+
+    def get(self, program):
+        with self.lock:
+            return dict(self.profiles.get(program, {}))
+
+    def update(self, program, seconds, files, warm):
+        """Запись результата запуска; список файлов обновляется после каждого запуска"""
+        with self.lock:
+            profile = self.profiles.setdefault(program, {"files": [], "cold": [], "warm": []})
+            # Объединяем со старым профилем: часть файлов может открыться не при каждом запуске
+            known = set(profile["files"]) | set(files)
+            profile["files"] = sorted(path for path in known if os.path.isfile(path))
+            times = profile["warm" if warm else "cold"]
+            times.append(round(seconds, 2))
+            del times[:-KEEP_TIMES]
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".warmup-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def first_launch_this_boot(self):
+        """True один раз за загрузку - повторное открытие GUI не запускает программы снова"""
+        try:
+            with open(BOOT_ID) as f:
+                boot_id = f.read().strip()
+        except OSError:
+            return True
+        with self.lock:
+            if self.data["boot_id"] == boot_id:
+                return False
+            self.data["boot_id"] = boot_id
+            self.save()
+        return True
+
+    def launch_times(self, program):
+        """Медианы холодного и прогретого запуска (None - нет данных)"""
+        profile = self.get(program)
+        result = {}
+        for kind in ("cold", "warm"):
+            times = sorted(profile.get(kind, []))
+            result[kind] = times[len(times) // 2] if times else None
+        return result
+
+
+def warm_up(programs, profiles, max_bytes=MAX_BYTES, rate=RATE, workers=WORKERS):
+    """Прогрев файлов программ в порядке списка
+
+    Возвращает словарь программа -> threading.Event (запросы на ее файлы выданы)
+    и итог {"files", "bytes", "skipped"}, заполняемый по ходу прогрева.
+    """
+    limiter = RateLimiter(rate)
+    done = {program: threading.Event() for program in programs}
+    budget = {"left": max_bytes, "files": 0, "bytes": 0, "skipped": 0}
+    budget_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def fetch(path):
+        try:
+            size = os.path.getsize(path)
+            with budget_lock:
+                if size > budget["left"]:
+                    budget["skipped"] += 1
+                    return
+                budget["left"] -= size
+            prefetch_file(path, limiter)
+            with budget_lock:
+                budget["files"] += 1
+                budget["bytes"] += size
+        except OSError:
+            with budget_lock:
+                budget["skipped"] += 1
+
+    def run():
+        seen = set()
+        for program in programs:
+            paths = [p for p in profiles.get(program).get("files", []) if p not in seen]
+            seen.update(paths)
+            for future in [executor.submit(fetch, path) for path in paths]:
+                future.result()
+            done[program].set()
+        executor.shutdown()
+
+    threading.Thread(target=run, daemon=True).start()
+    return done, budget
+
+
+def launch_autostart(programs, profiles, on_result=None, warm=True):
+    """Прогрев и запуск программ; on_result(program, seconds, warm) или (program, None, error)"""
+    warmed = {program: bool(profiles.get(program).get("files")) for program in programs}
+    if warm and any(warmed.values()):
+        done, summary = warm_up(programs, profiles)
+    else:
+        done, summary = {}, {"files": 0, "bytes": 0, "skipped": 0}
+
+    def launch(program):
+        is_warm = warm and warmed[program]
+        if is_warm:
+            done[program].wait(WAIT_WARMUP)
+        try:
+            process = subprocess.Popen([program], start_new_session=True,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            if on_result:
+                on_result(program, None, str(e))
+            return
+        seconds, files = watch_launch(process)
+        profiles.update(program, seconds, files, is_warm)
+        if on_result:
+            on_result(program, seconds, is_warm)
+
+    threads = [threading.Thread(target=launch, args=[program], daemon=True) for program in programs]
+    for thread in threads:
+        thread.start()
+    return threads, summary
@@ -0,0 +1,195 @@
+"""Локальный API управления планировщиком через Unix-сокет
+
+Протокол - JSON-RPC 2.0, одно сообщение на строку. Метод вызывает
+rpc_<метод> у объекта-обработчика (точки в имени заменяются на "_").
+Метод events.subscribe превращает соединение в поток событий:
+сервер присылает уведомления {"method": "event", "params": {...}}.
+Все клиенты обслуживаются одним циклом asyncio в фоновом потоке.
+Методы обработчика с параметром peer получают (pid, uid, gid) клиента
+из SO_PEERCRED - по ним служба различает пользователей.
+"""
+import os
+import json
+import socket
+import struct
+import asyncio
+import inspect
+import functools
+import threading
+
+from control_client import (
+    PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, INTERNAL_ERROR,
+    MAX_MESSAGE, ControlClient, ControlError, encode_message, socket_in_use
+)
+
+# Подписчик, не читающий события, отключается при таком объеме буфера
+MAX_SUBSCRIBER_BACKLOG = 256 * 1024
+
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def peer_credentials(writer):
+    """(pid, uid, gid) процесса на другой стороне Unix-сокета"""
+    sock = writer.get_extra_info("socket")
+    data = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", data)
+
+
+class ControlServer:
+    """Сервер управления на Unix-сокете с рассылкой событий подписчикам"""
+
+    def __init__(self, path, handler, mode=0o600):
+        self.path = path
+        self.handler = handler
+        self.mode = mode
+        self.loop = None
+        self.thread = None
+        self.server = None
+        self.subscribers = {}  # writer -> набор типов событий или None (все)
+        self.started = threading.Event()
+        self.start_error = None
+
+    def start(self):
+        """Запуск цикла событий в фоновом потоке"""
+        if os.path.exists(self.path):
+            if socket_in_use(self.path):
+                raise RuntimeError(f"Сокет {self.path} уже занят другим экземпляром")
+            os.unlink(self.path)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.start_error:
+            raise self.start_error
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_unix_server(self._serve_client, path=self.path, limit=MAX_MESSAGE))
+            os.chmod(self.path, self.mode)
+        except Exception as e:
+            self.start_error = e
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+        # Завершение: закрываем сервер и обработчики всех клиентов
+        self.server.close()
+        clients = asyncio.all_tasks(self.loop)
+        for task in clients:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*clients, return_exceptions=True))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        """Остановка сервера и удаление файла сокета"""
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=2)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def publish(self, event_type, **data):
+        """Рассылка события подписчикам (можно вызывать из любого потока)"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        event = {"type": event_type, **data}
+        try:
+            self.loop.call_soon_threadsafe(self._broadcast, event)
+        except RuntimeError:
+            pass  # цикл уже остановлен
+
+    def _broadcast(self, event):
+        line = encode_message({"jsonrpc": "2.0", "method": "event", "params": event})
+        for writer, types in list(self.subscribers.items()):
+            if types is not None and event["type"] not in types:
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BACKLOG:
+                self.subscribers.pop(writer, None)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def _serve_client(self, reader, writer):
+        peer = peer_credentials(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break  # слишком длинное сообщение или разрыв соединения
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self._handle_line(line, writer, peer)
+                if response is not None:
+                    writer.write(encode_message(response))
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # клиент отключился или сервер останавливается
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    async def _handle_line(self, line, writer, peer):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "Некорректный JSON")
+        if isinstance(message, list):
+            if not message:
+                return _error(None, INVALID_REQUEST, "Пустой пакет")
+            responses = [await self._handle_request(item, writer, peer) for item in message]
+            return [r for r in responses if r is not None] or None
+        return await self._handle_request(message, writer, peer)
+
+    async def _handle_request(self, request, writer, peer):
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Некорректный запрос")
+        request_id = request.get("id")
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            return _error(request_id, INVALID_PARAMS, "Параметры передаются объектом")
+        if "peer" in params:
+            return _error(request_id, INVALID_PARAMS, "Параметр peer задается сервером")
+
+        try:
+            if request["method"] == "events.subscribe":
+                result = self._subscribe(writer, **params)
+            else:
+                result = await self._call_handler(request["method"], params, peer)
+        except ControlError as e:
+            return _error(request_id, e.code, str(e))
+        except ValueError as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            return _error(request_id, INTERNAL_ERROR, f"Внутренняя ошибка: {e}")
+
+        if "id" not in request:
+            return None  # уведомление без ответа
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _subscribe(self, writer, types=None):
+        self.subscribers[writer] = set(types) if types else None
+        return {"subscribed": True}
+
+    async def _call_handler(self, method, params, peer):
+        func = getattr(self.handler, "rpc_" + method.replace(".", "_"), None)
+        if func is None:
+            raise ControlError(METHOD_NOT_FOUND, f"Неизвестный метод: {method}")
+        signature = inspect.signature(func)
+        if "peer" in signature.parameters:
+            params = {**params, "peer": peer}
+        try:
+            signature.bind(**params)
+        except TypeError as e:
+            raise ControlError(INVALID_PARAMS, str(e))
+        # Обработчик может блокироваться (subprocess, запись файла) - выносим из цикла
+        return await self.loop.run_in_executor(None, functools.partial(func, **params))
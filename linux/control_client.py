@@ -0,0 +1,106 @@
+"""Клиент API управления планировщиком (без asyncio - для быстрого запуска CLI)
+
+Протокол - JSON-RPC 2.0 поверх Unix-сокета, одно сообщение на строку.
+"""
+import json
+import socket
+
+# Коды ошибок JSON-RPC 2.0
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+MAX_MESSAGE = 1024 * 1024
+
+
+class ControlError(Exception):
+    """Ошибка, возвращенная сервером управления"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def encode_message(message):
+    """Сообщение протокола: JSON в одну строку с переводом строки"""
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def socket_in_use(path):
+    """Проверка, слушает ли сокет другой запущенный процесс"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+class ControlClient:
+    """Синхронный клиент API управления"""
+
+    def __init__(self, path, timeout=5):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.stream = self.sock.makefile("rb")
+        self.next_id = 1
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self):
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("Сервер закрыл соединение")
+        return json.loads(line)
+
+    def _request(self, method, params):
+        request = {"jsonrpc": "2.0", "id": self.next_id, "method": method, "params": params}
+        self.next_id += 1
+        return request
+
+    @staticmethod
+    def _result(response):
+        if "error" in response:
+            raise ControlError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    def call(self, method, **params):
+        """Вызов метода, возвращает результат или бросает ControlError"""
+        self.sock.sendall(encode_message(self._request(method, params)))
+        while True:
+            response = self._read()
+            if "id" in response:
+                return self._result(response)
+
+    def batch(self, calls):
+        """Пакет вызовов [(метод, параметры)], результаты в том же порядке"""
+        requests = [self._request(method, params) for method, params in calls]
+        self.sock.sendall(encode_message(requests))
+        while True:
+            responses = self._read()
+            if isinstance(responses, list):
+                break
+        by_id = {r.get("id"): r for r in responses}
+        return [self._result(by_id[r["id"]]) for r in requests]
+
+    def events(self, types=None):
+        """Подписка на события; генератор блокируется до следующего события"""
+        self.call("events.subscribe", types=types)
+        self.sock.settimeout(None)
+        while True:
+            message = self._read()
+            if message.get("method") == "event":
+                yield message["params"]
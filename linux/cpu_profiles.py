@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""Профили процессора по времени суток: регулятор cpufreq, EPP, предел частоты, ядра
+
+Серверы, которые нельзя усыплять, ночью могут работать дешевле. Профиль
+задает значения sysfs:
+    governor  - scaling_governor всех политик cpufreq ("powersave", "performance", ...)
+    epp       - energy_performance_preference ("power", "balance_power", "performance", ...)
+    max_freq  - scaling_max_freq: кГц или доля от cpuinfo_max_freq ("60%")
+    online    - ядра, которые остаются включенными ("0-3,8"); остальные выключаются
+                (cpu0 без файла online не выключается)
+
+Перед первым изменением состояние всех этих файлов (исходное) записывается
+атомарно в STATE_FILE. Переход между профилями записывает только
+отличающиеся значения "исходное + профиль", так что параметры, которые
+новый профиль не задает, возвращаются к исходным. Если запись в sysfs
+не удалась, уже записанные значения откатываются. Вне окон профилей
+исходное состояние восстанавливается и файл состояния удаляется; после
+сбоя служба восстановит состояние из файла, а не снимет измененное.
+
+Расписание (политика службы):
+    "cpu_profiles": {"night": {"governor": "powersave", "epp": "power", "max_freq": "60%"}},
+    "cpu_schedule": [{"profile": "night", "days": "all", "from": "22:00", "to": "07:00"},
+                     {"profile": "performance", "days": "Mon-Fri", "from": "09:00", "to": "18:00"}]
+Правила перегрева (thermal_watch.py, действие "cpu:профиль") задают профиль
+поверх окон, пока датчик не остынет (set_override).
+
+Примеры:
+    python3 cpu_profiles.py show
+    sudo python3 cpu_profiles.py apply powersave
+    sudo python3 cpu_profiles.py restore
+    python3 cpu_profiles.py selftest
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+import datetime
+import tempfile
+import threading
+
+import schedule_model as model
+
+STATE_FILE = "/var/lib/timemaster/cpu-baseline.json"
+CPU_DIR = "sys/devices/system/cpu"
+# Проверка окон раз в минуту (границы окон - с точностью до минуты)
+CHECK_INTERVAL = 60
+BUILTIN_PROFILES = {
+    "performance": {"governor": "performance", "epp": "performance", "max_freq": "100%"},
+    "balanced": {"governor": "powersave", "epp": "balance_performance", "max_freq": "100%"},
+    "powersave": {"governor": "powersave", "epp": "power", "max_freq": "60%"},
+}
+PROFILE_FIELDS = ("governor", "epp", "max_freq", "online")
+
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def _read(root, path):
+    try:
+        with open(os.path.join(root, path)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write(root, path, value):
+    with open(os.path.join(root, path), "w") as f:
+        f.write(str(value))
+
+
+def parse_cpu_list(spec):
+    """Список ядер "0-3,8" -> множество номеров"""
+    cpus = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        cpus.update(range(int(low), int(high or low) + 1))
+    return cpus
+
+
+def _relative(root, path):
+    return os.path.relpath(path, root)
+
+
+def policies(root="/"):
+    """Каталоги политик cpufreq относительно root"""
+    return [_relative(root, path) for path in sorted(glob.glob(os.path.join(root, CPU_DIR, "cpufreq", "policy*")))]
+
+
+def hotplug_cpus(root="/"):
+    """{номер ядра: путь к файлу online} для ядер, которые можно выключать"""
+    cpus = {}
+    for path in glob.glob(os.path.join(root, CPU_DIR, "cpu[0-9]*", "online")):
+        cpus[int(os.path.basename(os.path.dirname(path))[3:])] = _relative(root, path)
+    return cpus
+
+
+def snapshot(root="/"):
+    """Текущие значения всех параметров профилей: {путь: значение}"""
+    state = {}
+    for policy in policies(root):
+        for name in ("scaling_governor", "energy_performance_preference", "scaling_max_freq"):
+            value = _read(root, os.path.join(policy, name))
+            if value is not None:
+                state[os.path.join(policy, name)] = value
+    for path in hotplug_cpus(root).values():
+        value = _read(root, path)
+        if value is not None:
+            state[path] = value
+    return state
+
+
+def load_profiles(custom=None):
+    """Встроенные профили и профили политики, ValueError при ошибке"""
+    profiles = dict(BUILTIN_PROFILES)
+    for name, spec in (custom or {}).items():
+        unknown = set(spec) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Профиль {name}: неизвестные параметры {', '.join(sorted(unknown))}")
+        if "online" in spec:
+            parse_cpu_list(spec["online"])
+        if "max_freq" in spec:
+            _freq_value(spec["max_freq"], 1000000)
+        profiles[name] = dict(spec)
+    return profiles
+
+
+def _freq_value(value, cpu_max):
+    text = str(value).strip()
+    if text.endswith("%"):
+        percent = float(text[:-1])
+        if not 0 < percent <= 100:
+            raise ValueError(f"Неверная доля частоты: {text}")
+        return str(int(cpu_max * percent / 100))
+    return str(int(text))
+
+
+def target_state(profile, baseline, root="/"):
+    """Значения sysfs для профиля: исходное состояние с изменениями профиля"""
+    target = dict(baseline)
+    for policy in policies(root):
+        if "governor" in profile:
+            target[os.path.join(policy, "scaling_governor")] = profile["governor"]
+        epp = os.path.join(policy, "energy_performance_preference")
+        if "epp" in profile and epp in baseline:
+            target[epp] = profile["epp"]
+        if "max_freq" in profile:
+            cpu_max = _read(root, os.path.join(policy, "cpuinfo_max_freq"))
+            if cpu_max:
+                target[os.path.join(policy, "scaling_max_freq")] = _freq_value(profile["max_freq"], int(cpu_max))
+    if "online" in profile:
+        keep = parse_cpu_list(profile["online"])
+        for cpu, path in hotplug_cpus(root).items():
+            target[path] = "1" if cpu in keep else "0"
+    return target
+
+
+def _write_order(path, value):
+    """Порядок записи: включение ядер, регулятор, EPP, частота, выключение ядер
+
+    EPP при регуляторе performance (intel_pstate) не меняется, поэтому
+    регулятор пишется раньше; политики выключенных ядер недоступны, поэтому
+    ядра включаются первыми, а выключаются последними.
+    """
+    name = os.path.basename(path)
+    if name == "online":
+        return 0 if value == "1" else 4
+    return {"scaling_governor": 1, "energy_performance_preference": 2}.get(name, 3)
+
+
+def transition(target, root="/"):
+    """Запись отличающихся значений; при ошибке - откат записанного, OSError
+
+    Откатываются только файлы из снимка до записи: политики ядра, включенного
+    в этом же переходе, в снимке нет, и они пропадают с выключением ядра.
+    """
+    current = snapshot(root)
+    changes = sorted(((path, value) for path, value in target.items() if current.get(path) != value),
+                     key=lambda item: _write_order(*item))
+    written = []
+    try:
+        for path, value in changes:
+            _write(root, path, value)
+            written.append(path)
+    except OSError as e:
+        failed = path
+        for path in reversed(written):
+            if path not in current:
+                continue
+            try:
+                _write(root, path, current[path])
+            except OSError:
+                pass
+        raise OSError(f"{failed}: {e}") from e
+    return len(changes)
+
+
+class ProfileState:
+    """Исходное состояние (на диске, пока профиль действует) и текущий профиль"""
+
+    def __init__(self, path=STATE_FILE, root="/"):
+        self.path = path
+        self.root = root
+        self.baseline = None
+        self.profile = None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.baseline = data["baseline"]
+            self.profile = data.get("profile")
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cpu-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"profile": self.profile, "baseline": self.baseline}, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def apply(self, name, profile):
+        """Переход к профилю; исходное состояние сохраняется до первой записи"""
+        if self.baseline is None:
+            self.baseline = snapshot(self.root)
+        previous = self.profile
+        self.profile = name
+        self._save()
+        try:
+            return transition(target_state(profile, self.baseline, self.root), self.root)
+        except OSError:
+            self.profile = previous
+            self._save()
+            raise
+
+    def restore(self):
+        """Возврат исходного состояния и удаление файла состояния"""
+        if self.baseline is None:
+            return 0
+        count = transition(self.baseline, self.root)
+        self.baseline = None
+        self.profile = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        return count
+
+
+def load_schedule(entries, profiles):
+    """Окна профилей [(имя, разобранные окна)], ValueError при ошибке"""
+    schedule = []
+    for entry in entries or []:
+        if entry.get("profile") not in profiles:
+            raise ValueError(f"Неизвестный профиль процессора: {entry.get('profile')}")
+        schedule.append((entry["profile"], model.parse_windows([entry])))
+    return schedule
+
+
+def active_profile(schedule, moment):
+    """Профиль первого окна, в которое попадает момент, или None"""
+    for name, windows in schedule:
+        if model.in_windows(windows, moment):
+            return name
+    return None
+
+
+class ProfileScheduler:
+    """Поток, переключающий профили по окнам; вне окон - исходное состояние"""
+
+    def __init__(self, schedule, profiles, state, dry_run=False, clock=datetime.datetime.now):
+        self.schedule = schedule
+        self.profiles = profiles
+        self.state = state
+        self.dry_run = dry_run
+        self.clock = clock
+        self.override = None  # профиль защиты от перегрева поверх расписания
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def update(self, schedule, profiles):
+        with self.lock:
+            self.schedule = schedule
+            self.profiles = profiles
+        self.check()
+
+    def set_override(self, name):
+        """Профиль поверх окон расписания (None - снова по расписанию)"""
+        with self.lock:
+            self.override = name
+        self.check()
+
+    def stop(self, restore=True):
+        self.stop_event.set()
+        if restore and not self.dry_run:
+            with self.lock:
+                try:
+                    self.state.restore()
+                except OSError as e:
+                    log(f"Профиль процессора не восстановлен: {e}")
+
+    def check(self):
+        """Применение профиля, действующего сейчас"""
+        with self.lock:
+            wanted = self.override or active_profile(self.schedule, self.clock())
+            if wanted == self.state.profile:
+                return
+            log(f"Профиль процессора: {wanted or 'исходный'}")
+            if self.dry_run:
+                self.state.profile = wanted
+                return
+            try:
+                if wanted is None:
+                    self.state.restore()
+                else:
+                    self.state.apply(wanted, self.profiles[wanted])
+            except OSError as e:
+                log(f"Ошибка профиля процессора, откат: {e}")
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.check()
+            now = self.clock()
+            # До начала следующей минуты - границы окон минутные
+            self.stop_event.wait(min(CHECK_INTERVAL, 60 - now.second - now.microsecond / 1e6 + 0.01))
+
+
+def make_fake_sysfs(root, cpus=4, epp=True):
+    """Дерево sysfs для проверки: политики cpufreq и файлы online"""
+    base = os.path.join(root, CPU_DIR)
+    for cpu in range(cpus):
+        os.makedirs(os.path.join(base, f"cpu{cpu}"), exist_ok=True)
+        if cpu:
+            _write(root, os.path.join(CPU_DIR, f"cpu{cpu}", "online"), "1")
+        policy = os.path.join(CPU_DIR, "cpufreq", f"policy{cpu}")
+        os.makedirs(os.path.join(root, policy), exist_ok=True)
+        for name, value in (("scaling_governor", "schedutil"), ("scaling_max_freq", "3000000"),
+                            ("cpuinfo_max_freq", "3000000")):
+            _write(root, os.path.join(policy, name), value)
+        if epp:
+            _write(root, os.path.join(policy, "energy_performance_preference"), "balance_performance")
+
+
+def cmd_show(args):
+    for path, value in sorted(snapshot(args.root).items()):
+        print(f"{path}: {value}")
+    state = ProfileState(args.state, args.root)
+    print(f"Профиль: {state.profile or 'исходный'}")
+    return 0
+
+
+def cmd_apply(args):
+    profiles = load_profiles()
+    if args.profile not in profiles:
+        raise ValueError(f"Неизвестный профиль: {args.profile} (есть: {', '.join(profiles)})")
+    count = ProfileState(args.state, args.root).apply(args.profile, profiles[args.profile])
+    print(f"Профиль {args.profile}: изменено параметров {count}")
+    return 0
+
+
+def cmd_restore(args):
+    print(f"Восстановлено параметров: {ProfileState(args.state, args.root).restore()}")
+    return 0
+
+
+def cmd_selftest(args):
+    """Тесты модуля: tests/test_cpu_profiles.py"""
+    import tests
+    return tests.run("cpu_profiles")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Профили процессора по времени суток")
+    parser.add_argument("--root", default="/", help="корень sysfs (для проверки на поддельном дереве)")
+    parser.add_argument("--state", default=STATE_FILE, help="файл исходного состояния")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="текущие параметры").set_defaults(func=cmd_show)
+    apply = commands.add_parser("apply", help="применить профиль")
+    apply.add_argument("profile")
+    apply.set_defaults(func=cmd_apply)
+    commands.add_parser("restore", help="вернуть исходное состояние").set_defaults(func=cmd_restore)
+    commands.add_parser("selftest", help="проверка на поддельном sysfs").set_defaults(func=cmd_selftest)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"cpu_profiles: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Легкие состояния питания экрана: DPMS, подсветка, гашение
+
+Для киосков и машин, которые должны оставаться доступными по сети:
+    Выключить экран - DPMS off (X11: xset; Wayland: GNOME/Mutter, KDE kscreen-doctor, wlopm);
+    Затемнить экран - подсветка /sys/class/backlight до DIM_FRACTION от максимума
+                      (без прав на запись - через logind SetBrightness сеанса);
+    Погасить экран  - гашение хранителем экрана (X11: xset s activate; иначе
+                      org.freedesktop.ScreenSaver.SetActive) без блокировки.
+
+Выход из DPMS и гашения при вводе выполняет X-сервер/композитор - за
+миллисекунды и без участия программы. Подсветку DisplayState возвращает
+при restore(), который GUI вызывает по вводу пользователя (InputWatcher:
+сброс счетчика простоя ввода X11 XScreenSaver или Mutter IdleMonitor;
+отключение хранителя экрана и переход IdleHint logind к активности), на
+следующей границе расписания (включение или выключение) и при закрытии
+программы.
+
+Примеры:
+    python3 display_power.py off
+    python3 display_power.py dim --restore-after 5
+"""
+import os
+import sys
+import glob
+import re
+import ctypes
+import ctypes.util
+import shutil
+import argparse
+import threading
+import subprocess
+
+from schedule_model import DISPLAY_OFF, DISPLAY_DIM, DISPLAY_BLANK
+
+BACKLIGHT_DIR = "/sys/class/backlight"
+# Затемнение - доля максимальной яркости
+DIM_FRACTION = 0.1
+COMMAND_TIMEOUT = 5
+# Опрос счетчика простоя ввода, пока экран затемнен/погашен
+INPUT_POLL = 1.0
+MUTTER_IDLE = ["gdbus", "call", "--session", "--dest", "org.gnome.Mutter.IdleMonitor",
+               "--object-path", "/org/gnome/Mutter/IdleMonitor/Core",
+               "--method", "org.gnome.Mutter.IdleMonitor.GetIdletime"]
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int), ("kind", ctypes.c_int),
+                ("til_or_since", ctypes.c_ulong), ("idle", ctypes.c_ulong),
+                ("event_mask", ctypes.c_ulong)]
+
+
+class X11IdleTime:
+    """Время без ввода в X11 (расширение MIT-SCREEN-SAVER через libXss)"""
+
+    def __init__(self):
+        x11 = ctypes.util.find_library("X11")
+        xss = ctypes.util.find_library("Xss")
+        if not x11 or not xss:
+            raise OSError("нет libX11/libXss")
+        self.x11 = ctypes.CDLL(x11)
+        self.xss = ctypes.CDLL(xss)
+        self.x11.XOpenDisplay.restype = ctypes.c_void_p
+        self.x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        self.x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self.x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(_XScreenSaverInfo)
+        self.xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                   ctypes.POINTER(_XScreenSaverInfo)]
+        self.display = self.x11.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("нет подключения к X-серверу")
+        self.info = self.xss.XScreenSaverAllocInfo()
+
+    def __call__(self):
+        root = self.x11.XDefaultRootWindow(self.display)
+        if not self.xss.XScreenSaverQueryInfo(self.display, root, self.info):
+            return None
+        return self.info.contents.idle / 1000.0
+
+    def close(self):
+        self.x11.XCloseDisplay(self.display)
+
+
+def mutter_idle_time():
+    """Время без ввода по Mutter IdleMonitor (GNOME, в том числе Wayland) или None"""
+    try:
+        result = subprocess.run(MUTTER_IDLE, capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(r"uint64 (\d+)", result.stdout) if result.returncode == 0 else None
+    return int(match.group(1)) / 1000.0 if match else None
+
+
+def input_idle_source():
+    """Функция времени без ввода (секунды) для текущего сеанса или None"""
+    if session_type() == "x11":
+        try:
+            return X11IdleTime()
+        except OSError:
+            pass
+    if "GNOME" in _desktop() and mutter_idle_time() is not None:
+        return mutter_idle_time
+    return None
+
+
+class InputWatcher:
+    """Поток, вызывающий callback() при вводе пользователя (сброс счетчика простоя)"""
+
+    def __init__(self, callback, source=None, interval=INPUT_POLL):
+        self.callback = callback
+        self.source = source
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """False, если время без ввода в этом сеансе узнать нельзя"""
+        if self.source is None:
+            self.source = input_idle_source()
+        if self.source is None:
+            return False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        last = self.source()
+        while not self.stop_event.wait(self.interval):
+            idle = self.source()
+            if idle is None:
+                continue
+            # Простой растет вместе с часами; уменьшился - был ввод
+            if last is not None and idle + self.interval / 2 < last:
+                self.stop_event.set()
+                self.callback()
+                break
+            last = idle
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+
+def session_type():
+    """x11, wayland или tty по окружению сеанса"""
+    kind = os.environ.get("XDG_SESSION_TYPE", "")
+    if kind in ("x11", "wayland"):
+        return kind
+    if os.environ.get("WAYLAND_DISPLAY"):
+        return "wayland"
+    return "x11" if os.environ.get("DISPLAY") else "tty"
+
+
+def _desktop():
+    return os.environ.get("XDG_CURRENT_DESKTOP", "").upper()
+
+
+def _mutter_power_save(mode):
+    return ["gdbus", "call", "--session", "--dest", "org.gnome.Mutter.DisplayConfig",
+            "--object-path", "/org/gnome/Mutter/DisplayConfig",
+            "--method", "org.freedesktop.DBus.Properties.Set",
+            "org.gnome.Mutter.DisplayConfig", "PowerSaveMode", f"<int32 {mode}>"]
+
+
+def dpms_command(on):
+    """Команда включения/выключения экрана для текущего сеанса или None"""
+    if session_type() == "x11" and shutil.which("xset"):
+        return ["xset", "dpms", "force", "on" if on else "off"]
+    if "GNOME" in _desktop():
+        return _mutter_power_save(0 if on else 3)
+    if "KDE" in _desktop() and shutil.which("kscreen-doctor"):
+        return ["kscreen-doctor", "--dpms", "on" if on else "off"]
+    if shutil.which("wlopm"):
+        return ["wlopm", "--on" if on else "--off", "*"]
+    return None
+
+
+def blank_command(active):
+    """Команда гашения экрана (active=False - отменить) для текущего сеанса"""
+    if session_type() == "x11" and shutil.which("xset"):
+        return ["xset", "s", "activate" if active else "reset"]
+    return ["gdbus", "call", "--session", "--dest", "org.freedesktop.ScreenSaver",
+            "--object-path", "/org/freedesktop/ScreenSaver",
+            "--method", "org.freedesktop.ScreenSaver.SetActive", "true" if active else "false"]
+
+
+def run_command(command):
+    """Выполнение команды: (успех, текст ошибки)"""
+    if command is None:
+        return False, "нет способа управлять экраном в этом сеансе"
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return False, str(e)
+    if result.returncode != 0:
+        return False, result.stderr.strip() or f"код {result.returncode}"
+    return True, None
+
+
+def backlights(root=BACKLIGHT_DIR):
+    """Устройства подсветки: [(имя, каталог)]"""
+    return [(os.path.basename(path), path) for path in sorted(glob.glob(os.path.join(root, "*")))]
+
+
+def read_brightness(path):
+    with open(os.path.join(path, "brightness")) as f:
+        current = int(f.read())
+    with open(os.path.join(path, "max_brightness")) as f:
+        maximum = int(f.read())
+    return current, maximum
+
+
+def set_brightness(name, path, value):
+    """Запись яркости: напрямую в sysfs, без прав - через logind (сеанс пользователя)"""
+    try:
+        with open(os.path.join(path, "brightness"), "w") as f:
+            f.write(str(value))
+        return True, None
+    except PermissionError:
+        return run_command(["busctl", "call", "org.freedesktop.login1", "/org/freedesktop/login1/session/auto",
+                            "org.freedesktop.login1.Session", "SetBrightness", "ssu",
+                            "backlight", name, str(value)])
+    except OSError as e:
+        return False, str(e)
+
+
+class DisplayState:
+    """Выполненные действия с экраном и их отмена"""
+
+    def __init__(self, backlight_root=BACKLIGHT_DIR):
+        self.backlight_root = backlight_root
+        self.lock = threading.Lock()
+        self.saved_brightness = {}  # имя -> (каталог, прежняя яркость)
+        self.dpms_off = False
+        self.blanked = False
+
+    @property
+    def active(self):
+        return bool(self.saved_brightness or self.dpms_off or self.blanked)
+
+    def apply(self, action):
+        """Выполнение действия с экраном: (успех, текст ошибки)"""
+        with self.lock:
+            if action == DISPLAY_OFF:
+                ok, error = run_command(dpms_command(on=False))
+                self.dpms_off = self.dpms_off or ok
+            elif action == DISPLAY_BLANK:
+                ok, error = run_command(blank_command(active=True))
+                self.blanked = self.blanked or ok
+            elif action == DISPLAY_DIM:
+                ok, error = self._dim()
+            else:
+                raise ValueError(f"Неизвестное действие с экраном: {action}")
+            return ok, error
+
+    def _dim(self):
+        devices = backlights(self.backlight_root)
+        if not devices:
+            return False, "нет устройств подсветки"
+        errors = []
+        for name, path in devices:
+            try:
+                current, maximum = read_brightness(path)
+            except (OSError, ValueError) as e:
+                errors.append(f"{name}: {e}")
+                continue
+            target = max(1, int(maximum * DIM_FRACTION))
+            if current <= target:
+                continue
+            ok, error = set_brightness(name, path, target)
+            if ok:
+                # Повторное затемнение не должно затереть исходную яркость
+                self.saved_brightness.setdefault(name, (path, current))
+            else:
+                errors.append(f"{name}: {error}")
+        return not errors, "; ".join(errors) or None
+
+    def restore(self):
+        """Возврат экрана в обычное состояние; список ошибок"""
+        errors = []
+        with self.lock:
+            for name, (path, value) in sorted(self.saved_brightness.items()):
+                ok, error = set_brightness(name, path, value)
+                if not ok:
+                    errors.append(f"{name}: {error}")
+            self.saved_brightness = {}
+            if self.dpms_off:
+                ok, error = run_command(dpms_command(on=True))
+                if not ok:
+                    errors.append(error)
+                self.dpms_off = False
+            if self.blanked:
+                ok, error = run_command(blank_command(active=False))
+                if not ok:
+                    errors.append(error)
+                self.blanked = False
+        return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Легкие состояния питания экрана")
+    parser.add_argument("mode", choices=["off", "dim", "blank"])
+    parser.add_argument("--restore-after", type=float, help="вернуть экран через N секунд")
+    args = parser.parse_args(argv)
+    action = {"off": DISPLAY_OFF, "dim": DISPLAY_DIM, "blank": DISPLAY_BLANK}[args.mode]
+    state = DisplayState()
+    ok, error = state.apply(action)
+    print(f"{action}: {'выполнено' if ok else error}")
+    if args.restore_after:
+        threading.Event().wait(args.restore_after)
+        errors = state.restore()
+        print("Экран восстановлен" if not errors else "; ".join(errors))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
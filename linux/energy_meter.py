@@ -0,0 +1,294 @@
+"""Учет энергопотребления в бодрствовании и во сне по счетчикам sysfs
+
+Источники:
+  /sys/class/powercap/intel-rapl:N/energy_uj - накопительные счетчики RAPL
+      (пакеты CPU; переполняются на max_energy_range_uj, во сне S3 стоят);
+  /sys/class/power_supply/BAT*/energy_now (мкВт*ч) или charge_now * voltage_now -
+      заряд батареи, при разряде это потребление всей машины, включая сон.
+
+Счетчики читаются редко (раз в минуту и перед каждым действием), между
+чтениями считается приращение. Интервал, в котором система спала (прирост
+CLOCK_BOOTTIME - CLOCK_MONOTONIC), делится на бодрствование и сон.
+Хранятся только суточные суммы:
+{"ГГГГ-ММ-ДД": [Дж бодр., с бодр., Дж сна, с сна, с сна без измерения]},
+интервал относится к дню, в который он закончился. Сон, который не покрыт
+счетчиком (RAPL во сне стоит), идет в последнее поле: мощность сна по нему
+неизвестна, и экономия за него не считается измеренной.
+Параметр root позволяет подменить корень sysfs на тестовое дерево.
+"""
+import os
+import glob
+import json
+import time
+import datetime
+import tempfile
+import threading
+
+from schedule_model import CONFIG_DIR
+from power_actions import sleep_offset
+
+ENERGY_FILE = os.path.join(CONFIG_DIR, "energy.json")
+RAPL_DIR = "sys/class/powercap"
+POWER_SUPPLY_DIR = "sys/class/power_supply"
+# Сколько дней суточных сумм храним
+KEEP_DAYS = 400
+# Прирост времени сна меньше порога - погрешность часов, а не сон
+SLEEP_THRESHOLD = 3
+
+AWAKE_J, AWAKE_S, ASLEEP_J, ASLEEP_S, UNMEASURED_S = range(5)
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def rapl_zones(root="/"):
+    """Верхние зоны RAPL (intel-rapl:N) - подзоны уже входят в пакет"""
+    zones = []
+    for path in sorted(glob.glob(os.path.join(root, RAPL_DIR, "*"))):
+        name = os.path.basename(path)
+        if name.count(":") != 1 or not os.path.exists(os.path.join(path, "energy_uj")):
+            continue
+        zones.append(path)
+    return zones
+
+
+def read_rapl(root="/"):
+    """Счетчики RAPL: {зона: (мкДж, диапазон до переполнения)}"""
+    counters = {}
+    for zone in rapl_zones(root):
+        value = _read_int(os.path.join(zone, "energy_uj"))
+        if value is None:
+            continue  # energy_uj доступен только root в новых ядрах
+        counters[os.path.basename(zone)] = (value, _read_int(os.path.join(zone, "max_energy_range_uj")))
+    return counters
+
+
+def read_battery(root="/"):
+    """Суммарная энергия батарей в Дж и признак разряда; None если батарей нет"""
+    total = 0.0
+    discharging = True
+    found = False
+    for path in sorted(glob.glob(os.path.join(root, POWER_SUPPLY_DIR, "*"))):
+        if _read_text(os.path.join(path, "type")) != "Battery":
+            continue
+        energy = _read_int(os.path.join(path, "energy_now"))
+        if energy is not None:
+            joules = energy * 3.6e-3  # мкВт*ч -> Дж
+        else:
+            charge = _read_int(os.path.join(path, "charge_now"))
+            voltage = _read_int(os.path.join(path, "voltage_now"))
+            if charge is None or voltage is None:
+                continue
+            joules = charge * voltage * 3.6e-9  # мкА*ч * мкВ -> Дж
+        found = True
+        total += joules
+        if _read_text(os.path.join(path, "status")) != "Discharging":
+            discharging = False
+    if not found:
+        return None
+    return total, discharging
+
+
+def counter_delta(previous, current, max_range):
+    """Приращение накопительного счетчика с учетом переполнения"""
+    if current >= previous:
+        return current - previous
+    if max_range:
+        return max_range - previous + current
+    return 0  # счетчик сброшен без известного диапазона - интервал теряем
+
+
+def load_days(path=ENERGY_FILE):
+    """Суточные суммы из файла"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_days(days, path=ENERGY_FILE):
+    """Атомарная запись суточных сумм"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".energy-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(days, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def savings(days, start_date, end_date, asleep_estimate=None):
+    """Экономия за даты [start_date, end_date)
+
+    Возвращает словарь: средняя мощность бодрствования и сна (Вт), часы сна,
+    сэкономленные кВт*ч - измеренные часы сна, умноженные на разницу мощностей.
+    Сон без измерения в saved_kwh не входит: при asleep_estimate (Вт) экономия
+    за него оценивается отдельно в estimated_kwh, иначе она неизвестна (None).
+    Если измеренного сна нет, а неизмеренный есть, saved_kwh тоже None.
+    """
+    totals = [0.0] * 5
+    day = start_date
+    while day < end_date:
+        for index, value in enumerate(days.get(day.isoformat(), ())):
+            totals[index] += value
+        day += datetime.timedelta(days=1)
+    awake_w = totals[AWAKE_J] / totals[AWAKE_S] if totals[AWAKE_S] else None
+    asleep_w = totals[ASLEEP_J] / totals[ASLEEP_S] if totals[ASLEEP_S] else None
+    saved = None
+    if awake_w is not None and (asleep_w is not None or not totals[UNMEASURED_S]):
+        saved = max(0.0, awake_w - (asleep_w or 0.0)) * totals[ASLEEP_S] / 3.6e6
+    estimated = 0.0 if not totals[UNMEASURED_S] else None
+    if estimated is None and awake_w is not None and asleep_estimate is not None:
+        estimated = max(0.0, awake_w - asleep_estimate) * totals[UNMEASURED_S] / 3.6e6
+    return {
+        "awake_watts": awake_w,
+        "asleep_watts": asleep_w,
+        "asleep_hours": (totals[ASLEEP_S] + totals[UNMEASURED_S]) / 3600,
+        "unmeasured_hours": totals[UNMEASURED_S] / 3600,
+        "consumed_kwh": (totals[AWAKE_J] + totals[ASLEEP_J]) / 3.6e6,
+        "saved_kwh": saved,
+        "estimated_kwh": estimated,
+    }
+
+
+def weekly_savings(days, weeks=1, today=None, asleep_estimate=None):
+    """Экономия по неделям, последняя неделя заканчивается сегодня: [(начало недели, отчет)]"""
+    today = today or datetime.date.today()
+    end = today + datetime.timedelta(days=1)
+    report = []
+    for _ in range(weeks):
+        start = end - datetime.timedelta(days=7)
+        report.append((start, savings(days, start, end, asleep_estimate)))
+        end = start
+    return report[::-1]
+
+
+class EnergySampler:
+    """Периодическое чтение счетчиков и распределение энергии по бодрствованию и сну"""
+
+    def __init__(self, path=ENERGY_FILE, root="/", interval=60,
+                 clock=time.time, sleep_clock=sleep_offset):
+        self.path = path
+        self.root = root
+        self.interval = interval
+        self.clock = clock
+        self.sleep_clock = sleep_clock
+        self.days = load_days(path)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last = None
+
+    def read(self):
+        """Текущие показания: время, время сна, RAPL, батарея"""
+        return {
+            "time": self.clock(),
+            "slept": self.sleep_clock(),
+            "rapl": read_rapl(self.root),
+            "battery": read_battery(self.root),
+        }
+
+    def energy_between(self, previous, current):
+        """Энергия между показаниями: (Дж, учтен ли сон) или (None, False) - измерить нечем"""
+        # Разряд батареи учитывает всю машину и сон - предпочтительный источник
+        before, after = previous["battery"], current["battery"]
+        if before and after and before[1] and after[1] and after[0] <= before[0]:
+            return before[0] - after[0], True
+        zones = set(previous["rapl"]) & set(current["rapl"])
+        if not zones:
+            return None, False
+        total_uj = 0
+        for zone in zones:
+            value_before, max_range = previous["rapl"][zone]
+            total_uj += counter_delta(value_before, current["rapl"][zone][0], max_range)
+        # RAPL во сне не считает: вся энергия интервала приходится на бодрствование
+        return total_uj / 1e6, False
+
+    def sample(self):
+        """Снятие показаний и учет интервала с прошлого чтения
+
+        Вызывается по таймеру и перед каждым действием - граница интервала
+        совпадает с моментом ухода в сон.
+        """
+        with self.lock:
+            current = self.read()
+            previous, self.last = self.last, current
+            if previous is None:
+                return None
+            elapsed = current["time"] - previous["time"]
+            if elapsed <= 0:
+                return None
+            slept = current["slept"] - previous["slept"]
+            if slept < SLEEP_THRESHOLD:
+                slept = 0.0
+            slept = min(slept, elapsed)
+            energy, covers_sleep = self.energy_between(previous, current)
+            if energy is None:
+                # Без счетчиков интервал не учитываем: мощность не из чего считать
+                return {"elapsed": elapsed, "slept": slept, "energy": None}
+            entry = self.days.setdefault(
+                datetime.date.fromtimestamp(current["time"]).isoformat(), [0.0] * 5)
+            # Суммы из файла старого формата - без поля неизмеренного сна
+            entry.extend([0.0] * (5 - len(entry)))
+            awake_seconds = elapsed - slept
+            if slept and covers_sleep:
+                # Бодрствующую часть интервала оцениваем средней мощностью дня
+                power = entry[AWAKE_J] / entry[AWAKE_S] if entry[AWAKE_S] else energy / elapsed
+                awake_energy = min(energy, power * awake_seconds)
+                asleep_energy = energy - awake_energy
+            else:
+                awake_energy, asleep_energy = energy, 0.0
+            entry[AWAKE_J] += awake_energy
+            entry[AWAKE_S] += awake_seconds
+            entry[ASLEEP_J] += asleep_energy
+            # Сон без покрывающего счетчика - нулевые Дж занизили бы мощность сна
+            entry[ASLEEP_S if covers_sleep else UNMEASURED_S] += slept
+            self.prune()
+            try:
+                save_days(self.days, self.path)
+            except OSError as e:
+                print(f"Ошибка сохранения учета энергии: {e}")
+            return {"elapsed": elapsed, "slept": slept, "energy": energy}
+
+    def prune(self):
+        """Удаление старых суточных сумм"""
+        if len(self.days) > KEEP_DAYS:
+            for day in sorted(self.days)[:len(self.days) - KEEP_DAYS]:
+                del self.days[day]
+
+    def weekly_savings(self, weeks=1, asleep_estimate=None):
+        with self.lock:
+            days = {day: list(values) for day, values in self.days.items()}
+        return weekly_savings(days, weeks, asleep_estimate=asleep_estimate)
+
+    def start(self):
+        self.sample()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Ошибка чтения счетчиков энергии: {e}")
@@ -11,6 +11,27 @@ from PIL import Image, ImageTk
 import webbrowser
 import queue
 
+import schedule_model
+import control_api
+from control_client import ControlClient
+from history_store import HistoryStore
+from power_actions import ResumeWatcher
+from energy_meter import EnergySampler
+import cache_warmup
+import display_power
+import idle_watch
+import tk_watchdog
+import timeline_view
+import status_reporter
+import thermal_watch
+import sleep_planner
+import history_store
+import task_model
+from schedule_model import (
+    DAYS_OF_WEEK_SHORT, DAYS_OF_WEEK_FULL, SCHEDULE_ACTIONS, CONFIG_DIR, CONFIG_FILE, CONTROL_SOCKET,
+    DAEMON_SOCKET
+)
+
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
@@ -18,14 +39,15 @@ APP_NAME = "TimeMaster"
 APP_VERSION = "3.0"
 
 # Linux-specific paths
-CONFIG_DIR = os.path.expanduser("~/.config/timemaster")
 os.makedirs(CONFIG_DIR, exist_ok=True)
-CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
 APP_ICON = "sleep_icon.png"  # Changed to PNG for Linux compatibility
-
-DAYS_OF_WEEK_SHORT = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-DAYS_OF_WEEK_FULL = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
-ACTIONS = ["Выключить", "Сон", "Гибернация", "Перезагрузка"]
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(CONFIG_DIR, "history.sqlite")
+# Строк журнала на одной странице вкладки истории
+HISTORY_PAGE = 50
+# Проверка таблицы расписания после паузы в наборе, мс
+VALIDATE_DELAY = 400
+ERROR_BORDER = "#e74c3c"
 
 class TimeMasterApp(ctk.CTk):
     def __init__(self):
@@ -34,6 +56,21 @@ class TimeMasterApp(ctk.CTk):
         # Состояние приложения
         self.scheduler_active = True
         self.is_fullscreen = False
+        self.saver_watcher = None
+        # Защита от перегрева без системной службы (settings.thermal_rules)
+        self.thermal = None
+        # Действия с экраном и отслеживание активности для их отмены
+        self.display = display_power.DisplayState()
+        self.display_watchers = []
+        self.session_idle = None
+        # Граница расписания, на которой экран возвращается, если не было ввода
+        self.display_until = None
+        
+        # Сторож цикла событий и профилирование по сигналу (SIGUSR1/SIGUSR2)
+        self.watchdog = tk_watchdog.LoopWatchdog(self)
+        self.watchdog.start()
+        self.diagnostics = tk_watchdog.Diagnostics()
+        self.diagnostics.install_signals()
         self.message_queue = queue.Queue()
         
         # Настройка окна
@@ -53,15 +90,37 @@ class TimeMasterApp(ctk.CTk):
         # Загрузка конфигурации
         self.config = self.load_config()
         
+        # Журнал событий сна и пробуждения
+        self.history = HistoryStore(HISTORY_FILE)
+        self.resume_watcher = ResumeWatcher(self.on_resume)
+        self.resume_watcher.start()
+        
+        # Отчеты центральному сборщику (settings.report_url)
+        self.reporter = None
+        self.start_reporter()
+        
+        # Учет энергии в бодрствовании и во сне
+        self.energy = EnergySampler()
+        self.energy.start()
+        
+        # Профили прогрева кэша для программ автозапуска
+        self.warmup_profiles = cache_warmup.WarmupProfiles()
+        
         # Создание интерфейса
         self.create_ui()
         
         # Запуск планировщика
         self.start_scheduler()
         
+        # API управления для timemaster CLI
+        self.start_control_server()
+        
         # Запуск обработки сообщений
         self.process_messages()
         
+        # Прогрев кэша и запуск программ автозапуска, затем отметка готовности
+        self.after_idle(self.start_autostart)
+        
         # Обновление времени
         self.update_time()
         
@@ -83,36 +142,35 @@ class TimeMasterApp(ctk.CTk):
 
     def load_config(self):
         """Загрузка конфигурации"""
-        default_config = {
-            "schedule": {
-                day: {
-                    "enabled": True if i < 5 else False,
-                    "on_time": None,
-                    "off_time": "23:00",
-                    "action": "Сон"
-                } for i, day in enumerate(DAYS_OF_WEEK_SHORT)
-            },
-            "autostart_programs": [],
-            "settings": {
-                "theme": "dark",
-                "start_minimized": False,
-                "notifications": True
-            }
-        }
-        
         try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return schedule_model.load_config(CONFIG_FILE)
         except Exception as e:
             print(f"Ошибка загрузки конфигурации: {e}")
-        return default_config
+        return schedule_model.default_config()
+
+    def start_reporter(self):
+        """Запуск отправки состояния сборщику, если задан его адрес"""
+        url = self.config["settings"].get("report_url")
+        if not url:
+            return
+        self.reporter = status_reporter.StatusReporter(url, app="timemaster", status=self.report_status)
+        self.reporter.start()
+
+    def report_status(self):
+        """Сводка для сборщика (из потока отправки)"""
+        schedule = dict(self.config["schedule"])
+        fires = schedule_model.next_week_fires(schedule, datetime.datetime.now(), 1)
+        return {
+            "schedule": schedule,
+            "next_fire": {"time": fires[0][0].isoformat(), "day": fires[0][1], "kind": fires[0][2],
+                          "action": fires[0][3]} if fires else None,
+            "daemon_mode": getattr(self, "daemon_mode", False),
+        }
 
     def save_config(self):
         """Сохранение конфигурации"""
         try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
+            schedule_model.save_config(self.config, CONFIG_FILE)
             return True
         except Exception as e:
             print(f"Ошибка сохранения конфигурации: {e}")
@@ -153,6 +211,10 @@ class TimeMasterApp(ctk.CTk):
         self.schedule_tab = self.tabview.add("📅 Расписание")
         self.create_schedule_ui()
         
+        # Вкладка плана на 7 дней
+        self.timeline_tab = self.tabview.add("🗓️ План")
+        self.create_timeline_ui()
+        
         # Вкладка автозапуска
         self.programs_tab = self.tabview.add("🚀 Автозапуск")
         self.create_programs_ui()
@@ -161,6 +223,10 @@ class TimeMasterApp(ctk.CTk):
         self.settings_tab = self.tabview.add("⚙️ Настройки")
         self.create_settings_ui()
         
+        # Вкладка истории
+        self.history_tab = self.tabview.add("📊 История")
+        self.create_history_ui()
+        
         # Статус бар
         self.status_var = ctk.StringVar(value="⏱️ Идет подготовка...")
         status_frame = ctk.CTkFrame(self, height=30, corner_radius=0)
@@ -241,6 +307,10 @@ class TimeMasterApp(ctk.CTk):
         self.on_time_vars = {}
         self.off_time_vars = {}
         self.action_vars = {}
+        # Поля таблицы для подсветки ошибок: (день, поле) -> виджет
+        self.grid_widgets = {}
+        self.grid_errors = []
+        self.validate_job = None
         
         # Заполнение таблицы
         for row, day in enumerate(DAYS_OF_WEEK_SHORT, start=1):
@@ -275,6 +345,7 @@ class TimeMasterApp(ctk.CTk):
                 justify="center"
             )
             on_time_entry.grid(row=row, column=2, padx=5, pady=5)
+            self.grid_widgets[(day, "on_time")] = on_time_entry
             
             # Время выключения
             self.off_time_vars[day] = ctk.StringVar(
@@ -286,6 +357,7 @@ class TimeMasterApp(ctk.CTk):
                 justify="center"
             )
             off_time_entry.grid(row=row, column=3, padx=5, pady=5)
+            self.grid_widgets[(day, "off_time")] = off_time_entry
             
             # Действие
             self.action_vars[day] = ctk.StringVar(
@@ -293,10 +365,15 @@ class TimeMasterApp(ctk.CTk):
             action_dropdown = ctk.CTkComboBox(
                 table_frame,
                 variable=self.action_vars[day],
-                values=ACTIONS,
+                values=SCHEDULE_ACTIONS,
                 width=150
             )
             action_dropdown.grid(row=row, column=4, padx=5, pady=5)
+            self.grid_widgets[(day, "action")] = action_dropdown
+            
+            # Проверка ввода - с задержкой, а не на каждое нажатие клавиши
+            for var in (self.on_time_vars[day], self.off_time_vars[day], self.action_vars[day]):
+                var.trace_add("write", lambda *_: self.schedule_edited())
             
             # Кнопка копирования
             copy_btn = ctk.CTkButton(
@@ -336,6 +413,45 @@ class TimeMasterApp(ctk.CTk):
             hover_color="#c0392b"
         ).pack(side="left", padx=5)
 
+    def schedule_edited(self):
+        """Отложенная проверка таблицы: перезапуск таймера при каждом изменении"""
+        if self.validate_job is not None:
+            self.after_cancel(self.validate_job)
+        self.validate_job = self.after(VALIDATE_DELAY, self.validate_grid)
+
+    def read_schedule_grid(self):
+        """Расписание из полей таблицы: (записи дней, ошибки [(день, поле, текст)])"""
+        schedule, errors = {}, []
+        for day in DAYS_OF_WEEK_SHORT:
+            entry = {"enabled": self.day_enabled[day].get()}
+            for field, title, var in (("on_time", "время включения", self.on_time_vars[day]),
+                                      ("off_time", "время выключения", self.off_time_vars[day])):
+                try:
+                    entry[field] = schedule_model.normalize_hhmm(var.get())
+                except ValueError:
+                    errors.append((day, field, f"{title} «{var.get()}»"))
+            entry["action"] = self.action_vars[day].get()
+            if entry["action"] not in SCHEDULE_ACTIONS:
+                errors.append((day, "action", f"действие «{entry['action']}»"))
+            schedule[day] = entry
+        return schedule, errors
+
+    def validate_grid(self):
+        """Подсветка неверных полей таблицы, список ошибок"""
+        self.validate_job = None
+        _, errors = self.read_schedule_grid()
+        bad = {(day, field) for day, field, _ in errors}
+        for key, widget in self.grid_widgets.items():
+            default = ctk.ThemeManager.theme[type(widget).__name__]["border_color"]
+            widget.configure(border_color=ERROR_BORDER if key in bad else default)
+        if errors:
+            self.status_var.set("⚠️ Ошибка в расписании: " +
+                                "; ".join(f"{day}: {text}" for day, _, text in errors))
+        elif self.grid_errors:
+            self.status_var.set("✅ Расписание заполнено верно")
+        self.grid_errors = errors
+        return errors
+
     def copy_day_settings(self, day):
         """Копирование настроек выбранного дня на все остальные дни"""
         settings = {
@@ -367,9 +483,34 @@ class TimeMasterApp(ctk.CTk):
             self.day_enabled[day].set(True if DAYS_OF_WEEK_SHORT.index(day) < 5 else False)
             self.on_time_vars[day].set("")
             self.off_time_vars[day].set("23:00")
-            self.action_vars[day].set("Сон")
+            self.action_vars[day].set(task_model.ACTION_LABELS[task_model.SUSPEND])
         self.status_var.set("⚡ Расписание сброшено к значениям по умолчанию")
 
+    def create_timeline_ui(self):
+        """Шкала ближайших 7 дней: выключения и включения по расписанию"""
+        ctk.CTkLabel(
+            self.timeline_tab,
+            text="▮ выключение/сон (верх строки)   ▮ включение (низ строки)   | сейчас",
+            font=("Arial", 12), anchor="w"
+        ).pack(fill="x", padx=20, pady=(10, 0))
+        canvas = ctk.CTkCanvas(
+            self.timeline_tab, highlightthickness=0,
+            bg="#242424" if ctk.get_appearance_mode() == "Dark" else "#ebebeb"
+        )
+        canvas.pack(fill="both", expand=True, padx=20, pady=10)
+        self.timeline = timeline_view.Timeline(canvas)
+        self.tick_timeline()
+
+    def refresh_timeline(self):
+        """Перерисовка изменившихся событий шкалы (только из потока Tk)"""
+        now = datetime.datetime.now()
+        self.timeline.set_events(timeline_view.week_events(self.config["schedule"], now), now)
+
+    def tick_timeline(self):
+        """Сдвиг отметки "сейчас" и удаление прошедших событий раз в минуту"""
+        self.refresh_timeline()
+        self.after(60000, self.tick_timeline)
+
     def create_programs_ui(self):
         """Создание интерфейса для автозапуска программ"""
         # Заголовок
@@ -409,6 +550,7 @@ class TimeMasterApp(ctk.CTk):
         
         # Загрузка существующих программ
         self.autostart_program_frames = []
+        self.program_time_labels = {}
         for program in self.config["autostart_programs"]:
             self.add_program_ui(program)
         
@@ -444,6 +586,12 @@ class TimeMasterApp(ctk.CTk):
             anchor="w"
         ).pack(side="left", padx=10, pady=5, fill="x", expand=True)
         
+        # Время запуска без прогрева и с прогревом кэша
+        times_label = ctk.CTkLabel(frame, text="", font=("Arial", 11), text_color="#7f8c8d")
+        times_label.pack(side="left", padx=5)
+        self.program_time_labels[program_path] = times_label
+        self.update_program_times(program_path)
+        
         btn = ctk.CTkButton(
             frame,
             text="📂 Показать",
@@ -457,6 +605,19 @@ class TimeMasterApp(ctk.CTk):
         frame.pack(fill="x", pady=3, padx=2)
         self.autostart_program_frames.append((frame, program_path))
 
+    def update_program_times(self, program_path):
+        """Подпись с медианами холодного и прогретого запуска"""
+        label = self.program_time_labels.get(program_path)
+        if label is None:
+            return
+        times = self.warmup_profiles.launch_times(program_path)
+        parts = []
+        if times["cold"] is not None:
+            parts.append(f"холодный {times['cold']:.1f} с")
+        if times["warm"] is not None:
+            parts.append(f"с прогревом {times['warm']:.1f} с")
+        label.configure(text=" / ".join(parts))
+
     def add_program(self):
         """Добавление новой программы (адаптировано для Linux)"""
         file_types = [("Все файлы", "*.*")]  # Linux-friendly
@@ -475,6 +636,210 @@ class TimeMasterApp(ctk.CTk):
         # В реальной реализации здесь будет логика удаления
         self.status_var.set("⚡ Выбранные программы удалены из автозапуска")
 
+    def create_history_ui(self):
+        """Создание вкладки истории сна и пробуждения"""
+        header = ctk.CTkLabel(
+            self.history_tab,
+            text="История сна и пробуждения",
+            font=("Arial", 20, "bold")
+        )
+        header.pack(pady=(10, 15))
+        
+        controls = ctk.CTkFrame(self.history_tab, fg_color="transparent")
+        controls.pack(fill="x", padx=20)
+        
+        ctk.CTkLabel(controls, text="Период:", font=("Arial", 14)).pack(side="left", padx=5)
+        self.history_period = ctk.StringVar(value="7 дней")
+        ctk.CTkSegmentedButton(
+            controls,
+            values=["7 дней", "30 дней", "90 дней"],
+            variable=self.history_period,
+            command=self.select_history_period
+        ).pack(side="left", padx=5)
+        
+        ctk.CTkButton(
+            controls,
+            text="🔄 Обновить",
+            command=self.refresh_history,
+            width=120
+        ).pack(side="right", padx=5)
+        
+        # Отчеты: часы сна по дням и соблюдение расписания
+        self.history_report = ctk.CTkTextbox(self.history_tab, height=220, font=("Courier", 12))
+        self.history_report.pack(fill="x", padx=20, pady=10)
+        
+        # Журнал событий постранично
+        self.history_events = ctk.CTkTextbox(self.history_tab, font=("Courier", 12))
+        self.history_events.pack(fill="both", expand=True, padx=20, pady=(0, 5))
+        
+        pager = ctk.CTkFrame(self.history_tab, fg_color="transparent")
+        pager.pack(fill="x", padx=20, pady=(0, 10))
+        self.history_offset = 0
+        ctk.CTkButton(pager, text="◀ Новее", width=100,
+                      command=lambda: self.page_history(-HISTORY_PAGE)).pack(side="left", padx=5)
+        self.history_page_label = ctk.CTkLabel(pager, text="", font=("Arial", 12))
+        self.history_page_label.pack(side="left", padx=10)
+        ctk.CTkButton(pager, text="Старше ▶", width=100,
+                      command=lambda: self.page_history(HISTORY_PAGE)).pack(side="left", padx=5)
+        
+        self.refresh_history()
+
+    def select_history_period(self, value):
+        """Смена периода отчетов - журнал снова с первой страницы"""
+        self.history_offset = 0
+        self.refresh_history()
+
+    def page_history(self, delta):
+        """Листание журнала событий"""
+        self.history_offset = max(0, self.history_offset + delta)
+        self.refresh_history()
+
+    def refresh_history(self):
+        """Построение отчетов в фоне: SQL-агрегаты за период и одна страница журнала"""
+        days = int(self.history_period.get().split()[0])
+        offset = self.history_offset
+        
+        def build():
+            today = datetime.date.today()
+            start_date = today - datetime.timedelta(days=days - 1)
+            end_date = today + datetime.timedelta(days=1)
+            try:
+                hours = self.history.hours_asleep_per_day(start_date, end_date)
+                compliance = self.history.weekday_compliance(start_date, end_date)
+                total = self.history.count(start_date, end_date)
+                events = self.history.query(start_date, end_date, limit=HISTORY_PAGE, offset=offset)
+            except Exception as e:
+                self.message_queue.put(f"⚠️ Ошибка чтения истории: {str(e)}")
+                return
+            weeks = self.energy.weekly_savings(max(1, days // 7))
+            report = self.format_history_report(hours, compliance) + "\n\n" + self.format_energy_report(weeks)
+            lines = [self.format_history_event(event) for event in events]
+            self.message_queue.put(
+                lambda: self.show_history(report, lines, offset, total))
+        
+        threading.Thread(target=build, daemon=True).start()
+
+    def format_history_report(self, hours, compliance):
+        """Текст отчетов: полосы часов сна и доля выполненных действий"""
+        lines = ["Часы сна по дням:"]
+        # При 90 днях показываем только последние 30 строк, итог - за весь период
+        for date, value in hours[-30:]:
+            bar = "█" * int(round(value))
+            lines.append(f"  {date:%d.%m} {DAYS_OF_WEEK_SHORT[date.weekday()]} {value:5.1f} ч {bar}")
+        total = sum(value for _, value in hours)
+        lines.append(f"  Всего: {total:.1f} ч, в среднем {total / max(1, len(hours)):.1f} ч в день")
+        lines.append("")
+        lines.append("Соблюдение расписания (выполнено / наступило):")
+        for weekday, (done, due, ratio) in sorted(compliance.items()):
+            percent = "—" if ratio is None else f"{ratio * 100:.0f}%"
+            lines.append(f"  {DAYS_OF_WEEK_SHORT[weekday]}: {done}/{due} {percent}")
+        return "\n".join(lines)
+
+    def format_energy_report(self, weeks):
+        """Текст отчета об энергии: сэкономленные кВт*ч по неделям"""
+        lines = ["Энергия (сэкономлено сном):"]
+        measured = False
+        # Для длинных периодов - последние 4 недели, итог за все
+        for start, report in weeks[-4:]:
+            if report["awake_watts"] is None:
+                continue
+            measured = True
+            asleep = "—" if report["asleep_watts"] is None else f"{report['asleep_watts']:.1f} Вт"
+            saved = "неизвестно" if report["saved_kwh"] is None else f"{report['saved_kwh']:.2f} кВт·ч"
+            lines.append(f"  с {start:%d.%m}: {saved} "
+                         f"(работа {report['awake_watts']:.1f} Вт, сон {asleep}, "
+                         f"{report['asleep_hours']:.1f} ч сна)")
+            if report["unmeasured_hours"]:
+                lines.append(f"    из них {report['unmeasured_hours']:.1f} ч сна без счетчика - "
+                             f"экономия за них неизвестна")
+        if not measured:
+            lines.append("  нет данных: счетчики RAPL/батареи недоступны")
+        else:
+            lines.append(f"  Всего измерено: {sum(r['saved_kwh'] or 0.0 for _, r in weeks):.2f} кВт·ч")
+        return "\n".join(lines)
+
+    def format_history_event(self, event):
+        """Строка журнала событий"""
+        moment = datetime.datetime.fromtimestamp(event["ts"])
+        parts = [f"{moment:%d.%m %H:%M:%S}", f"{event['kind']:<10}"]
+        for field in ("action", "source", "detail"):
+            if event[field]:
+                parts.append(str(event[field]))
+        return "  ".join(parts)
+
+    def show_history(self, report, lines, offset, total):
+        """Вывод отчетов во вкладку (в потоке Tk)"""
+        self.history_report.delete("1.0", "end")
+        self.history_report.insert("1.0", report)
+        self.history_events.delete("1.0", "end")
+        self.history_events.insert("1.0", "\n".join(lines) or "Событий за период нет")
+        last = min(total, offset + HISTORY_PAGE)
+        self.history_page_label.configure(text=f"{offset + 1 if total else 0}–{last} из {total}")
+
+    def on_resume(self, suspended_at, resumed_at, slept):
+        """Пробуждение системы (из потока ResumeWatcher)"""
+        self.history.record_sleep(suspended_at, resumed_at)
+        if self.reporter:
+            self.reporter.resume(suspended_at, resumed_at)
+        self.message_queue.put(f"☀️ Пробуждение после сна: {slept / 3600:.1f} ч")
+        # Программы уже запущены; после гибернации их файлы могли уйти из кэша
+        programs = list(self.config["autostart_programs"])
+        if programs:
+            cache_warmup.warm_up(programs, self.warmup_profiles)
+        self.report_ready()
+
+    def start_autostart(self):
+        """Запуск программ автозапуска с прогревом кэша (один раз за загрузку)"""
+        programs = list(self.config["autostart_programs"])
+        if not programs or not self.warmup_profiles.first_launch_this_boot():
+            self.report_ready()
+            return
+        self.message_queue.put(f"🚀 Запуск программ автозапуска: {len(programs)}")
+        threads, summary = cache_warmup.launch_autostart(
+            programs, self.warmup_profiles, self.on_program_launched)
+        
+        def wait_all():
+            for thread in threads:
+                thread.join()
+            if summary["files"]:
+                print(f"Прогрето файлов: {summary['files']}, "
+                      f"{summary['bytes'] / 1048576:.0f} МБ, пропущено: {summary['skipped']}")
+            self.report_ready()
+        
+        threading.Thread(target=wait_all, daemon=True).start()
+
+    def on_program_launched(self, program, seconds, result):
+        """Итог запуска программы (из потока наблюдения)"""
+        name = os.path.basename(program)
+        if seconds is None:
+            self.message_queue.put(f"⚠️ Не удалось запустить {name}: {result}")
+            return
+        kind = "с прогревом" if result else "холодный"
+        self.message_queue.put(f"🚀 {name}: запуск за {seconds:.1f} с ({kind})")
+        self.message_queue.put(lambda: self.update_program_times(program))
+
+    def report_ready(self):
+        """Отметка готовности рабочего места в системной службе"""
+        if not self.daemon_mode:
+            return
+        
+        def send():
+            try:
+                with ControlClient(DAEMON_SOCKET, timeout=2) as client:
+                    client.call("wake.ready")
+            except Exception as e:
+                print(f"Служба не получила отметку готовности: {e}")
+        
+        threading.Thread(target=send, daemon=True).start()
+
+    def report_idle(self, active):
+        """Сообщение службе о хранителе экрана сеанса (None - сеанс закрывается)"""
+        try:
+            with ControlClient(DAEMON_SOCKET, timeout=2) as client:
+                client.call("idle.report", active=active)
+        except Exception as e:
+            print(f"Служба не получила состояние хранителя экрана: {e}")
+
     def create_settings_ui(self):
         """Создание интерфейса настроек"""
         # Заголовок
@@ -579,6 +944,14 @@ class TimeMasterApp(ctk.CTk):
         )
         minimize_switch.pack(anchor="w", pady=15)
         
+        # Экспорт расписания в таймеры systemd
+        ctk.CTkButton(
+            advanced_frame,
+            text="📤 Экспорт расписания в systemd",
+            command=self.export_systemd,
+            width=260
+        ).pack(anchor="w", pady=5)
+        
         # Информация о BIOS
         bios_info = ctk.CTkLabel(
             advanced_frame,
@@ -593,11 +966,97 @@ class TimeMasterApp(ctk.CTk):
         )
         bios_info.pack(anchor="w", pady=10)
 
+    def export_systemd(self):
+        """Экспорт расписания в таймеры systemd (без резидентного планировщика)"""
+        if not self.apply_changes():
+            return
+        self.status_var.set("⌛ Экспорт расписания в systemd...")
+        
+        def run_export():
+            try:
+                result = subprocess.run(
+                    ["pkexec", sys.executable, os.path.join(APP_DIR, "systemd_units.py"),
+                     "--config", CONFIG_FILE],
+                    capture_output=True,
+                    text=True
+                )
+                if result.returncode == 0:
+                    summary = result.stdout.strip().splitlines()
+                    self.message_queue.put(f"✅ Экспорт в systemd: {summary[-1]}")
+                else:
+                    error_msg = result.stderr.strip() or "Неизвестная ошибка"
+                    self.message_queue.put(f"⚠️ Ошибка экспорта: {error_msg}")
+            except Exception as e:
+                self.message_queue.put(f"⚠️ Ошибка экспорта: {str(e)}")
+        
+        threading.Thread(target=run_export, daemon=True).start()
+
     def start_scheduler(self):
-        """Запуск фонового планировщика"""
+        """Запуск фонового планировщика (если нет системной службы TimeMaster)"""
+        self.daemon_mode = self.notify_daemon()
+        if self.daemon_mode:
+            # Расписание выполняет служба, собственный поток не нужен
+            print("Расписание выполняет системная служба TimeMaster")
+            # Хранитель экрана сеанса - для правил простоя службы
+            self.saver_watcher = idle_watch.ScreenSaverWatcher(self.report_idle)
+            self.saver_watcher.start()
+        else:
+            # Со службой правила перегрева задаются ее политикой
+            self.start_thermal()
+        # В режиме службы поток выполняет только действия с экрана (они в сеансе пользователя)
         self.scheduler_thread = threading.Thread(target=self.check_schedule, daemon=True)
         self.scheduler_thread.start()
 
+    def start_thermal(self):
+        """Опрос датчиков температуры, если заданы правила перегрева"""
+        items = self.config["settings"].get("thermal_rules")
+        if not items:
+            return
+        try:
+            rules = thermal_watch.load_rules(items)
+        except ValueError as e:
+            print(f"Правила перегрева не загружены: {e}")
+            return
+        self.thermal = thermal_watch.ThermalWatch(rules, self.thermal_action, on_event=self.thermal_event)
+        self.thermal.start()
+
+    def thermal_action(self, action, reason):
+        """Действие правила перегрева (из потока опроса датчиков)
+
+        Срабатывание уже записано thermal_event; источник THERMAL не попадает
+        в соблюдение расписания.
+        """
+        self.execute_action(action, history_store.THERMAL)
+
+    def thermal_event(self, event):
+        """Переход правила перегрева - в журнал событий и подписчикам API"""
+        print(f"Перегрев ({event['event']}): {event['sensor']} {event['temp']}°C")
+        self.history.record(history_store.THERMAL, event["action"], event["sensor"],
+                            json.dumps(event, ensure_ascii=False))
+        self.emit_event("thermal", **{k: v for k, v in event.items() if k != "time"})
+
+    def notify_daemon(self, days=None):
+        """Сообщение системной службе о новом расписании; False если службы нет
+
+        days - список измененных дней: служба пересчитывает только их, не
+        перечитывая файл; без него - полное перечитывание (при запуске).
+        """
+        if not os.path.exists(DAEMON_SOCKET):
+            return False
+        try:
+            with ControlClient(DAEMON_SOCKET, timeout=2) as client:
+                if days:
+                    status = client.call("schedule.update",
+                                         days={day: self.config["schedule"][day] for day in days})
+                else:
+                    status = client.call("schedule.reload")
+            if not status.get("allowed", True):
+                self.message_queue.put("⚠️ Политика администратора не разрешает вам управлять питанием")
+            return True
+        except Exception as e:
+            print(f"Системная служба недоступна: {e}")
+            return False
+
     def check_schedule(self):
         """Проверка расписания для выполнения действий"""
         while self.scheduler_active:
@@ -616,30 +1075,56 @@ class TimeMasterApp(ctk.CTk):
             day = DAYS_OF_WEEK_SHORT[current_day]
             schedule = self.config["schedule"][day]
             
+            # Следующее срабатывание расписания после затемнения возвращает экран
+            # (on_time по умолчанию не задан, а ввода может и не быть)
+            if self.display.active and self.display_until and now >= self.display_until:
+                self.restore_display("граница расписания")
+            
             if schedule.get("enabled", False):
                 # Проверка на время выключения
                 off_time = schedule.get("off_time")
-                if off_time and off_time == current_time:
-                    self.execute_action(schedule.get("action", "Сон"))
+                action = schedule.get("action", task_model.ACTION_LABELS[task_model.SUSPEND])
+                own_action = not self.daemon_mode or task_model.is_screen_action(action)
+                if off_time and off_time == current_time and own_action:
+                    self.history.record(history_store.SCHEDULED, action, day)
+                    self.execute_action(action, day)
                     
                 # Проверка на время включения
                 on_time = schedule.get("on_time")
                 if on_time and on_time == current_time:
                     self.status_var.set("☀️ По расписанию: Время включения ПК")
+                    if self.display.active:
+                        self.restore_display("время включения")
 
-    def execute_action(self, action):
-        """Выполнение действия согласно расписания"""
+    def execute_action(self, action, source=history_store.MANUAL):
+        """Выполнение действия согласно расписания (source - день расписания или manual)"""
+        # Команды - по кодам task_model, название действия только для статуса и журнала
         linux_cmd = {
-            "Выключить": "systemctl poweroff",
-            "Сон": "systemctl suspend",
-            "Гибернация": "systemctl hibernate",
-            "Перезагрузка": "systemctl reboot"
+            task_model.POWEROFF: "systemctl poweroff",
+            task_model.SUSPEND: "systemctl suspend",
+            task_model.HIBERNATE: "systemctl hibernate",
+            task_model.REBOOT: "systemctl reboot",
+            task_model.SUSPEND_HIBERNATE: "systemctl suspend-then-hibernate",
+            task_model.HYBRID: "systemctl hybrid-sleep"
         }
+        code = task_model.ACTION_BY_LABEL.get(action)
+        
+        if code in task_model.SCREEN_ACTIONS:
+            self.execute_display_action(action, source)
+            return
+        
+        if sys.platform == "linux" and code == task_model.AUTO_MODE:
+            action = self.plan_auto(source)
+            code = task_model.ACTION_BY_LABEL.get(action)
         
         if sys.platform == "linux":
-            cmd = linux_cmd.get(action)
+            cmd = linux_cmd.get(code)
             if cmd:
                 self.status_var.set(f"⌛ Выполняем: {action}...")
+                # Граница интервала учета энергии - момент перед уходом в сон
+                self.energy.sample()
+                if self.reporter:
+                    self.reporter.suspend()
                 try:
                     # Пытаемся запустить с sudo
                     result = subprocess.run(
@@ -650,22 +1135,28 @@ class TimeMasterApp(ctk.CTk):
                     
                     if result.returncode == 0:
                         self.status_var.set(f"✅ Выполнено: {action}")
+                        self.history.record(history_store.FIRED, action, source)
+                        self.emit_event("action_done", action=action)
                     else:
                         error_msg = result.stderr.strip() or "Неизвестная ошибка"
                         self.status_var.set(f"⚠️ Ошибка: {error_msg}")
+                        self.history.record(history_store.FAILED, action, source, error_msg)
+                        self.emit_event("action_failed", action=action, error=error_msg)
                 except Exception as e:
                     self.status_var.set(f"⚠️ Ошибка выполнения: {str(e)}")
+                    self.history.record(history_store.FAILED, action, source, str(e))
+                    self.emit_event("action_failed", action=action, error=str(e))
         else:
             # Оригинальный код для Windows
             action_map = {
-                "Выключить": "shutdown /s /f /t 0",
-                "Сон": "rundll32.exe powrprof.dll,SetSuspendState 0,1,0",
-                "Гибернация": "shutdown /h",
-                "Перезагрузка": "shutdown /r /f /t 0"
+                task_model.POWEROFF: "shutdown /s /f /t 0",
+                task_model.SUSPEND: "rundll32.exe powrprof.dll,SetSuspendState 0,1,0",
+                task_model.HIBERNATE: "shutdown /h",
+                task_model.REBOOT: "shutdown /r /f /t 0"
             }
             
             if sys.platform == "win32":
-                cmd = action_map.get(action)
+                cmd = action_map.get(code)
                 if cmd:
                     try:
                         subprocess.run(cmd, shell=True)
@@ -675,12 +1166,91 @@ class TimeMasterApp(ctk.CTk):
             else:
                 self.status_var.set("⚠️ Поддержка только для Windows/Linux")
 
+    def execute_display_action(self, action, source):
+        """Действие с экраном: машина остается включенной, выход - при вводе или в on_time"""
+        ok, error = self.display.apply(action)
+        if ok:
+            self.status_var.set(f"✅ Выполнено: {action}")
+            self.history.record(history_store.FIRED, action, source)
+            self.emit_event("action_done", action=action)
+            self.watch_display_activity()
+        else:
+            self.status_var.set(f"⚠️ Ошибка: {error}")
+            self.history.record(history_store.FAILED, action, source, error)
+            self.emit_event("action_failed", action=action, error=error)
+
+    def watch_display_activity(self):
+        """Отслеживание ввода, пока действие с экраном не отменено"""
+        fires = schedule_model.next_week_fires(self.config["schedule"], datetime.datetime.now(), 1)
+        self.display_until = fires[0][0] if fires else None
+        if self.display_watchers:
+            return
+        # Счетчик простоя ввода - основной признак; logind и хранитель экрана -
+        # для сеансов, где его нет (IdleHint на X11 всегда false)
+        watchers = [idle_watch.LogindIdle(self.on_session_idle),
+                    idle_watch.ScreenSaverWatcher(self.on_display_saver)]
+        input_watcher = display_power.InputWatcher(self.on_user_input)
+        if input_watcher.start():
+            watchers.append(input_watcher)
+        for watcher in watchers[:2]:
+            watcher.start()
+        self.display_watchers = watchers
+
+    def stop_display_watch(self):
+        for watcher in self.display_watchers:
+            watcher.stop()
+        self.display_watchers = []
+        self.session_idle = None
+        self.display_until = None
+
+    def on_user_input(self):
+        if self.display.active:
+            self.restore_display("ввод пользователя")
+
+    def on_display_saver(self, active):
+        """Хранитель экрана отключился - пользователь вернулся"""
+        if not active and self.display.active:
+            self.restore_display("хранитель экрана отключен")
+
+    def on_session_idle(self, idle, since):
+        """Изменение простоя по logind: переход к активности отменяет затемнение"""
+        was_idle, self.session_idle = self.session_idle, idle
+        if was_idle and not idle and self.display.active:
+            self.restore_display("активность пользователя")
+
+    def restore_display(self, reason):
+        """Возврат экрана в обычное состояние"""
+        self.stop_display_watch()
+        errors = self.display.restore()
+        if errors:
+            self.message_queue.put(f"⚠️ Экран не восстановлен: {'; '.join(errors)}")
+        else:
+            self.message_queue.put(f"🖥️ Экран восстановлен ({reason})")
+
+    def plan_auto(self, source):
+        """Выбор режима сна для "Авто" с записью решения в журнал"""
+        now = datetime.datetime.now()
+        deadline = schedule_model.next_on_time(self.config["schedule"], now)
+        decision = sleep_planner.plan(deadline, now)
+        try:
+            sleep_planner.apply_delay(decision)
+        except OSError:
+            # Без прав root задержку не изменить - действует HibernateDelaySec системы
+            decision["delay_applied"] = False
+        self.history.record(history_store.PLANNED, decision["mode"], source,
+                            json.dumps(decision, ensure_ascii=False, default=str))
+        self.message_queue.put(f"🤖 Авто: {sleep_planner.describe(decision)}")
+        return decision["mode"]
+
     def process_messages(self):
-        """Обработка сообщений из очереди"""
+        """Обработка сообщений из очереди (строки статуса или вызовы в потоке Tk)"""
         try:
             while not self.message_queue.empty():
                 message = self.message_queue.get_nowait()
-                self.status_var.set(message)
+                if callable(message):
+                    message()
+                else:
+                    self.status_var.set(message)
         except queue.Empty:
             pass
         
@@ -690,32 +1260,51 @@ class TimeMasterApp(ctk.CTk):
     def update_time(self):
         """Обновление статусбара с текущим временем"""
         current_time = datetime.datetime.now().strftime("%H:%M:%S")
-        self.status_var.set(f"Система: ⏱️ {current_time} | ✓ Режим планировщика: {'Активен' if self.scheduler_active else 'Остановлен'}")
+        if self.daemon_mode:
+            mode = "Системная служба"
+        else:
+            mode = 'Активен' if self.scheduler_active else 'Остановлен'
+        self.status_var.set(f"Система: ⏱️ {current_time} | ✓ Режим планировщика: {mode}")
         self.after(1000, self.update_time)
 
     def apply_changes(self):
-        """Применение изменений"""
-        # Сохранение расписания
-        for day in DAYS_OF_WEEK_SHORT:
-            self.config["schedule"][day] = {
-                "enabled": self.day_enabled[day].get(),
-                "on_time": self.on_time_vars[day].get(),
-                "off_time": self.off_time_vars[day].get(),
-                "action": self.action_vars[day].get()
-            }
+        """Применение изменений: в планировщик попадают только изменившиеся дни"""
+        if self.validate_job is not None:
+            self.after_cancel(self.validate_job)
+        if self.validate_grid():
+            return False
+        schedule, _ = self.read_schedule_grid()
+        changed = schedule_model.diff_schedule(self.config["schedule"], schedule)
+        # Планировщик читает записи дней целиком - подменяем только изменившиеся
+        for day in changed:
+            self.config["schedule"][day] = schedule[day]
+        # Время хранится как ЧЧ:ММ - поля показывают нормализованное значение
+        self.refresh_schedule_vars(changed)
         
         # Сохранение настроек
-        self.config["settings"] = {
+        settings = {
+            **self.config["settings"],
             "theme": self.theme_var.get(),
             "start_minimized": self.minimize_var.get(),
             "notifications": self.notify_enabled.get()
         }
+        if not changed and settings == self.config["settings"]:
+            self.status_var.set("✅ Изменений нет, конфигурация актуальна")
+            return True
+        self.config["settings"] = settings
         
         if self.save_config():
-            self.status_var.set("⚡ Изменения применены! Конфигурация сохранена.")
+            if changed:
+                if self.daemon_mode:
+                    self.notify_daemon(changed)
+                self.refresh_timeline()
+                self.emit_event("schedule_updated", days=changed)
+            self.status_var.set("⚡ Изменения применены" +
+                                (f": {', '.join(changed)}" if changed else "") + ". Конфигурация сохранена.")
             self.after(3000, lambda: self.status_var.set("✅ Конфигурация актуальна"))
-        else:
-            self.status_var.set("⚠️ Ошибка сохранения конфигурации!")
+            return True
+        self.status_var.set("⚠️ Ошибка сохранения конфигурации!")
+        return False
 
     def execute_now(self):
         """Выполнение действия немедленно"""
@@ -735,11 +1324,11 @@ class TimeMasterApp(ctk.CTk):
             font=("Arial", 16)
         ).grid(row=0, column=0, pady=20, padx=20, sticky="w")
         
-        selected_action = ctk.StringVar(value="Выключить")
+        selected_action = ctk.StringVar(value=task_model.ACTION_LABELS[task_model.POWEROFF])
         action_combo = ctk.CTkComboBox(
             dialog,
             variable=selected_action,
-            values=["Выключить", "Сон", "Гибернация", "Перезагрузка"],
+            values=SCHEDULE_ACTIONS,
             width=200
         )
         action_combo.grid(row=1, column=0, pady=10, padx=20, sticky="ew")
@@ -758,10 +1347,105 @@ class TimeMasterApp(ctk.CTk):
             fg_color="#e67e22"
         ).grid(row=2, column=0, pady=15)
 
+    def refresh_schedule_vars(self, days=None):
+        """Перенос расписания из конфигурации в поля таблицы"""
+        for day in days or DAYS_OF_WEEK_SHORT:
+            entry = self.config["schedule"][day]
+            self.day_enabled[day].set(entry["enabled"])
+            self.on_time_vars[day].set(entry["on_time"] or "")
+            self.off_time_vars[day].set(entry["off_time"] or "")
+            self.action_vars[day].set(entry["action"])
+
+    def start_control_server(self):
+        """Запуск API управления на Unix-сокете"""
+        self.control_server = None
+        try:
+            self.control_server = control_api.ControlServer(CONTROL_SOCKET, self)
+            self.control_server.start()
+        except Exception as e:
+            self.control_server = None
+            print(f"API управления недоступен: {e}")
+
+    def emit_event(self, event_type, **data):
+        """Публикация события для подписчиков API"""
+        if self.control_server:
+            self.control_server.publish(
+                event_type, time=datetime.datetime.now().isoformat(), **data)
+        if self.reporter:
+            self.reporter.report(event_type, **data)
+
+    # Методы API управления (вызываются из потока сервера)
+
+    def rpc_schedule_get(self):
+        return {"schedule": self.config["schedule"]}
+
+    def rpc_schedule_update(self, days):
+        updates = {}
+        for day, entry in days.items():
+            day = schedule_model.day_key(day)
+            merged = {**self.config["schedule"][day], **entry}
+            schedule_model.validate_day(merged)
+            for field in ("on_time", "off_time"):
+                merged[field] = schedule_model.normalize_hhmm(merged.get(field))
+            updates[day] = merged
+        # Планировщик читает записи дней целиком - подменяем их без блокировок
+        for day, entry in updates.items():
+            self.config["schedule"][day] = entry
+        self.save_config()
+        changed = list(updates)
+        if self.daemon_mode:
+            self.notify_daemon(changed)
+        self.message_queue.put(lambda: self.refresh_schedule_vars(changed))
+        self.message_queue.put(self.refresh_timeline)
+        self.message_queue.put(f"⚡ Расписание изменено извне: {', '.join(changed)}")
+        self.emit_event("schedule_updated", days=changed)
+        return {"updated": changed}
+
+    def rpc_fires_next(self, count=10):
+        fires = schedule_model.next_week_fires(
+            self.config["schedule"], datetime.datetime.now(), int(count))
+        return {"fires": [
+            {"time": moment.isoformat(), "day": day, "kind": kind, "action": action}
+            for moment, day, kind, action in fires
+        ]}
+
+    def rpc_actions_execute(self, action):
+        if action not in SCHEDULE_ACTIONS:
+            raise ValueError(f"Неизвестное действие: {action}")
+        threading.Thread(target=self.execute_action, args=[action], daemon=True).start()
+        return {"started": action}
+
+    def rpc_thermal_status(self):
+        return self.thermal.status() if self.thermal else {"rules": [], "readings": {}, "events": []}
+
+    def rpc_debug_profile(self, seconds=10):
+        return self.diagnostics.profile_for(self, float(seconds))
+
+    def rpc_debug_memory(self):
+        return {"path": self.diagnostics.memory_snapshot()}
+
+    def rpc_debug_stats(self):
+        return self.watchdog.stats()
+
     def on_closing(self):
         """Обработка закрытия приложения"""
         # Остановка планировщика
         self.scheduler_active = False
+        self.resume_watcher.stop()
+        self.energy.stop()
+        self.watchdog.stop()
+        self.stop_display_watch()
+        if self.display.active:
+            self.display.restore()
+        if self.saver_watcher:
+            self.saver_watcher.stop()
+            self.report_idle(None)
+        if self.control_server:
+            self.control_server.stop()
+        if self.reporter:
+            self.reporter.stop()
+        if self.thermal:
+            self.thermal.stop()
         
         # Сохранение состояния
         self.save_config()
@@ -0,0 +1,196 @@
+"""Журнал событий сна и пробуждения в SQLite
+
+Таблица events только дополняется. Индексы по времени и по (тип, время)
+позволяют выбирать диапазоны и строить отчеты агрегатами SQL, не загружая
+историю в память целиком.
+"""
+import os
+import time
+import sqlite3
+import datetime
+import threading
+
+# Типы событий
+SCHEDULED = "scheduled"  # наступило время задачи
+FIRED = "fired"          # команда действия выполнена
+DEFERRED = "deferred"    # действие отложено
+FAILED = "failed"        # ошибка выполнения
+SUSPENDED = "suspended"  # система ушла в сон
+RESUMED = "resumed"      # система проснулась
+PLANNED = "planned"      # выбран режим для "Авто" (detail - решение и входные данные)
+MERGED = "merged"        # задача совпала с более старшей (detail - ID выполненной задачи)
+THERMAL = "thermal"      # перегрев: переход правила (detail - датчик, температура, порог)
+EVENT_KINDS = [SCHEDULED, FIRED, DEFERRED, FAILED, SUSPENDED, RESUMED, PLANNED, MERGED, THERMAL]
+# Источник действий, запущенных вручную - в соблюдении расписания не учитываются
+MANUAL = "manual"
+# Действия вне расписания (вручную, по перегреву) - в соблюдении расписания не учитываются
+UNSCHEDULED_SOURCES = (MANUAL, THERMAL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    action TEXT,
+    source TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS events_kind_ts ON events(kind, ts);
+"""
+
+# Интервал сна длиннее этого срока считаем обрывом пары suspended/resumed
+MAX_SLEEP = 14 * 86400
+
+
+def _epoch(value):
+    """datetime, date или число секунд -> секунды эпохи"""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time()).timestamp()
+    return float(value)
+
+
+class HistoryStore:
+    """Журнал событий; один экземпляр безопасно использовать из нескольких потоков"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            # WAL: отчеты в GUI читают, не блокируя запись из планировщика
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def record(self, kind, action=None, source=None, detail=None, ts=None):
+        """Добавление события"""
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Неизвестный тип события: {kind}")
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO events (ts, kind, action, source, detail) VALUES (?, ?, ?, ?, ?)",
+                (time.time() if ts is None else _epoch(ts), kind, action, source, detail)
+            )
+            self.db.commit()
+
+    def record_sleep(self, suspended_at, resumed_at, source=None):
+        """Пара событий сна, обнаруженная по пробуждению"""
+        slept = resumed_at - suspended_at
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO events (ts, kind, action, source, detail) VALUES (?, ?, ?, ?, ?)",
+                [(suspended_at, SUSPENDED, None, source, None),
+                 (resumed_at, RESUMED, None, source, f"{slept:.0f}")]
+            )
+            self.db.commit()
+
+    def query(self, start, end, kinds=None, limit=100, offset=0, newest_first=True):
+        """События в диапазоне [start, end) постранично"""
+        sql = "SELECT * FROM events WHERE ts >= ? AND ts < ?"
+        params = [_epoch(start), _epoch(end)]
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params += list(kinds)
+        sql += f" ORDER BY ts {'DESC' if newest_first else 'ASC'} LIMIT ? OFFSET ?"
+        params += [int(limit), int(offset)]
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def count(self, start, end, kinds=None):
+        """Количество событий в диапазоне"""
+        sql = "SELECT COUNT(*) FROM events WHERE ts >= ? AND ts < ?"
+        params = [_epoch(start), _epoch(end)]
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params += list(kinds)
+        with self.lock:
+            return self.db.execute(sql, params).fetchone()[0]
+
+    def last_event(self, kind):
+        """Последнее событие указанного типа"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT * FROM events WHERE kind = ? ORDER BY ts DESC LIMIT 1", (kind,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def sleep_intervals(self, start, end):
+        """Интервалы сна (начало, конец), пересекающиеся с [start, end)"""
+        start, end = _epoch(start), _epoch(end)
+        # Пары suspended -> resumed подбираются оконной функцией прямо в SQLite
+        sql = """
+            SELECT ts, next_ts FROM (
+                SELECT ts, kind,
+                       LEAD(ts) OVER (ORDER BY ts) AS next_ts,
+                       LEAD(kind) OVER (ORDER BY ts) AS next_kind
+                FROM events
+                WHERE kind IN (?, ?) AND ts >= ? AND ts < ?
+            )
+            WHERE kind = ? AND next_kind = ?
+        """
+        with self.lock:
+            rows = self.db.execute(
+                sql, (SUSPENDED, RESUMED, start - MAX_SLEEP, end + MAX_SLEEP, SUSPENDED, RESUMED)
+            ).fetchall()
+        return [(max(a, start), min(b, end)) for a, b in rows
+                if b - a <= MAX_SLEEP and a < end and b > start]
+
+    def hours_asleep_per_day(self, start_date, end_date):
+        """Часы сна по дням: [(дата, часы)] для дат [start_date, end_date)"""
+        totals = {}
+        day = start_date
+        while day < end_date:
+            totals[day] = 0.0
+            day += datetime.timedelta(days=1)
+        for a, b in self.sleep_intervals(start_date, end_date):
+            # Интервал через полночь делится между днями
+            moment = datetime.datetime.fromtimestamp(a)
+            finish = datetime.datetime.fromtimestamp(b)
+            while moment < finish:
+                midnight = datetime.datetime.combine(moment.date() + datetime.timedelta(days=1), datetime.time())
+                piece_end = min(midnight, finish)
+                if moment.date() in totals:
+                    totals[moment.date()] += (piece_end - moment).total_seconds() / 3600
+                moment = piece_end
+        return sorted(totals.items())
+
+    def weekday_compliance(self, start, end):
+        """Соблюдение расписания по дням недели: {0..6: (выполнено, наступило, доля)}"""
+        sql = """
+            SELECT (CAST(strftime('%w', ts, 'unixepoch', 'localtime') AS INTEGER) + 6) % 7 AS weekday,
+                   SUM(kind = ?) AS due,
+                   SUM(kind = ?) AS done
+            FROM events
+            WHERE kind IN (?, ?) AND ts >= ? AND ts < ? AND COALESCE(source, '') NOT IN (?, ?)
+            GROUP BY weekday
+        """
+        with self.lock:
+            rows = self.db.execute(
+                sql, (SCHEDULED, FIRED, SCHEDULED, FIRED, _epoch(start), _epoch(end), *UNSCHEDULED_SOURCES)
+            ).fetchall()
+        report = {weekday: (0, 0, None) for weekday in range(7)}
+        for row in rows:
+            due, done = row["due"], row["done"]
+            report[row["weekday"]] = (done, due, min(1.0, done / due) if due else None)
+        return report
+
+    def summary(self, start, end):
+        """Количество событий каждого типа в диапазоне"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT kind, COUNT(*) FROM events WHERE ts >= ? AND ts < ? GROUP BY kind",
+                (_epoch(start), _epoch(end))
+            ).fetchall()
+        counts = {kind: 0 for kind in EVENT_KINDS}
+        counts.update({kind: n for kind, n in rows})
+        return counts
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Простой пользователя по сигналам D-Bus: logind IdleHint и хранитель экрана
+
+Опроса устройств ввода нет: служба слушает сигнал PropertiesChanged
+менеджера logind (IdleHint становится true, когда простаивают все сеансы;
+IdleSinceHint - с какого момента), GUI в сеансе пользователя слушает
+сигнал ActiveChanged хранителя экрана (org.freedesktop.ScreenSaver,
+org.gnome.ScreenSaver и др.) и сообщает его службе методом idle.report.
+Сигналы читаются из вывода "gdbus monitor" - процесс спит, пока на шине
+ничего не происходит, библиотеки D-Bus для Python не нужны.
+
+Машина считается простаивающей, если так говорит logind, либо если
+хранитель экрана включен во всех сеансах, которые о нем сообщают (на
+X11 без поддержки IdleHint logind всегда считает сеанс активным).
+Изменения простоя передаются правилам питания событием
+{"type": "idle", "idle": ..., "since": ...} (см. power_events.py, правило
+"user_idle").
+
+Примеры:
+    python3 idle_watch.py logind
+    python3 idle_watch.py screensaver
+"""
+import re
+import sys
+import time
+import argparse
+import datetime
+import threading
+import subprocess
+
+LOGIND = "org.freedesktop.login1"
+LOGIND_PATH = "/org/freedesktop/login1"
+LOGIND_MANAGER = "org.freedesktop.login1.Manager"
+SCREENSAVERS = [
+    "org.freedesktop.ScreenSaver",
+    "org.gnome.ScreenSaver",
+    "org.cinnamon.ScreenSaver",
+    "org.mate.ScreenSaver",
+]
+# Перезапуск монитора, если шина или gdbus завершились
+RESTART_DELAY = 5
+
+IDLE_PROPERTY = re.compile(r"'(IdleHint|IdleSinceHint)': <(?:uint64 )?(\w+)>")
+SAVER_SIGNAL = re.compile(r"ScreenSaver\.ActiveChanged \((true|false),\)")
+
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def parse_idle_change(line):
+    """Строка gdbus monitor -> (простой, с какого момента) или None
+
+    Если logind только объявил свойство устаревшим (без значения),
+    возвращается (None, None) - значение нужно перечитать.
+    """
+    if "PropertiesChanged" not in line or LOGIND_MANAGER not in line:
+        return None
+    values = dict(IDLE_PROPERTY.findall(line))
+    if "IdleHint" not in values:
+        return (None, None) if "'IdleHint'" in line else None
+    since = int(values.get("IdleSinceHint", 0)) / 1e6
+    return values["IdleHint"] == "true", since or None
+
+
+def parse_screensaver(line):
+    """Строка gdbus monitor -> включен ли хранитель экрана, или None"""
+    match = SAVER_SIGNAL.search(line)
+    return match.group(1) == "true" if match else None
+
+
+def read_logind_idle():
+    """Текущие IdleHint и IdleSinceHint менеджера logind: (простой, момент) или (None, None)"""
+    try:
+        result = subprocess.run(
+            ["busctl", "get-property", LOGIND, LOGIND_PATH, LOGIND_MANAGER,
+             "IdleHint", "IdleSinceHint"],
+            capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None, None
+    lines = result.stdout.split("\n")
+    if result.returncode != 0 or len(lines) < 2:
+        return None, None
+    since = int(lines[1].split()[-1]) / 1e6
+    return lines[0].split()[-1] == "true", since or None
+
+
+class BusWatcher:
+    """Поток, передающий строки "gdbus monitor" в on_line"""
+
+    def __init__(self, bus, name, on_line, path=None):
+        self.command = ["gdbus", "monitor", f"--{bus}", "--dest", name]
+        if path:
+            self.command += ["--object-path", path]
+        self.on_line = on_line
+        self.process = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL, text=True)
+            except OSError as e:
+                log(f"Монитор D-Bus не запущен: {e}")
+                return
+            for line in self.process.stdout:
+                try:
+                    self.on_line(line)
+                except Exception as e:
+                    log(f"Ошибка обработки сигнала D-Bus: {e}")
+            self.process.wait()
+            self.stop_event.wait(RESTART_DELAY)
+
+
+class LogindIdle:
+    """Простой по logind: callback(простой, момент начала) при каждом изменении"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.watcher = BusWatcher("system", LOGIND, self._on_line, LOGIND_PATH)
+
+    def start(self):
+        self.watcher.start()
+        idle, since = read_logind_idle()
+        if idle is not None:
+            self.callback(idle, since)
+
+    def stop(self):
+        self.watcher.stop()
+
+    def _on_line(self, line):
+        change = parse_idle_change(line)
+        if change is None:
+            return
+        if change[0] is None:
+            change = read_logind_idle()
+            if change[0] is None:
+                return
+        self.callback(*change)
+
+
+class ScreenSaverWatcher:
+    """Хранитель экрана сеанса: callback(включен) при каждом изменении"""
+
+    def __init__(self, callback, names=SCREENSAVERS):
+        self.callback = callback
+        self.watchers = [BusWatcher("session", name, self._on_line) for name in names]
+
+    def start(self):
+        for watcher in self.watchers:
+            watcher.start()
+
+    def stop(self):
+        for watcher in self.watchers:
+            watcher.stop()
+
+    def _on_line(self, line):
+        active = parse_screensaver(line)
+        if active is not None:
+            self.callback(active)
+
+
+class IdleState:
+    """Объединение источников простоя: logind и хранители экрана сеансов"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logind = (False, None)
+        self.savers = {}  # сеанс -> (хранитель включен, момент)
+        self.last = (False, None)
+
+    def set_logind(self, idle, since):
+        """Новое значение logind; возвращает (простой, момент), если итог изменился, иначе None"""
+        with self.lock:
+            self.logind = (idle, since if idle else None)
+            return self._changed()
+
+    def set_saver(self, session, active, moment=None):
+        """Хранитель экрана сеанса (active=None - сеанс больше не сообщает)"""
+        with self.lock:
+            if active is None:
+                self.savers.pop(session, None)
+            else:
+                self.savers[session] = (active, moment or time.time())
+            return self._changed()
+
+    def current(self):
+        if self.logind[0]:
+            return True, self.logind[1]
+        if self.savers and all(active for active, _ in self.savers.values()):
+            # Простой всей машины - с момента, когда погас последний экран
+            return True, max(moment for _, moment in self.savers.values())
+        return False, None
+
+    def _changed(self):
+        state = self.current()
+        if state[0] == self.last[0] and (not state[0] or state[1] == self.last[1]):
+            return None
+        self.last = state
+        return state
+
+
+def cmd_logind(args):
+    def show(idle, since):
+        moment = datetime.datetime.fromtimestamp(since).strftime("%H:%M:%S") if since else "-"
+        log(f"logind: простой {idle}, с {moment}")
+
+    watch = LogindIdle(show)
+    watch.start()
+    try:
+        watch.watcher.thread.join()
+    except KeyboardInterrupt:
+        watch.stop()
+    return 0
+
+
+def cmd_screensaver(args):
+    watch = ScreenSaverWatcher(lambda active: log(f"Хранитель экрана: {'включен' if active else 'выключен'}"))
+    watch.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        watch.stop()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Простой пользователя по сигналам D-Bus")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("logind", help="показывать IdleHint logind").set_defaults(func=cmd_logind)
+    commands.add_parser("screensaver", help="показывать сигналы хранителя экрана сеанса").set_defaults(
+        func=cmd_screensaver)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,9 +20,9 @@ sudo apt install -y \
 sudo mkdir -p /opt/SchedulerApp
 echo "Директория приложения создана: /opt/SchedulerApp"
 
-# Копируем основной файл
-sudo cp hibernation_scheduler_linux.py /opt/SchedulerApp/
-echo "Скопирован основной файл приложения"
+# Основной файл и общие модули планировщика
+sudo cp *.py /opt/SchedulerApp/
+echo "Скопированы файлы приложения"
 
 # Создаем простую синюю иконку
 echo "Создание иконки..."
@@ -48,6 +48,21 @@ exec pkexec /opt/SchedulerApp/venv/bin/python hibernation_scheduler_linux.py
 EOF
 sudo chmod +x /usr/local/bin/run_scheduler
 
+# Командная строка timemaster (без GUI)
+sudo tee /usr/local/bin/timemaster > /dev/null << 'EOF'
+#!/bin/bash
+exec /opt/SchedulerApp/venv/bin/python /opt/SchedulerApp/timemaster_cli.py "$@"
+EOF
+sudo chmod +x /usr/local/bin/timemaster
+
+# Системная служба для многопользовательских машин (не включается автоматически)
+sudo cp timemaster-daemon.service /etc/systemd/system/
+# Сервер Wake-on-LAN для выключаемых машин (нужен список /etc/timemaster/wol-roster.json)
+sudo cp timemaster-wol.service /etc/systemd/system/
+sudo systemctl daemon-reload
+echo "Для терминальных серверов: sudo systemctl enable --now timemaster-daemon"
+echo "Для пробуждения машин по сети: sudo systemctl enable --now timemaster-wol"
+
 # Создаем ярлык в меню приложений
 echo "Создание ярлыка в меню приложений..."
 sudo tee /usr/share/applications/SchedulerApp.desktop > /dev/null << 'EOF'
@@ -66,4 +81,5 @@ echo "Установка завершена!"
 echo "Теперь вы можете запустить приложение одним из способов:"
 echo "1. Через меню приложений - ищите 'Менеджер сна'"
 echo "2. Через терминал командой: run_scheduler"
-echo "3. По ярлыку на рабочем столе (если вы его создали)"
\ No newline at end of file
+echo "3. По ярлыку на рабочем столе (если вы его создали)"
+echo "Управление расписанием из терминала: timemaster --help"
\ No newline at end of file
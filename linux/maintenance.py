@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Обслуживание во время ночного сна: пробуждение по RTC и очередь заданий
+
+Машины, которые спят от off_time до on_time, не успевают получить
+обновления и резервные копии. Служба (timemaster_daemon.py) добавляет в
+план цикл обслуживания: через delay минут после выключения машина
+просыпается по RTC, выполняет зарегистрированные задания и снова уходит
+в тот же режим сна с будильником к on_time. Все задания должны закончиться
+не позже жесткого срока - за margin минут до on_time; не успевшие
+останавливаются (SIGTERM, затем SIGKILL).
+
+Задания раскладываются по окну заранее по длительностям прошлых запусков
+(p90 истории, пока замеров мало - estimate задания): сначала более
+приоритетные, среди них - более длинные (так короткие заполняют
+оставшиеся промежутки). Одновременно выполняются задания разных классов
+ресурсов; число одновременных заданий класса - classes[класс] (по
+умолчанию 1), всего - не больше max_parallel. Задание, которое по оценке
+не успевает до срока, переносится на следующую ночь.
+
+Раздел политики службы:
+    "maintenance": {
+        "delay": 60, "margin": 30, "max_parallel": 2,
+        "classes": {"network": 1, "io": 1, "cpu": 2},
+        "jobs": [
+            {"name": "upgrade", "command": ["apt-get", "-y", "upgrade"], "class": "network",
+             "timeout": 3600, "estimate": 900},
+            {"name": "backup", "command": ["/usr/local/bin/backup"], "class": "io", "priority": 1}
+        ]
+    }
+
+Примеры:
+    python3 maintenance.py plan --policy /etc/timemaster/policy.json --window 180
+    python3 maintenance.py stats
+    python3 maintenance.py selftest
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+
+import task_model
+from wake_planner import percentile
+
+STATS_FILE = "/var/lib/timemaster/maintenance-stats.json"
+DEFAULTS = {
+    "delay": 60,
+    "margin": 30,
+    "max_parallel": 2,
+    "classes": {},
+    "jobs": [],
+}
+JOB_DEFAULTS = {
+    "class": "default",
+    "priority": 0,
+    "timeout": 3600,
+    "estimate": 600,
+}
+# Цикл короче этого окна не планируется, минуты
+MIN_WINDOW = 10
+# Замеров на задание и минимум для оценки по истории
+HISTORY_SIZE = 20
+MIN_SAMPLES = 3
+ESTIMATE_FRACTION = 0.9
+# Пауза между SIGTERM и SIGKILL при остановке задания, секунды
+KILL_GRACE = 10
+POLL_INTERVAL = 1.0
+# Действия, после которых машина не спит - обслуживать в окне нечего
+NO_SLEEP_ACTIONS = (task_model.REBOOT,)
+MAINTENANCE = "Обслуживание"
+
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def _positive_int(value, field):
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ValueError(f"maintenance.{field}: нужно целое число > 0")
+    return value
+
+
+def load_config(data):
+    """Раздел maintenance политики с проверкой полей, ValueError при ошибке"""
+    config = dict(DEFAULTS)
+    config.update(data or {})
+    for field in ("delay", "margin", "max_parallel"):
+        _positive_int(config[field], field)
+    if not isinstance(config["classes"], dict):
+        raise ValueError("maintenance.classes: нужен объект {класс: число заданий}")
+    for name, slots in config["classes"].items():
+        _positive_int(slots, f"classes.{name}")
+    jobs, names = [], set()
+    for item in config["jobs"]:
+        if not isinstance(item, dict):
+            raise ValueError(f"maintenance.jobs: задание должно быть объектом: {item}")
+        job = {**JOB_DEFAULTS, **item}
+        if not isinstance(job.get("name"), str) or not job["name"]:
+            raise ValueError(f"maintenance.jobs: у задания нет имени: {item}")
+        if job["name"] in names:
+            raise ValueError(f"maintenance.jobs: повторяется имя {job['name']}")
+        names.add(job["name"])
+        command = job.get("command")
+        # Команда - список аргументов, без оболочки
+        if not isinstance(command, list) or not command or not all(isinstance(a, str) for a in command):
+            raise ValueError(f"maintenance.jobs.{job['name']}: command - непустой список строк")
+        if not isinstance(job["class"], str):
+            raise ValueError(f"maintenance.jobs.{job['name']}: class - строка")
+        if not isinstance(job["priority"], int):
+            raise ValueError(f"maintenance.jobs.{job['name']}: priority - целое число")
+        _positive_int(job["timeout"], f"jobs.{job['name']}.timeout")
+        _positive_int(job["estimate"], f"jobs.{job['name']}.estimate")
+        jobs.append(job)
+    config["jobs"] = jobs
+    return config
+
+
+def plan_cycles(events, config):
+    """Циклы обслуживания для плана службы: между выключением и следующим включением
+
+    events - события merge_plan (уже со сдвигом разнесения); результат -
+    события {"time", "kind": "maintenance", "action", "users", "deadline", "on"}.
+    """
+    if not config["jobs"]:
+        return []
+    cycles = []
+    ordered = sorted(events, key=lambda e: e["time"])
+    for index, event in enumerate(ordered):
+        if event["kind"] != "off" or task_model.ACTION_BY_LABEL.get(event["action"]) in NO_SLEEP_ACTIONS:
+            continue
+        following = ordered[index + 1:]
+        wake = next((e for e in following if e["kind"] == "on"), None)
+        if wake is None:
+            continue
+        # Следующее выключение до включения - цикл достанется ему
+        if any(e["kind"] == "off" and e["time"] < wake["time"] for e in following):
+            continue
+        start = event["time"] + datetime.timedelta(minutes=config["delay"])
+        deadline = wake["time"] - datetime.timedelta(minutes=config["margin"])
+        if deadline - start < datetime.timedelta(minutes=MIN_WINDOW):
+            continue
+        cycles.append({"time": start, "kind": "maintenance", "action": event["action"],
+                       "users": event["users"], "deadline": deadline, "on": wake["time"]})
+    return cycles
+
+
+class DurationStats:
+    """Длительности прошлых запусков заданий (секунды) в JSON-файле"""
+
+    def __init__(self, path=STATS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.durations = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.durations = json.load(f).get("jobs", {})
+        except (OSError, ValueError):
+            pass
+
+    def add(self, name, seconds):
+        with self.lock:
+            history = self.durations.setdefault(name, [])
+            history.append(round(seconds, 1))
+            del history[:-HISTORY_SIZE]
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".maintenance-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"jobs": self.durations}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def estimate(self, job):
+        """Оценка длительности: p90 истории или estimate задания"""
+        with self.lock:
+            history = list(self.durations.get(job["name"], []))
+        if len(history) < MIN_SAMPLES:
+            return job["estimate"]
+        return min(job["timeout"], percentile(history, ESTIMATE_FRACTION))
+
+    def report(self):
+        with self.lock:
+            return {name: {"samples": len(history), "p90": percentile(history, ESTIMATE_FRACTION)}
+                    for name, history in sorted(self.durations.items())}
+
+
+def pack(jobs, estimates, config, window):
+    """Раскладка заданий по окну window секунд: ([(задание, начало, конец)], [перенесенные])
+
+    Списочное планирование: задание занимает самый ранний свободный слот
+    своего класса и общий слот; не помещающееся до конца окна переносится.
+    """
+    order = sorted(jobs, key=lambda j: (-j["priority"], -estimates[j["name"]]))
+    total = [0.0] * config["max_parallel"]
+    by_class = {}
+    planned, deferred = [], []
+    for job in order:
+        slots = by_class.setdefault(job["class"], [0.0] * config["classes"].get(job["class"], 1))
+        class_slot = min(range(len(slots)), key=slots.__getitem__)
+        total_slot = min(range(len(total)), key=total.__getitem__)
+        start = max(slots[class_slot], total[total_slot])
+        end = start + estimates[job["name"]]
+        if end > window:
+            deferred.append(job)
+            continue
+        slots[class_slot] = total[total_slot] = end
+        planned.append((job, start, end))
+    planned.sort(key=lambda p: p[1])
+    return planned, deferred
+
+
+class MaintenanceRunner:
+    """Выполнение цикла обслуживания до жесткого срока"""
+
+    def __init__(self, config, stats=None, dry_run=False, popen=subprocess.Popen, log=log):
+        self.config = config
+        self.stats = stats or DurationStats()
+        self.dry_run = dry_run
+        self.popen = popen
+        self.log = log
+        self.lock = threading.Lock()
+        self.active = False
+
+    def update(self, config):
+        self.config = config
+
+    def plan(self, window):
+        """Раскладка текущих заданий по окну window секунд"""
+        jobs = list(self.config["jobs"])
+        estimates = {job["name"]: self.stats.estimate(job) for job in jobs}
+        return pack(jobs, estimates, self.config, window)
+
+    def run(self, deadline):
+        """Цикл до момента deadline (datetime): список итогов по заданиям"""
+        with self.lock:
+            if self.active:
+                self.log("Обслуживание уже выполняется")
+                return []
+            self.active = True
+        try:
+            return self._run(deadline)
+        finally:
+            with self.lock:
+                self.active = False
+
+    def _run(self, deadline):
+        config = self.config
+        window = (deadline - datetime.datetime.now()).total_seconds()
+        planned, deferred = self.plan(window)
+        results = [{"name": job["name"], "status": "deferred"} for job in deferred]
+        for job in deferred:
+            self.log(f"Обслуживание: {job['name']} не успевает до {deadline:%H:%M}, перенесено")
+        if self.dry_run:
+            for job, start, end in planned:
+                self.log(f"Обслуживание (проверка): {job['name']} +{start / 60:.0f}..{end / 60:.0f} мин")
+            return results + [{"name": job["name"], "status": "planned"} for job, _, _ in planned]
+        inhibitor = self._inhibit(window)
+        queue = [job for job, _, _ in planned]
+        running = {}  # имя -> (задание, процесс, начало, срок остановки)
+        try:
+            while queue or running:
+                now = time.monotonic()
+                left = (deadline - datetime.datetime.now()).total_seconds()
+                for name, (job, process, started, stop_at) in list(running.items()):
+                    code = process.poll()
+                    if code is None and now < stop_at:
+                        continue
+                    if code is None:
+                        self._kill(process)
+                        status = "killed"
+                    else:
+                        status = "ok" if code == 0 else "failed"
+                    duration = time.monotonic() - started
+                    if status != "killed":
+                        self.stats.add(name, duration)
+                    self.log(f"Обслуживание: {name} - {status} за {duration:.0f} с")
+                    results.append({"name": name, "status": status, "code": code,
+                                    "duration": round(duration, 1)})
+                    del running[name]
+                for job in list(queue):
+                    in_class = sum(1 for j, *_ in running.values() if j["class"] == job["class"])
+                    if len(running) >= config["max_parallel"] or \
+                            in_class >= config["classes"].get(job["class"], 1):
+                        continue
+                    queue.remove(job)
+                    # Предыдущие задания затянулись - это уже не успеть
+                    if self.stats.estimate(job) > left:
+                        self.log(f"Обслуживание: {job['name']} не успевает до {deadline:%H:%M}, перенесено")
+                        results.append({"name": job["name"], "status": "deferred"})
+                        continue
+                    running[job["name"]] = self._start(job, now, left)
+                if queue or running:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            for job, process, _, _ in running.values():
+                self._kill(process)
+            if inhibitor is not None:
+                inhibitor.terminate()
+        return results
+
+    def _start(self, job, now, left):
+        self.log(f"Обслуживание: запуск {job['name']}")
+        process = self.popen(job["command"], stdin=subprocess.DEVNULL, start_new_session=True)
+        return job, process, now, now + min(job["timeout"], left)
+
+    def _kill(self, process):
+        """Остановка группы процессов задания"""
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+
+    def _inhibit(self, seconds):
+        """Запрет сна и простоя logind на время цикла (если есть systemd-inhibit)"""
+        if not shutil.which("systemd-inhibit"):
+            return None
+        return subprocess.Popen(
+            ["systemd-inhibit", "--what=sleep:idle:handle-lid-switch", "--who=TimeMaster",
+             f"--why={MAINTENANCE}", "--mode=block", "sleep", str(int(max(1, seconds)))],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def print_plan(planned, deferred, window):
+    print(f"Окно: {window / 60:.0f} мин")
+    for job, start, end in planned:
+        print(f"  {start / 60:6.1f} - {end / 60:6.1f} мин  [{job['class']}] {job['name']}")
+    for job in deferred:
+        print(f"  перенесено: {job['name']}")
+
+
+def cmd_plan(args):
+    with open(args.policy, "r", encoding="utf-8") as f:
+        config = load_config(json.load(f).get("maintenance"))
+    runner = MaintenanceRunner(config, DurationStats(args.stats))
+    window = args.window * 60
+    print_plan(*runner.plan(window), window)
+    return 0
+
+
+def cmd_stats(args):
+    for name, item in DurationStats(args.stats).report().items():
+        p90 = f"{item['p90']:.0f} с" if item["p90"] is not None else "-"
+        print(f"{name}: замеров {item['samples']}, p90 {p90}")
+    return 0
+
+
+def cmd_selftest(args):
+    """Тесты модуля: tests/test_maintenance.py"""
+    import tests
+    return tests.run("maintenance")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание во время ночного сна")
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan = commands.add_parser("plan", help="раскладка заданий по окну")
+    plan.add_argument("--policy", default="/etc/timemaster/policy.json")
+    plan.add_argument("--window", type=float, default=180, help="длина окна, минуты")
+    plan.add_argument("--stats", default=STATS_FILE)
+    plan.set_defaults(func=cmd_plan)
+    stats = commands.add_parser("stats", help="длительности прошлых запусков")
+    stats.add_argument("--stats", default=STATS_FILE)
+    stats.set_defaults(func=cmd_stats)
+    selftest = commands.add_parser("selftest", help="проверка на коротких заданиях")
+    selftest.set_defaults(func=cmd_selftest)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"maintenance: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Выполнение действий питания и программирование пробуждения по RTC без GUI"""
+import os
+import time
+import threading
+import subprocess
+
+from schedule_model import SYSTEMCTL_VERBS
+
+SYSTEMCTL = "/usr/bin/systemctl"
+RTC_WAKEALARM = "/sys/class/rtc/rtc0/wakealarm"
+
+
+def action_command(action, prefix=()):
+    """Команда systemctl для действия; prefix - например ["pkexec"] для непривилегированного запуска"""
+    verb = SYSTEMCTL_VERBS.get(action)
+    if verb is None:
+        raise ValueError(f"Неизвестное действие: {action}")
+    return list(prefix) + [SYSTEMCTL, verb]
+
+
+def run_action(action, prefix=(), runner=subprocess.run):
+    """Выполнение действия, возвращает (успех, текст ошибки)"""
+    try:
+        result = runner(action_command(action, prefix), capture_output=True, text=True)
+    except Exception as e:
+        return False, str(e)
+    if result.returncode == 0:
+        return True, ""
+    return False, (result.stderr or "").strip() or "Неизвестная ошибка"
+
+
+def set_rtc_wake(when, path=RTC_WAKEALARM):
+    """Программирование будильника RTC на момент when (datetime); None - сброс"""
+    # Ядро не перезаписывает взведенный будильник - сначала сбрасываем
+    with open(path, "w") as f:
+        f.write("0")
+    if when is None:
+        return
+    with open(path, "w") as f:
+        f.write(str(int(when.timestamp())))
+
+
+def rtc_wake_supported(path=RTC_WAKEALARM):
+    """Есть ли доступный на запись будильник RTC"""
+    return os.path.exists(path) and os.access(path, os.W_OK)
+
+
+def sleep_offset():
+    """Суммарное время сна с момента загрузки: CLOCK_BOOTTIME идет во сне, CLOCK_MONOTONIC - нет"""
+    return time.clock_gettime(time.CLOCK_BOOTTIME) - time.monotonic()
+
+
+class ResumeWatcher:
+    """Обнаружение выхода из сна по приросту sleep_offset()
+
+    callback(suspended_at, resumed_at, slept) получает времена в секундах эпохи;
+    погрешность момента пробуждения - не больше интервала проверки.
+    """
+
+    def __init__(self, callback, interval=2, threshold=3):
+        self.callback = callback
+        self.interval = interval
+        self.threshold = threshold
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        last = sleep_offset()
+        while not self.stop_event.wait(self.interval):
+            current = sleep_offset()
+            slept = current - last
+            last = current
+            if slept >= self.threshold:
+                resumed_at = time.time()
+                try:
+                    self.callback(resumed_at - slept, resumed_at, slept)
+                except Exception as e:
+                    print(f"Ошибка обработки пробуждения: {e}")
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""Замер задержек сна, гибернации и выключения
+
+Сон и гибернация замеряются в одном процессе: действие запускается с
+будильником RTC через --wake-after секунд, процесс опрашивает часы и
+по скачку CLOCK_BOOTTIME - CLOCK_MONOTONIC (идет только во сне) находит
+момент засыпания и пробуждения. Для каждого цикла:
+    request_to_suspend  - от запроса до заморозки процессов (монотонные часы);
+    transition          - монотонное время ядра на усыпление и пробуждение устройств;
+    asleep              - время сна по CLOCK_BOOTTIME;
+    resume_to_userspace - от срабатывания RTC до возврата в пользовательский код
+                          (по настенным часам, точность RTC - 1 с);
+    hw_sleep            - время в аппаратном сне по /sys/power/suspend_stats, если есть.
+
+Выключение и перезагрузка прерывают процесс: перед действием состояние
+пишется в файл, после загрузки команда collect (например, из автозапуска)
+дописывает замер и запускает следующую итерацию.
+
+Бэкенд --fake моделирует часы и ядро без реального сна - для проверки
+логики замера в CI.
+
+Примеры:
+    sudo python3 power_benchmark.py run --action Сон -n 5 -o suspend.json
+    python3 power_benchmark.py run --fake --action Гибернация -n 3
+    sudo python3 power_benchmark.py run --action Перезагрузка -n 3
+    sudo python3 power_benchmark.py collect
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+
+import power_actions
+from schedule_model import ACTIONS, action_name
+
+SUSPEND_STATS = "/sys/power/suspend_stats"
+STATE_FILE = "/var/lib/timemaster/benchmark-state.json"
+# Действия, после которых процесс продолжает работу
+IN_PROCESS = ["Сон", "Гибернация"]
+# Скачок смещения BOOTTIME-MONOTONIC больше порога - система спала
+SLEEP_JUMP = 0.05
+METRICS = ["request_to_suspend", "transition", "asleep", "resume_to_userspace", "hw_sleep",
+           "request_to_boot", "wake_to_boot", "boot_to_userspace"]
+
+
+class SystemPowerBackend:
+    """Реальные часы, RTC и systemctl"""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def boottime(self):
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+    def wall(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def suspend_stats(self):
+        """Счетчики /sys/power/suspend_stats (набор файлов зависит от ядра)"""
+        stats = {}
+        try:
+            names = os.listdir(SUSPEND_STATS)
+        except OSError:
+            return stats
+        for name in names:
+            try:
+                with open(os.path.join(SUSPEND_STATS, name)) as f:
+                    stats[name] = int(f.read().split()[0])
+            except (OSError, ValueError, IndexError):
+                continue
+        return stats
+
+    def set_wake(self, wake_at):
+        if wake_at is None:
+            power_actions.set_rtc_wake(None)
+        else:
+            power_actions.set_rtc_wake(datetime.datetime.fromtimestamp(wake_at))
+
+    def issue(self, action):
+        # Не ждем systemctl: процесс должен успеть увидеть заморозку
+        subprocess.Popen(power_actions.action_command(action),
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def boot_wall(self):
+        """Время загрузки ядра по /proc/stat (секунды эпохи)"""
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("btime"):
+                    return int(line.split()[1])
+        raise OSError("btime не найден в /proc/stat")
+
+
+class FakePowerBackend:
+    """Модель часов и ядра: заморозка через enter_latency после запроса,
+    усыпление устройств suspend_devices, сон до будильника RTC,
+    пробуждение устройств resume_latency. Время не тратится по-настоящему."""
+
+    def __init__(self, enter_latency=0.6, suspend_devices=0.4, resume_latency=1.2,
+                 jitter=0.1, seed=0):
+        self.random = random.Random(seed)
+        self.enter_latency = enter_latency
+        self.suspend_devices = suspend_devices
+        self.resume_latency = resume_latency
+        self.jitter = jitter
+        self._mono = 1000.0
+        self._slept = 0.0
+        self._wall = 1.7e9
+        self.wake_at = None
+        self.pending = None
+        self.stats = {"success": 0, "fail": 0, "last_hw_sleep": 0}
+
+    def _vary(self, value):
+        return max(0.0, value + self.random.uniform(-self.jitter, self.jitter) * value)
+
+    def _advance(self, seconds, asleep=False):
+        self._wall += seconds
+        if asleep:
+            self._slept += seconds
+        else:
+            self._mono += seconds
+
+    def monotonic(self):
+        return self._mono
+
+    def boottime(self):
+        return self._mono + self._slept
+
+    def wall(self):
+        return self._wall
+
+    def sleep(self, seconds):
+        if self.pending is not None and self._mono + seconds >= self.pending:
+            self._advance(self.pending - self._mono)
+            self.pending = None
+            self._suspend()
+            return
+        self._advance(seconds)
+
+    def _suspend(self):
+        """Процесс заморожен: ядро усыпляет устройства, спит до RTC и просыпается"""
+        self._advance(self._vary(self.suspend_devices))
+        if self.wake_at is None or self.wake_at <= self._wall:
+            self.stats["fail"] += 1
+            return
+        asleep = self.wake_at - self._wall
+        self._advance(asleep, asleep=True)
+        self.stats["success"] += 1
+        self.stats["last_hw_sleep"] = int(asleep * 1e6)
+        self.wake_at = None
+        self._advance(self._vary(self.resume_latency))
+
+    def suspend_stats(self):
+        return dict(self.stats)
+
+    def set_wake(self, wake_at):
+        self.wake_at = wake_at
+
+    def issue(self, action):
+        if action not in IN_PROCESS:
+            raise ValueError(f"Модель не поддерживает действие: {action}")
+        self.pending = self._mono + self._vary(self.enter_latency)
+
+
+def measure_cycle(backend, action, wake_after=20, poll=0.01, timeout=600):
+    """Один цикл сна или гибернации с пробуждением по RTC"""
+    before = backend.suspend_stats()
+    # Будильник RTC срабатывает на границе секунды
+    wake_at = int(backend.wall() + wake_after) + 1
+    backend.set_wake(wake_at)
+    start = backend.monotonic()
+    offset = backend.boottime() - start
+    backend.issue(action)
+    last = start
+    while True:
+        backend.sleep(poll)
+        now = backend.monotonic()
+        jump = backend.boottime() - now - offset
+        if jump > SLEEP_JUMP:
+            wall = backend.wall()
+            break
+        last = now
+        if now - start > timeout:
+            backend.set_wake(None)
+            raise TimeoutError(f"Система не уснула за {timeout} с")
+    after = backend.suspend_stats()
+    result = {
+        "action": action,
+        "request_to_suspend": round(last - start, 6),
+        "transition": round(now - last, 6),
+        "asleep": round(jump, 6),
+        "resume_to_userspace": round(wall - wake_at, 6),
+    }
+    if "last_hw_sleep" in after:
+        result["hw_sleep"] = round(after["last_hw_sleep"] / 1e6, 6)
+    failed = after.get("fail", 0) - before.get("fail", 0)
+    if failed:
+        result["error"] = f"ядро сообщило о {failed} неудачных попытках"
+    return result
+
+
+def run_in_process(backend, action, iterations, wake_after=20, pause=10, poll=0.01):
+    """N циклов сна или гибернации подряд"""
+    results = []
+    for index in range(iterations):
+        result = measure_cycle(backend, action, wake_after, poll)
+        result["iteration"] = index + 1
+        results.append(result)
+        print(f"[{index + 1}/{iterations}] {action}: до заморозки {result['request_to_suspend']:.3f} с, "
+              f"сон {result['asleep']:.1f} с, до возврата {result['resume_to_userspace']:.3f} с",
+              file=sys.stderr)
+        if index + 1 < iterations:
+            backend.sleep(pause)  # даем системе прийти в себя после пробуждения
+    return results
+
+
+def load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def start_reboot_cycle(backend, state, path):
+    """Запуск очередной итерации выключения/перезагрузки"""
+    wake_at = None
+    if state["action"] == "Выключить":
+        wake_at = int(backend.wall() + state["wake_after"]) + 1
+        backend.set_wake(wake_at)
+    state["pending"] = {"requested_at": backend.wall(), "wake_at": wake_at}
+    save_state(state, path)
+    backend.issue(state["action"])
+
+
+def collect_reboot_cycle(backend, state, path):
+    """Замер после загрузки; True если запущена следующая итерация"""
+    pending = state.pop("pending", None)
+    if pending is None:
+        return False
+    boot = backend.boot_wall()
+    result = {
+        "action": state["action"],
+        "iteration": len(state["results"]) + 1,
+        "request_to_boot": round(boot - pending["requested_at"], 3),
+        # Время от запуска ядра до пользовательского кода, выполнившего collect
+        "boot_to_userspace": round(backend.boottime(), 3),
+    }
+    if pending["wake_at"] is not None:
+        result["wake_to_boot"] = boot - pending["wake_at"]
+    state["results"].append(result)
+    if len(state["results"]) < state["iterations"]:
+        start_reboot_cycle(backend, state, path)
+        return True
+    save_state(state, path)
+    return False
+
+
+def summarize(results):
+    """Минимум, медиана, p95 и максимум по каждой метрике"""
+    summary = {}
+    for metric in METRICS:
+        values = sorted(r[metric] for r in results if metric in r)
+        if not values:
+            continue
+        summary[metric] = {
+            "min": values[0],
+            "median": statistics.median(values),
+            "p95": values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+            "max": values[-1],
+        }
+    return summary
+
+
+def report(action, results, backend_name):
+    """Итоговый документ JSON"""
+    return {
+        "host": socket.gethostname(),
+        "kernel": platform.release(),
+        "backend": backend_name,
+        "action": action,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "iterations": results,
+        "summary": summarize(results),
+    }
+
+
+def write_report(document, output):
+    text = json.dumps(document, indent=2, ensure_ascii=False) + "\n"
+    if output and output != "-":
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+def cmd_run(args):
+    action = action_name(args.action)
+    backend = FakePowerBackend(seed=args.seed) if args.fake else SystemPowerBackend()
+    backend_name = "fake" if args.fake else "system"
+    if action in IN_PROCESS:
+        results = run_in_process(backend, action, args.iterations, args.wake_after, args.pause, args.poll)
+        write_report(report(action, results, backend_name), args.output)
+        return 0
+    if args.fake:
+        print("Выключение и перезагрузка на модели не замеряются", file=sys.stderr)
+        return 1
+    state = {"action": action, "iterations": args.iterations, "wake_after": args.wake_after,
+             "output": os.path.abspath(args.output) if args.output and args.output != "-" else None,
+             "results": []}
+    print(f"Запуск {action}; после загрузки выполните: power_benchmark.py collect", file=sys.stderr)
+    start_reboot_cycle(backend, state, args.state)
+    return 0
+
+
+def cmd_collect(args):
+    state = load_state(args.state)
+    if state is None:
+        print("Незавершенного замера нет", file=sys.stderr)
+        return 1
+    backend = SystemPowerBackend()
+    if collect_reboot_cycle(backend, state, args.state):
+        return 0
+    write_report(report(state["action"], state["results"], "system"), args.output or state["output"])
+    os.unlink(args.state)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер задержек сна, гибернации и выключения")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="запуск замера")
+    run.add_argument("--action", required=True, help=f"{', '.join(ACTIONS)} или suspend/hibernate/...")
+    run.add_argument("-n", "--iterations", type=int, default=3)
+    run.add_argument("--wake-after", type=int, default=20, help="пробуждение RTC через N секунд")
+    run.add_argument("--pause", type=float, default=10, help="пауза между циклами, с")
+    run.add_argument("--poll", type=float, default=0.01, help="период опроса часов, с")
+    run.add_argument("--fake", action="store_true", help="модель вместо реального сна")
+    run.add_argument("--seed", type=int, default=0, help="зерно случайных задержек модели")
+    run.add_argument("--state", default=STATE_FILE, help="файл состояния для выключения/перезагрузки")
+    run.add_argument("-o", "--output", help="файл результатов JSON (по умолчанию stdout)")
+    run.set_defaults(func=cmd_run)
+
+    collect = commands.add_parser("collect", help="замер после загрузки (выключение/перезагрузка)")
+    collect.add_argument("--state", default=STATE_FILE)
+    collect.add_argument("-o", "--output")
+    collect.set_defaults(func=cmd_collect)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, TimeoutError) as e:
+        print(f"power_benchmark: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
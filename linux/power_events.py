@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""События питания без опроса: uevent ядра (netlink), крышка (evdev), простой пользователя
+
+Источник подписывается на сокет NETLINK_KOBJECT_UEVENT (группа ядра) и
+получает сообщения power_supply: подключение/отключение сети (Mains/USB,
+POWER_SUPPLY_ONLINE) и изменение заряда батареи (POWER_SUPPLY_CAPACITY,
+POWER_SUPPLY_STATUS). Крышка ноутбука не шлет uevent - ее положение
+читается из устройства ввода с переключателем SW_LID (/dev/input/eventN,
+нужны права root или группа input). Все дескрипторы ждут в одном select
+без таймаута: поток спит, пока ядро не пришлет событие. События простоя
+(logind IdleHint, хранитель экрана) поставляет idle_watch.py через inject.
+
+События передаются словарями:
+    {"type": "ac", "online": False}
+    {"type": "battery", "capacity": 5, "status": "Discharging"}
+    {"type": "lid", "closed": True}
+    {"type": "idle", "idle": True, "since": 1700000000.0}
+inject(event) подает синтетическое событие тем же путем (через pipe) - для
+проверки правил без железа; служба принимает такие события от root
+методом power.inject.
+
+Правила (раздел "power_rules" политики службы):
+    {"on": "battery_below", "percent": 5, "action": "Гибернация"}
+    {"on": "ac_unplugged", "delay": 600, "action": "Сон",
+     "outside": [{"days": "Mon-Fri", "from": "09:00", "to": "18:00"}]}
+    {"on": "lid_closed", "action": "Сон"}
+    {"on": "user_idle", "minutes": 30, "action": "Сон",
+     "outside": [{"days": "Mon-Fri", "from": "09:00", "to": "18:00"}]}
+delay - через сколько секунд выполнить (отменяется, если сеть снова
+подключили или крышку открыли); minutes - сколько минут простоя (считая от
+начала простоя) ждать, активность пользователя отменяет ожидание;
+outside/inside - окна, вне/внутри которых правило действует. Окна
+проверяются в момент выполнения: если момент запрещен, а условие еще
+выполняется, действие переносится на начало разрешенного времени.
+
+Примеры:
+    python3 power_events.py monitor
+    sudo python3 power_events.py inject battery --capacity 4
+    sudo python3 power_events.py inject ac --offline
+    sudo python3 power_events.py inject idle --minutes 45
+    python3 power_events.py selftest
+"""
+import os
+import sys
+import glob
+import time
+import struct
+import socket
+import argparse
+import datetime
+import selectors
+import threading
+
+import schedule_model as model
+from control_client import ControlClient, ControlError
+
+NETLINK_KOBJECT_UEVENT = 15
+KERNEL_GROUP = 1
+POWER_SUPPLY_DIR = "sys/class/power_supply"
+INPUT_DIR = "sys/class/input"
+# struct input_event: timeval, type, code, value
+INPUT_EVENT = struct.Struct("llHHi")
+EV_SW = 0x05
+SW_LID = 0x00
+AC_TYPES = ("Mains", "USB")
+
+TRIGGERS = ["battery_below", "ac_unplugged", "lid_closed", "user_idle"]
+
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_uevent(data):
+    """Сообщение uevent ядра ("действие@путь\\0КЛЮЧ=значение\\0...") -> словарь или None"""
+    parts = data.split(b"\0")
+    if b"@" not in parts[0]:
+        return None  # сообщения udev (libudev) и мусор
+    fields = {}
+    for part in parts[1:]:
+        key, sep, value = part.partition(b"=")
+        if sep:
+            fields[key.decode("ascii", "replace")] = value.decode("utf-8", "replace")
+    return fields
+
+
+def events_from_uevent(fields, root="/"):
+    """События питания из полей uevent"""
+    if fields.get("SUBSYSTEM") != "power_supply" or fields.get("ACTION") not in ("add", "change"):
+        return []
+    kind = fields.get("POWER_SUPPLY_TYPE")
+    if kind is None and fields.get("DEVPATH"):
+        # Старые ядра не кладут тип в uevent
+        kind = _read_text(os.path.join(root, "sys" + fields["DEVPATH"], "type"))
+    name = fields.get("POWER_SUPPLY_NAME")
+    if kind in AC_TYPES and "POWER_SUPPLY_ONLINE" in fields:
+        return [{"type": "ac", "online": fields["POWER_SUPPLY_ONLINE"] == "1", "name": name}]
+    if kind == "Battery" and "POWER_SUPPLY_CAPACITY" in fields:
+        try:
+            capacity = int(fields["POWER_SUPPLY_CAPACITY"])
+        except ValueError:
+            return []
+        return [{"type": "battery", "capacity": capacity,
+                 "status": fields.get("POWER_SUPPLY_STATUS"), "name": name}]
+    return []
+
+
+def lid_devices(root="/"):
+    """Устройства ввода с переключателем крышки"""
+    devices = []
+    for path in sorted(glob.glob(os.path.join(root, INPUT_DIR, "event*"))):
+        bits = _read_text(os.path.join(path, "device", "capabilities", "sw"))
+        # Маска - шестнадцатеричные слова, младший бит последнего слова - SW_LID
+        if bits and int(bits.split()[-1], 16) & (1 << SW_LID):
+            devices.append(os.path.join("/dev/input", os.path.basename(path)))
+    return devices
+
+
+def lid_events(data):
+    """События крышки из прочитанных структур input_event"""
+    events = []
+    size = INPUT_EVENT.size
+    for offset in range(0, len(data) - size + 1, size):
+        _, _, event_type, code, value = INPUT_EVENT.unpack_from(data, offset)
+        if event_type == EV_SW and code == SW_LID:
+            events.append({"type": "lid", "closed": value == 1})
+    return events
+
+
+def initial_state(root="/"):
+    """Состояние при запуске (одно чтение sysfs): сеть, заряд, статус батареи"""
+    state = {"ac_online": None, "battery": None, "battery_status": None, "lid_closed": None,
+             "idle": None, "idle_since": None}
+    for path in sorted(glob.glob(os.path.join(root, POWER_SUPPLY_DIR, "*"))):
+        kind = _read_text(os.path.join(path, "type"))
+        if kind in AC_TYPES:
+            online = _read_text(os.path.join(path, "online"))
+            if online is not None:
+                state["ac_online"] = bool(state["ac_online"]) or online == "1"
+        elif kind == "Battery":
+            capacity = _read_text(os.path.join(path, "capacity"))
+            if capacity and capacity.isdigit():
+                state["battery"] = int(capacity)
+                state["battery_status"] = _read_text(os.path.join(path, "status"))
+    return state
+
+
+class PowerEventSource:
+    """Поток событий питания; callback(событие, состояние) вызывается из потока источника"""
+
+    def __init__(self, callback, root="/", netlink=True, lid=True):
+        self.callback = callback
+        self.root = root
+        self.use_netlink = netlink
+        self.use_lid = lid
+        self.state = initial_state(root)
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.injected = []
+        self.wake_r, self.wake_w = os.pipe()
+        self.selector.register(self.wake_r, selectors.EVENT_READ, "inject")
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.use_netlink:
+            try:
+                sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+                sock.bind((0, KERNEL_GROUP))
+                self.selector.register(sock, selectors.EVENT_READ, "netlink")
+            except OSError as e:
+                log(f"Сокет uevent недоступен: {e}")
+        if self.use_lid:
+            for device in lid_devices(self.root):
+                try:
+                    fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK)
+                    self.selector.register(fd, selectors.EVENT_READ, "lid")
+                except OSError as e:
+                    log(f"Крышка {device} недоступна: {e}")
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def inject(self, event):
+        """Синтетическое событие - обрабатывается так же, как событие ядра"""
+        with self.lock:
+            self.injected.append(dict(event))
+        os.write(self.wake_w, b"\0")
+
+    def stop(self):
+        self.running = False
+        os.write(self.wake_w, b"\0")
+
+    def _run(self):
+        while self.running:
+            for key, _ in self.selector.select():
+                for event in self._read(key):
+                    self._dispatch(event)
+        for key in list(self.selector.get_map().values()):
+            if key.data == "netlink":
+                key.fileobj.close()
+            elif key.data == "lid":
+                os.close(key.fileobj)
+        self.selector.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def _read(self, key):
+        if key.data == "inject":
+            os.read(self.wake_r, 4096)
+            with self.lock:
+                events, self.injected = self.injected, []
+            return events
+        if key.data == "netlink":
+            fields = parse_uevent(key.fileobj.recv(65536))
+            return events_from_uevent(fields, self.root) if fields else []
+        try:
+            return lid_events(os.read(key.fileobj, INPUT_EVENT.size * 64))
+        except BlockingIOError:
+            return []
+
+    def _dispatch(self, event):
+        if event["type"] == "ac":
+            self.state["ac_online"] = event["online"]
+        elif event["type"] == "battery":
+            self.state["battery"] = event["capacity"]
+            self.state["battery_status"] = event.get("status")
+        elif event["type"] == "lid":
+            self.state["lid_closed"] = event["closed"]
+        elif event["type"] == "idle":
+            self.state["idle"] = event["idle"]
+            self.state["idle_since"] = event.get("since") if event["idle"] else None
+        try:
+            self.callback(event, dict(self.state))
+        except Exception as e:
+            log(f"Ошибка обработки события питания: {e}")
+
+
+def load_rules(items):
+    """Проверка правил, ValueError при ошибке"""
+    rules = []
+    for item in items or []:
+        if item.get("on") not in TRIGGERS:
+            raise ValueError(f"Неизвестное условие правила: {item.get('on')}")
+        rule = {
+            "on": item["on"],
+            "action": model.action_name(item.get("action")),
+            "delay": float(item.get("delay", 0)),
+            "percent": int(item.get("percent", 5)),
+            "minutes": float(item.get("minutes", 30)),
+            "outside": model.parse_windows(item.get("outside", [])),
+            "inside": model.parse_windows(item.get("inside", [])),
+        }
+        if rule["delay"] < 0 or rule["minutes"] <= 0 or not 0 <= rule["percent"] <= 100:
+            raise ValueError(f"Неверная задержка или порог в правиле {item['on']}")
+        rules.append(rule)
+    return rules
+
+
+def describe_rule(rule):
+    if rule["on"] == "battery_below":
+        return f"заряд не выше {rule['percent']}%"
+    if rule["on"] == "ac_unplugged":
+        return "сеть отключена"
+    if rule["on"] == "user_idle":
+        return f"нет активности {rule['minutes']:g} мин"
+    return "крышка закрыта"
+
+
+def allowed(rule, moment):
+    """Разрешено ли правило в момент moment по его окнам"""
+    if rule["outside"] and model.in_windows(rule["outside"], moment):
+        return False
+    return not rule["inside"] or model.in_windows(rule["inside"], moment)
+
+
+def next_allowed(rule, moment):
+    """Начало ближайшей разрешенной минуты в пределах недели или None"""
+    start = moment.replace(second=0, microsecond=0)
+    for step in range(1, 7 * 1440 + 1):
+        candidate = start + datetime.timedelta(minutes=step)
+        if allowed(rule, candidate):
+            return candidate
+    return None
+
+
+class PowerRules:
+    """Выполнение правил по событиям питания; execute(действие, причина)"""
+
+    def __init__(self, rules, execute, clock=datetime.datetime.now):
+        self.rules = rules
+        self.execute = execute
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.timers = {}     # номер правила -> таймер задержки
+        self.fired = set()   # сработавшие правила заряда (до повторного взвода)
+
+    def update(self, rules):
+        """Новые правила (перечитана политика); отложенные выполнения отменяются"""
+        with self.lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers = {}
+            self.fired = set()
+            self.rules = rules
+
+    def handle(self, event, state):
+        with self.lock:
+            for index, rule in enumerate(self.rules):
+                active = self._condition(rule, state)
+                if rule["on"] == "battery_below":
+                    if not active:
+                        self.fired.discard(index)  # заряд вырос или сеть подключена - взводим снова
+                        self._cancel(index)
+                    elif event["type"] == "battery" and index not in self.fired:
+                        self.fired.add(index)
+                        self._start(index, rule)
+                elif not active:
+                    self._cancel(index)
+                elif rule["on"] == "user_idle" and event["type"] == "idle":
+                    # Простой мог начаться раньше, чем пришло событие
+                    idle_for = time.time() - (state["idle_since"] or time.time())
+                    self._start(index, rule, max(0.0, rule["minutes"] * 60 - idle_for))
+                elif (rule["on"] == "ac_unplugged" and event["type"] == "ac") or \
+                        (rule["on"] == "lid_closed" and event["type"] == "lid"):
+                    self._start(index, rule)
+
+    def _condition(self, rule, state):
+        if rule["on"] == "battery_below":
+            return (state["battery"] is not None and state["battery"] <= rule["percent"]
+                    and state["ac_online"] is not True and state["battery_status"] != "Charging")
+        if rule["on"] == "ac_unplugged":
+            return state["ac_online"] is False
+        if rule["on"] == "user_idle":
+            return state["idle"] is True
+        return state["lid_closed"] is True
+
+    def _start(self, index, rule, delay=None):
+        if index in self.timers:
+            return
+        delay = rule["delay"] if delay is None else delay
+        if not delay:
+            self._fire(index, rule)
+            return
+        self._schedule(index, rule, delay)
+
+    def _schedule(self, index, rule, delay):
+        timer = threading.Timer(delay, self._fire_later, args=[index, rule])
+        timer.daemon = True
+        self.timers[index] = timer
+        timer.start()
+
+    def _cancel(self, index):
+        timer = self.timers.pop(index, None)
+        if timer:
+            timer.cancel()
+
+    def _fire_later(self, index, rule):
+        with self.lock:
+            if self.timers.pop(index, None) is None:
+                return  # отменено, пока ждали блокировку
+            self._fire(index, rule)
+
+    def _fire(self, index, rule):
+        now = self.clock()
+        if not allowed(rule, now):
+            # Условие еще выполняется (иначе таймер отменен) - ждем разрешенного времени
+            later = next_allowed(rule, now)
+            if later is not None:
+                self._schedule(index, rule, (later - now).total_seconds())
+            return
+        reason = describe_rule(rule)
+        # Действие выполняется вне блокировки правил: оно может занять время
+        threading.Thread(target=self.execute, args=[rule["action"], reason], daemon=True).start()
+
+
+def cmd_monitor(args):
+    source = PowerEventSource(lambda event, state: print(event, state, flush=True), lid=not args.no_lid)
+    print(f"Состояние: {source.state}", flush=True)
+    source.start()
+    try:
+        source.thread.join()
+    except KeyboardInterrupt:
+        source.stop()
+    return 0
+
+
+def cmd_inject(args):
+    if args.type == "battery":
+        event = {"type": "battery", "capacity": args.capacity, "status": args.status}
+    elif args.type == "ac":
+        event = {"type": "ac", "online": not args.offline}
+    elif args.type == "idle":
+        event = {"type": "idle", "idle": not args.active, "since": time.time() - args.minutes * 60}
+    else:
+        event = {"type": "lid", "closed": not args.open}
+    with ControlClient(args.socket) as client:
+        print(client.call("power.inject", event=event))
+    return 0
+
+
+def cmd_selftest(args):
+    """Тесты модуля: tests/test_power_events.py"""
+    import tests
+    return tests.run("power_events")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="События питания без опроса")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    monitor = commands.add_parser("monitor", help="показывать события питания")
+    monitor.add_argument("--no-lid", action="store_true", help="не открывать устройство крышки")
+    monitor.set_defaults(func=cmd_monitor)
+
+    inject = commands.add_parser("inject", help="синтетическое событие для службы (root)")
+    inject.add_argument("type", choices=["battery", "ac", "lid", "idle"])
+    inject.add_argument("--capacity", type=int, default=5)
+    inject.add_argument("--status", default="Discharging")
+    inject.add_argument("--offline", action="store_true", help="ac: сеть отключена")
+    inject.add_argument("--open", action="store_true", help="lid: крышка открыта")
+    inject.add_argument("--active", action="store_true", help="idle: пользователь активен")
+    inject.add_argument("--minutes", type=float, default=0, help="idle: сколько минут уже длится простой")
+    inject.add_argument("--socket", default=model.DAEMON_SOCKET)
+    inject.set_defaults(func=cmd_inject)
+
+    selftest = commands.add_parser("selftest", help="проверка правил на синтетических событиях")
+    selftest.set_defaults(func=cmd_selftest)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, ControlError) as e:
+        print(f"power_events: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
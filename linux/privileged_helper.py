@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Минимальный привилегированный помощник Sleep Scheduler
+
+GUI работает от имени пользователя, а операции, которым нужен root,
+передает этому помощнику по Unix-сокету (JSON-RPC 2.0, одно сообщение
+на строку - тот же протокол, что у API управления, см. control_client.py):
+    power.action            {"action": "Сон"}           - действие питания через systemctl
+    sleep.hibernate_delay   {"seconds": 3600}           - задержка гибернации для suspend-then-hibernate
+    rtc.set                 {"time": "2024-05-01T07:00:00" | null} - будильник RTC
+    settings.write          {"settings": {...}}         - запись /etc/sleep-scheduler.json
+    systemd.export          {}                          - таймеры systemd по /etc/sleep-scheduler.json
+    systemd.reload          {}                          - systemctl daemon-reload
+Все параметры проверяются; другие методы и поля отклоняются.
+
+Помощник запускается systemd по первому подключению к сокету
+(sleep-scheduler-helper.socket) и завершается после IDLE_EXIT секунд без
+подключений - в простое он не занимает память. Подключаться могут root и
+члены группы ALLOWED_GROUP (права сокета 0660 и проверка SO_PEERCRED).
+Запросы выполняются по одному; GUI, который сам запущен под root и не
+нашел сокет, вызывает те же методы в своем процессе (call_local).
+
+Примеры:
+    sudo python3 privileged_helper.py serve --socket /tmp/helper.sock --dry-run
+    python3 privileged_helper.py call --socket /tmp/helper.sock power.action '{"action": "Сон"}'
+"""
+import os
+import grp
+import pwd
+import sys
+import json
+import socket
+import struct
+import inspect
+import argparse
+import datetime
+import subprocess
+
+from control_client import (
+    PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, INTERNAL_ERROR,
+    MAX_MESSAGE, ControlClient, ControlError, encode_message
+)
+from schedule_model import SYSTEMCTL_VERBS, SUSPEND_THEN_HIBERNATE, validate_task
+
+HELPER_SOCKET = "/run/sleep-scheduler-helper.sock"
+SETTINGS_FILE = "/etc/sleep-scheduler.json"
+ALLOWED_GROUP = "sleep-scheduler"
+# Завершение после стольких секунд без подключений (systemd запустит снова)
+IDLE_EXIT = 30
+CLIENT_TIMEOUT = 10
+# Первый переданный systemd дескриптор (sd_listen_fds)
+LISTEN_FDS_START = 3
+MAX_WAKE_AHEAD = datetime.timedelta(days=366)
+MAX_HIBERNATE_DELAY = 7 * 86400
+SETTINGS_FIELDS = {"time_format", "autostart", "schedules", "report_url"}
+
+
+def log(message):
+    """Журнал помощника (stdout попадает в journald)"""
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def validate_settings(settings):
+    """Проверка настроек USB-версии перед записью в /etc, ValueError при ошибке"""
+    if not isinstance(settings, dict):
+        raise ValueError("Настройки передаются объектом")
+    unknown = set(settings) - SETTINGS_FIELDS
+    if unknown:
+        raise ValueError(f"Неизвестные поля настроек: {', '.join(sorted(unknown))}")
+    if not isinstance(settings.get("time_format", ""), str):
+        raise ValueError("Поле time_format должно быть строкой")
+    if not isinstance(settings.get("autostart", 0), (bool, int)):
+        raise ValueError("Поле autostart должно быть числом")
+    url = settings.get("report_url")
+    if url and not (isinstance(url, str) and url.startswith(("http://", "https://"))):
+        raise ValueError(f"Неверный адрес сборщика: {url}")
+    schedules = settings.get("schedules", [])
+    if not isinstance(schedules, list):
+        raise ValueError("Поле schedules должно быть списком")
+    ids = set()
+    for task in schedules:
+        if not isinstance(task, dict) or not isinstance(task.get("id"), str):
+            raise ValueError("У задачи нет ID")
+        if task["id"] in ids:
+            raise ValueError(f"Повторяющийся ID задачи: {task['id']}")
+        ids.add(task["id"])
+        validate_task(task)
+
+
+class PrivilegedHelper:
+    """Методы помощника; dry_run - только журнал, без изменений в системе"""
+
+    def __init__(self, settings_path=SETTINGS_FILE, dry_run=False, runner=subprocess.run):
+        self.settings_path = settings_path
+        self.dry_run = dry_run
+        self.runner = runner
+
+    def rpc_power_action(self, action):
+        if action not in SYSTEMCTL_VERBS:
+            raise ValueError(f"Неизвестное действие: {action}")
+        log(f"Действие: {action}")
+        if self.dry_run:
+            return {"done": action}
+        import power_actions
+        ok, error = power_actions.run_action(action, runner=self.runner)
+        if not ok:
+            raise RuntimeError(error)
+        return {"done": action}
+
+    def rpc_sleep_hibernate_delay(self, seconds):
+        if not isinstance(seconds, int) or not 60 <= seconds <= MAX_HIBERNATE_DELAY:
+            raise ValueError(f"Задержка гибернации вне диапазона 60..{MAX_HIBERNATE_DELAY} с: {seconds}")
+        log(f"Задержка гибернации: {seconds} с")
+        if not self.dry_run:
+            import sleep_planner
+            sleep_planner.apply_delay({"mode": SUSPEND_THEN_HIBERNATE, "delay": seconds})
+        return {"delay": seconds}
+
+    def rpc_rtc_set(self, time=None):
+        when = None
+        if time is not None:
+            try:
+                when = datetime.datetime.fromisoformat(time)
+            except (TypeError, ValueError):
+                raise ValueError(f"Неверное время: {time}")
+            now = datetime.datetime.now(when.tzinfo)
+            if not now < when <= now + MAX_WAKE_AHEAD:
+                raise ValueError(f"Время пробуждения должно быть в ближайший год: {time}")
+        log(f"Будильник RTC: {when or 'сброшен'}")
+        if not self.dry_run:
+            import power_actions
+            power_actions.set_rtc_wake(when)
+        return {"time": when.isoformat() if when else None}
+
+    def rpc_settings_write(self, settings):
+        validate_settings(settings)
+        log(f"Запись настроек: задач {len(settings.get('schedules', []))}")
+        if not self.dry_run:
+            temp = self.settings_path + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(settings, f, indent=2)
+            os.chmod(temp, 0o644)
+            os.replace(temp, self.settings_path)
+        return {"written": self.settings_path}
+
+    def rpc_systemd_export(self):
+        import systemd_units
+        with open(self.settings_path, "r") as f:
+            settings = json.load(f)
+        validate_settings(settings)
+        changed, removed = systemd_units.export_config(settings, dry_run=self.dry_run)
+        log(f"Экспорт в systemd: записано {len(changed)}, удалено {len(removed)}")
+        return {"changed": changed, "removed": removed}
+
+    def rpc_systemd_reload(self):
+        log("systemctl daemon-reload")
+        if not self.dry_run:
+            self.runner(["systemctl", "daemon-reload"], check=True)
+        return {"reloaded": True}
+
+
+def call_local(method, **params):
+    """Вызов метода помощника в текущем процессе (GUI уже запущен под root)"""
+    func = getattr(PrivilegedHelper(), "rpc_" + method.replace(".", "_"), None)
+    if func is None:
+        raise ValueError(f"Неизвестный метод: {method}")
+    return func(**params)
+
+
+def peer_allowed(uid, group=ALLOWED_GROUP):
+    """root или член группы group"""
+    if uid == 0:
+        return True
+    try:
+        user = pwd.getpwuid(uid)
+        members = grp.getgrnam(group)
+    except KeyError:
+        return False
+    return user.pw_name in members.gr_mem or user.pw_gid == members.gr_gid
+
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def handle_request(helper, request, uid):
+    """Ответ на одно сообщение JSON-RPC (пакеты не поддерживаются)"""
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return _error(None, INVALID_REQUEST, "Некорректный запрос")
+    request_id = request.get("id")
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        return _error(request_id, INVALID_PARAMS, "Параметры передаются объектом")
+    func = getattr(helper, "rpc_" + request["method"].replace(".", "_"), None)
+    if func is None:
+        return _error(request_id, METHOD_NOT_FOUND, f"Неизвестный метод: {request['method']}")
+    try:
+        inspect.signature(func).bind(**params)
+    except TypeError as e:
+        return _error(request_id, INVALID_PARAMS, str(e))
+    log(f"Запрос {request['method']} от uid {uid}")
+    try:
+        result = func(**params)
+    except ValueError as e:
+        return _error(request_id, INVALID_PARAMS, str(e))
+    except Exception as e:
+        return _error(request_id, INTERNAL_ERROR, str(e))
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+def serve_client(helper, conn):
+    uid = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))[1]
+    conn.settimeout(CLIENT_TIMEOUT)
+    stream = conn.makefile("rb")
+    try:
+        if not peer_allowed(uid):
+            log(f"Отказано uid {uid}: нет в группе {ALLOWED_GROUP}")
+            conn.sendall(encode_message(_error(None, INVALID_REQUEST, f"Нужно членство в группе {ALLOWED_GROUP}")))
+            return
+        while True:
+            line = stream.readline(MAX_MESSAGE + 1)
+            if not line:
+                return
+            if len(line) > MAX_MESSAGE:
+                conn.sendall(encode_message(_error(None, INVALID_REQUEST, "Слишком длинное сообщение")))
+                return
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                conn.sendall(encode_message(_error(None, PARSE_ERROR, "Некорректный JSON")))
+                continue
+            response = handle_request(helper, request, uid)
+            if isinstance(request, dict) and "id" in request:
+                conn.sendall(encode_message(response))
+    except OSError:
+        pass  # клиент отключился или не уложился в CLIENT_TIMEOUT
+    finally:
+        stream.close()
+        conn.close()
+
+
+def listening_socket(path):
+    """Сокет от systemd (LISTEN_FDS) или свой на path"""
+    if os.environ.get("LISTEN_PID") == str(os.getpid()) and int(os.environ.get("LISTEN_FDS", "0")) >= 1:
+        return socket.socket(fileno=LISTEN_FDS_START)
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o660)
+    try:
+        os.chown(path, 0, grp.getgrnam(ALLOWED_GROUP).gr_gid)
+    except (KeyError, PermissionError):
+        pass
+    sock.listen(8)
+    return sock
+
+
+def serve(helper, sock, idle_exit=IDLE_EXIT):
+    """Обслуживание подключений по одному; выход после idle_exit секунд простоя"""
+    sock.settimeout(idle_exit)
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except socket.timeout:
+            log("Простой - завершение до следующего подключения")
+            return
+        serve_client(helper, conn)
+
+
+def cmd_serve(args):
+    helper = PrivilegedHelper(args.settings, dry_run=args.dry_run)
+    serve(helper, listening_socket(args.socket), args.idle_exit)
+    return 0
+
+
+def cmd_call(args):
+    with ControlClient(args.socket, timeout=60) as client:
+        print(json.dumps(client.call(args.method, **json.loads(args.params)), ensure_ascii=False, indent=2))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Привилегированный помощник Sleep Scheduler")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="обслуживать запросы (запускается systemd)")
+    serve_parser.add_argument("--socket", default=HELPER_SOCKET, help="сокет без активации systemd")
+    serve_parser.add_argument("--settings", default=SETTINGS_FILE)
+    serve_parser.add_argument("--idle-exit", type=float, default=IDLE_EXIT)
+    serve_parser.add_argument("--dry-run", action="store_true", help="только журнал, без изменений")
+    serve_parser.set_defaults(func=cmd_serve)
+    call = commands.add_parser("call", help="вызвать метод помощника")
+    call.add_argument("method")
+    call.add_argument("params", nargs="?", default="{}", help="параметры JSON-объектом")
+    call.add_argument("--socket", default=HELPER_SOCKET)
+    call.set_defaults(func=cmd_call)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, ControlError) as e:
+        print(f"privileged_helper: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""Общая модель расписания TimeMaster без зависимостей от GUI
+
+Проверка: python3 schedule_model.py
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import datetime
+import itertools
+import tempfile
+
+DAYS_OF_WEEK_SHORT = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+DAYS_OF_WEEK_FULL = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+ACTIONS = ["Выключить", "Сон", "Гибернация", "Перезагрузка", "Авто"]
+# "Авто" выбирает один из режимов сна при выполнении (см. sleep_planner)
+AUTO = "Авто"
+SUSPEND_THEN_HIBERNATE = "Сон, затем гибернация"
+HYBRID_SLEEP = "Гибридный сон"
+REPEATS = ["Один раз", "Ежедневно", "По будням", "По выходным"]
+# Действия с экраном (см. display_power): машина остается доступной, выход - мгновенный.
+# Выполняются в сеансе пользователя, поэтому есть только в недельной таблице TimeMaster
+DISPLAY_OFF = "Выключить экран"
+DISPLAY_DIM = "Затемнить экран"
+DISPLAY_BLANK = "Погасить экран"
+DISPLAY_ACTIONS = [DISPLAY_OFF, DISPLAY_DIM, DISPLAY_BLANK]
+SCHEDULE_ACTIONS = ACTIONS + DISPLAY_ACTIONS
+
+# Действие -> глагол systemctl
+SYSTEMCTL_VERBS = {
+    "Выключить": "poweroff",
+    "Сон": "suspend",
+    "Гибернация": "hibernate",
+    "Перезагрузка": "reboot",
+    SUSPEND_THEN_HIBERNATE: "suspend-then-hibernate",
+    HYBRID_SLEEP: "hybrid-sleep",
+}
+
+# Англоязычные коды для скриптов и CSV
+DAY_CODES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ACTION_CODES = {verb: action for action, verb in SYSTEMCTL_VERBS.items()}
+ACTION_CODES["auto"] = AUTO
+ACTION_CODES.update({"display-off": DISPLAY_OFF, "display-dim": DISPLAY_DIM, "display-blank": DISPLAY_BLANK})
+
+CONFIG_DIR = os.path.expanduser("~/.config/timemaster")
+CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+# Сокет API управления запущенного TimeMaster
+CONTROL_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or CONFIG_DIR, "timemaster.sock")
+# Сокет системной службы для многопользовательских машин
+DAEMON_SOCKET = "/run/timemaster/daemon.sock"
+
+# Дни недели повторения задач USB-версии (0=пн, 6=вс)
+REPEAT_WEEKDAYS = {
+    "Ежедневно": list(range(7)),
+    "По будням": list(range(5)),
+    "По выходным": [5, 6],
+}
+
+
+def parse_hhmm(value):
+    """Разбор строки ЧЧ:ММ, возвращает (часы, минуты) или None для пустого значения"""
+    if value is None or not str(value).strip():
+        return None
+    parsed = datetime.datetime.strptime(str(value).strip(), "%H:%M")
+    return parsed.hour, parsed.minute
+
+
+def normalize_hhmm(value):
+    """Время в виде ЧЧ:ММ с ведущими нулями ("7:5" -> "07:05"), None для пустого; ValueError при ошибке"""
+    try:
+        clock = parse_hhmm(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Неверный формат времени: {value}")
+    return f"{clock[0]:02d}:{clock[1]:02d}" if clock else None
+
+
+def diff_schedule(old, new):
+    """Дни, записи которых в new отличаются от old"""
+    return [day for day in DAYS_OF_WEEK_SHORT if day in new and old.get(day) != new[day]]
+
+
+def default_config():
+    """Конфигурация TimeMaster по умолчанию"""
+    return {
+        "schedule": {
+            day: {
+                "enabled": True if i < 5 else False,
+                "on_time": None,
+                "off_time": "23:00",
+                "action": "Сон"
+            } for i, day in enumerate(DAYS_OF_WEEK_SHORT)
+        },
+        "autostart_programs": [],
+        "settings": {
+            "theme": "dark",
+            "start_minimized": False,
+            "notifications": True
+        }
+    }
+
+
+def load_config(path=CONFIG_FILE):
+    """Загрузка конфигурации TimeMaster, при отсутствии файла - значения по умолчанию"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return default_config()
+
+
+def save_config(config, path=CONFIG_FILE):
+    """Атомарная запись конфигурации: временный файл в том же каталоге и os.replace"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+
+
+def day_key(value):
+    """Ключ дня недели ("Пн") по русскому или английскому сокращению либо номеру"""
+    if isinstance(value, int) and 0 <= value < 7:
+        return DAYS_OF_WEEK_SHORT[value]
+    text = str(value).strip()
+    if text in DAYS_OF_WEEK_SHORT:
+        return text
+    for index, code in enumerate(DAY_CODES):
+        if text.lower() == code.lower():
+            return DAYS_OF_WEEK_SHORT[index]
+    raise ValueError(f"Неизвестный день недели: {value}")
+
+
+def parse_days(spec):
+    """Список ключей дней из выражения вида "Mon-Fri", "Sat,Sun", "Пн-Пт" или "all" """
+    if spec.strip().lower() in ("all", "все"):
+        return list(DAYS_OF_WEEK_SHORT)
+    days = []
+    for part in spec.split(","):
+        if "-" in part:
+            first, last = (DAYS_OF_WEEK_SHORT.index(day_key(p)) for p in part.split("-", 1))
+            if first > last:
+                raise ValueError(f"Неверный диапазон дней: {part}")
+            days += DAYS_OF_WEEK_SHORT[first:last + 1]
+        else:
+            days.append(day_key(part))
+    return [day for day in DAYS_OF_WEEK_SHORT if day in days]
+
+
+def action_name(value, display=False):
+    """Действие из русского названия или кода (suspend, poweroff...); display - с действиями экрана"""
+    allowed = SCHEDULE_ACTIONS if display else ACTIONS + [SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP]
+    name = value if value in SCHEDULE_ACTIONS else ACTION_CODES.get(str(value).lower())
+    if name not in allowed:
+        raise ValueError(f"Неизвестное действие: {value}")
+    return name
+
+
+def validate_day(entry):
+    """Проверка записи дня недельной таблицы, ValueError при ошибке"""
+    if not isinstance(entry.get("enabled"), bool):
+        raise ValueError("Поле enabled должно быть true/false")
+    for field in ("on_time", "off_time"):
+        try:
+            parse_hhmm(entry.get(field))
+        except (TypeError, ValueError):
+            raise ValueError(f"Неверный формат времени {field}: {entry.get(field)}")
+    if entry.get("action") not in SCHEDULE_ACTIONS:
+        raise ValueError(f"Неизвестное действие: {entry.get('action')}")
+
+
+def validate_schedule(schedule):
+    """Список ошибок недельной таблицы (пустой, если таблица корректна)"""
+    errors = []
+    for day in DAYS_OF_WEEK_SHORT:
+        if day not in schedule:
+            errors.append(f"{day}: день отсутствует")
+            continue
+        try:
+            validate_day(schedule[day])
+        except ValueError as e:
+            errors.append(f"{day}: {e}")
+    for day in schedule:
+        if day not in DAYS_OF_WEEK_SHORT:
+            errors.append(f"{day}: неизвестный день")
+    return errors
+
+
+# Любое срабатывание недельной таблицы повторяется не позже чем через неделю
+WEEK_HORIZON = datetime.timedelta(days=8)
+
+
+def week_fires(schedule, now):
+    """Срабатывания недельной таблицы после now: (время, день, "off"/"on", действие)"""
+    idle_days = 0
+    offset = 0
+    while idle_days <= 7:
+        date = now.date() + datetime.timedelta(days=offset)
+        day = DAYS_OF_WEEK_SHORT[date.weekday()]
+        entry = schedule.get(day) or {}
+        fires = []
+        if entry.get("enabled", False):
+            for kind, field in (("off", "off_time"), ("on", "on_time")):
+                try:
+                    clock = parse_hhmm(entry.get(field))
+                except (TypeError, ValueError):
+                    continue  # неверное время в файле - как и раньше, не срабатывает
+                if clock:
+                    fire = datetime.datetime.combine(date, datetime.time(*clock))
+                    action = entry.get("action", "Сон") if kind == "off" else None
+                    fires.append((fire, day, kind, action))
+        fires = sorted(f for f in fires if f[0] > now)
+        # Неделя без срабатываний после сегодняшнего дня - в таблице их нет
+        idle_days = 0 if fires else idle_days + 1
+        yield from fires
+        offset += 1
+
+
+def next_week_fires(schedule, now, count):
+    """Ближайшие count срабатываний недельной таблицы"""
+    return list(itertools.islice(week_fires(schedule, now), count))
+
+
+def next_on_time(schedule, now):
+    """Ближайшее время включения недельной таблицы в пределах недели или None"""
+    # Дни только с выключением дают срабатывания бесконечно - ищем не дальше недели
+    horizon = now + WEEK_HORIZON
+    for moment, _, kind, _ in itertools.takewhile(lambda f: f[0] <= horizon, week_fires(schedule, now)):
+        if kind == "on":
+            return moment
+    return None
+
+
+def parse_windows(windows):
+    """Окна времени [{"days": "Mon-Fri", "from": "20:00", "to": "07:00"}] -> разобранные окна"""
+    parsed = []
+    for window in windows:
+        start = parse_hhmm(window["from"])
+        end = parse_hhmm(window["to"])
+        parsed.append({
+            "days": [DAYS_OF_WEEK_SHORT.index(d) for d in parse_days(window.get("days", "all"))],
+            "start": start[0] * 60 + start[1],
+            "end": end[0] * 60 + end[1],
+        })
+    return parsed
+
+
+def in_windows(parsed, moment):
+    """Попадает ли момент в одно из разобранных окон"""
+    weekday = moment.weekday()
+    minute = moment.hour * 60 + moment.minute
+    for window in parsed:
+        if window["start"] <= window["end"]:
+            if weekday in window["days"] and window["start"] <= minute < window["end"]:
+                return True
+        # Ночное окно: хвост после полуночи относится к предыдущему дню
+        elif (weekday in window["days"] and minute >= window["start"]) or \
+                ((weekday - 1) % 7 in window["days"] and minute < window["end"]):
+            return True
+    return False
+
+
+def detect_format(data):
+    """Определение формата файла: 'week' (TimeMaster) или 'tasks' (USB-версия)"""
+    if isinstance(data.get("schedule"), dict):
+        return "week"
+    if isinstance(data.get("schedules"), list):
+        return "tasks"
+    raise ValueError("Неизвестный формат расписания")
+
+
+def task_weekdays(task):
+    """Дни недели задачи USB-версии, None для разовой задачи"""
+    return REPEAT_WEEKDAYS.get(task.get("repeat"))
+
+
+def next_one_shot(time_str, now):
+    """Ближайший момент срабатывания разовой задачи"""
+    hour, minute = parse_hhmm(time_str)
+    fire = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if fire <= now:
+        fire += datetime.timedelta(days=1)
+    return fire
+
+
+def task_title(task):
+    """Подпись задачи USB-версии для интерфейса и журнала"""
+    return f"{task['action']} в {task['time']} ({task['repeat']})"
+
+
+def validate_task(task):
+    """Проверка полей задачи USB-версии, ValueError при ошибке"""
+    if task.get("action") not in ACTIONS:
+        raise ValueError(f"Неизвестное действие: {task.get('action')}")
+    if task.get("repeat") not in REPEATS:
+        raise ValueError(f"Неизвестный повтор: {task.get('repeat')}")
+    try:
+        if parse_hhmm(task.get("time")) is None:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"Неверный формат времени: {task.get('time')}")
+
+
+def make_task(action, time_str, repeat, existing_ids=()):
+    """Создание задачи USB-версии с уникальным ID"""
+    task = {"action": action, "time": time_str, "repeat": repeat}
+    validate_task(task)
+    task_id = f"{action}-{time_str}-{int(time.time())}"
+    # Задачи, добавленные пакетом в одну секунду, различаем суффиксом
+    suffix = 1
+    unique_id = task_id
+    while unique_id in existing_ids:
+        suffix += 1
+        unique_id = f"{task_id}-{suffix}"
+    return {"id": unique_id, **task}
+
+
+def task_fires(task, now):
+    """Бесконечная последовательность срабатываний задачи после момента now"""
+    weekdays = task_weekdays(task)
+    if weekdays is None:
+        yield next_one_shot(task["time"], now)
+        return
+    hour, minute = parse_hhmm(task["time"])
+    day = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    while True:
+        if day > now and day.weekday() in weekdays:
+            yield day
+        day += datetime.timedelta(days=1)
+
+
+def next_task_fires(tasks, now, count):
+    """Ближайшие count срабатываний списка задач: [(время, задача)]"""
+    def stream(index, task):
+        for fire in task_fires(task, now):
+            yield fire, index, task
+
+    streams = [stream(index, task) for index, task in enumerate(tasks)]
+    return [(fire, task) for fire, _, task in itertools.islice(heapq.merge(*streams), count)]
+
+
+def selftest():
+    """Тесты модуля: tests/test_schedule_model.py"""
+    import tests
+    return tests.run("schedule_model")
+
+
+if __name__ == "__main__":
+    sys.exit(selftest())
@@ -0,0 +1,214 @@
+"""Выбор режима сна для действия "Авто" по модели затрат энергии
+
+Режимы: сон (suspend), гибернация, сон с последующей гибернацией через
+вычисленную задержку и гибридный сон. Для каждого режима считается энергия
+до момента, когда машина должна быть готова (ближайшее on_time):
+
+    сон          P_сна * T + P_раб * t_пробуждения_сна
+    гибернация   P_раб * (t_записи + t_пробуждения_гиб) + P_выкл * T
+    сон+гиб.(d)  P_сна * d + P_раб * (t_записи + t_пробуждения_гиб) + P_выкл * (T - d)
+    гибридный    P_сна * T + P_раб * (t_записи + t_пробуждения_сна)
+
+Сон на ПК без батареи дополнительно "стоит" ожидаемой потерей сеанса при
+отключении питания (OUTAGE_RATE в час), гибридный сон от нее защищен.
+Режим не подходит, если не успевает выйти из сна к сроку, если гибернация
+недоступна или если батареи не хватит на сон с запасом RESERVE_SECONDS.
+Гибернация окупается после T* = P_раб * (доп. время гибернации) / (P_сна - P_выкл);
+при неизвестном сроке выбирается сон с гибернацией через T* (не хуже
+удвоенного оптимума), на батарее - не позже, чем ее хватит.
+"""
+import os
+import json
+import socket
+import datetime
+
+import energy_meter
+import wake_planner
+from schedule_model import AUTO, SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP
+
+SUSPEND = "Сон"
+HIBERNATE = "Гибернация"
+MODES = [SUSPEND, HIBERNATE, SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP]
+
+# Значения по умолчанию, пока нет измерений (Вт и секунды)
+DEFAULTS = {
+    "awake_w": 30.0,
+    "suspend_w": 2.0,
+    "off_w": 0.5,
+    "suspend_resume_s": 5.0,
+    "hibernate_entry_s": 20.0,
+    "hibernate_resume_s": 40.0,
+}
+# Вероятность отключения питания в час и цена потерянного сеанса (секунды работы)
+OUTAGE_RATE = 0.002
+SESSION_RESTORE_S = 1800
+# Запас батареи после сна: столько секунд работы
+RESERVE_SECONDS = 600
+# Дней истории энергии для оценки мощностей
+POWER_HISTORY_DAYS = 28
+SLEEP_CONF_DROPIN = "/etc/systemd/sleep.conf.d/timemaster.conf"
+
+
+def can_hibernate(root="/"):
+    """Ядро поддерживает гибернацию и swap вмещает образ (~2/5 памяти по умолчанию)"""
+    try:
+        with open(os.path.join(root, "sys/power/state")) as f:
+            if "disk" not in f.read().split():
+                return False
+        meminfo = {}
+        with open(os.path.join(root, "proc/meminfo")) as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                meminfo[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return False
+    return meminfo.get("SwapTotal", 0) >= meminfo.get("MemTotal", 0) * 0.4
+
+
+def break_even(inputs):
+    """Длительность сна, после которой гибернация дешевле сна"""
+    extra = inputs["hibernate_entry_s"] + inputs["hibernate_resume_s"] - inputs["suspend_resume_s"]
+    difference = inputs["suspend_w"] - inputs["off_w"]
+    if difference <= 0:
+        return None  # сон не дороже выключенного состояния - гибернация не окупается
+    return max(0.0, inputs["awake_w"] * extra / difference)
+
+
+def battery_runtime(inputs):
+    """Сколько секунд батарея продержит сон с запасом; None - питание от сети"""
+    if not inputs.get("on_battery") or inputs.get("battery_j") is None:
+        return None
+    usable = inputs["battery_j"] - inputs["awake_w"] * RESERVE_SECONDS
+    return max(0.0, usable / max(inputs["suspend_w"], 0.01))
+
+
+def mode_energy(mode, duration, inputs, delay=0.0):
+    """Энергия режима за duration секунд (Дж)"""
+    awake, sleep, off = inputs["awake_w"], inputs["suspend_w"], inputs["off_w"]
+    hibernate_work = awake * (inputs["hibernate_entry_s"] + inputs["hibernate_resume_s"])
+    if mode == SUSPEND:
+        energy = sleep * duration + awake * inputs["suspend_resume_s"]
+        if inputs.get("battery_j") is None:
+            energy += OUTAGE_RATE * duration / 3600 * awake * SESSION_RESTORE_S
+        return energy
+    if mode == HIBERNATE:
+        return hibernate_work + off * duration
+    if mode == SUSPEND_THEN_HIBERNATE:
+        return sleep * delay + hibernate_work + off * max(0.0, duration - delay)
+    if mode == HYBRID_SLEEP:
+        return sleep * duration + awake * (inputs["hibernate_entry_s"] + inputs["suspend_resume_s"])
+    raise ValueError(f"Неизвестный режим: {mode}")
+
+
+def choose(duration, inputs):
+    """Выбор режима: {"mode", "delay", "energy", "reason"}
+
+    duration - секунды до срока готовности (None - срок неизвестен).
+    """
+    runtime = battery_runtime(inputs)
+    threshold = break_even(inputs)
+    hibernate_ok = inputs.get("can_hibernate", False)
+
+    if duration is None:
+        if not hibernate_ok:
+            return {"mode": SUSPEND, "delay": None, "energy": {},
+                    "reason": "срок неизвестен, гибернация недоступна"}
+        if threshold is None and runtime is None:
+            return {"mode": SUSPEND, "delay": None, "energy": {},
+                    "reason": "срок неизвестен, гибернация не окупается"}
+        delay = min(value for value in (threshold, runtime) if value is not None)
+        return {"mode": SUSPEND_THEN_HIBERNATE, "delay": int(delay), "energy": {},
+                "reason": "срок неизвестен: гибернация после точки окупаемости"}
+
+    candidates = {}
+    # Выход из сна должен уложиться в срок
+    if inputs["suspend_resume_s"] < duration and (runtime is None or runtime >= duration):
+        candidates[SUSPEND] = (mode_energy(SUSPEND, duration, inputs), None)
+    if hibernate_ok and inputs["hibernate_entry_s"] + inputs["hibernate_resume_s"] < duration:
+        # Сон с гибернацией при известном сроке всегда дороже чистой гибернации
+        candidates[HIBERNATE] = (mode_energy(HIBERNATE, duration, inputs), None)
+        if inputs.get("battery_j") is None and inputs["suspend_resume_s"] < duration:
+            candidates[HYBRID_SLEEP] = (mode_energy(HYBRID_SLEEP, duration, inputs), None)
+    energy = {mode: round(value) for mode, (value, _) in candidates.items()}
+    if not candidates:
+        # Ни один режим не успевает - самый быстрый выход из сна
+        return {"mode": SUSPEND, "delay": None, "energy": energy,
+                "reason": "ни один режим не укладывается в срок"}
+    mode = min(candidates, key=lambda m: candidates[m][0])
+    return {"mode": mode, "delay": candidates[mode][1], "energy": energy,
+            "reason": "минимум энергии до срока готовности"}
+
+
+def latency_estimates(wake_state=None, host=None):
+    """Время выхода из сна и гибернации по истории wake_planner (медианы)"""
+    estimates = {}
+    try:
+        with open(wake_state or wake_planner.STATE_FILE, "r", encoding="utf-8") as f:
+            samples = json.load(f).get("samples", {})
+    except (OSError, ValueError):
+        return estimates
+    host = host or socket.gethostname()
+    for action, key in ((SUSPEND, "suspend_resume_s"), (HIBERNATE, "hibernate_resume_s")):
+        values = sorted(samples.get(f"{host}:{action}", []))
+        if len(values) >= wake_planner.MIN_SAMPLES:
+            estimates[key] = values[len(values) // 2]
+    return estimates
+
+
+def gather_inputs(energy_file=energy_meter.ENERGY_FILE, root="/", wake_state=None, today=None):
+    """Входные данные модели: измерения там, где они есть, иначе значения по умолчанию"""
+    inputs = dict(DEFAULTS)
+    today = today or datetime.date.today()
+    report = energy_meter.savings(
+        energy_meter.load_days(energy_file),
+        today - datetime.timedelta(days=POWER_HISTORY_DAYS), today + datetime.timedelta(days=1))
+    if report["awake_watts"]:
+        inputs["awake_w"] = round(report["awake_watts"], 2)
+    if report["asleep_watts"]:
+        inputs["suspend_w"] = round(report["asleep_watts"], 2)
+    inputs.update(latency_estimates(wake_state))
+    battery = energy_meter.read_battery(root)
+    inputs["battery_j"] = round(battery[0]) if battery else None
+    inputs["on_battery"] = bool(battery and battery[1])
+    inputs["can_hibernate"] = can_hibernate(root)
+    return inputs
+
+
+def plan(deadline, now=None, inputs=None):
+    """Решение для "Авто": deadline - datetime готовности или None
+
+    Возвращает словарь решения вместе с входными данными - для журнала.
+    """
+    now = now or datetime.datetime.now()
+    inputs = inputs if inputs is not None else gather_inputs()
+    duration = None if deadline is None else max(0.0, (deadline - now).total_seconds())
+    decision = choose(duration, inputs)
+    decision["duration"] = duration
+    decision["inputs"] = inputs
+    return decision
+
+
+def resolve(action, deadline, now=None, inputs=None):
+    """Действие для выполнения: (действие, решение или None, если это не "Авто")"""
+    if action != AUTO:
+        return action, None
+    decision = plan(deadline, now, inputs)
+    return decision["mode"], decision
+
+
+def apply_delay(decision, path=SLEEP_CONF_DROPIN):
+    """Задержка гибернации для suspend-then-hibernate (нужны права root)"""
+    if decision.get("mode") != SUSPEND_THEN_HIBERNATE or not decision.get("delay"):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("# Сгенерировано TimeMaster для действия \"Авто\"\n")
+        f.write(f"[Sleep]\nHibernateDelaySec={max(60, decision['delay'])}s\n")
+
+
+def describe(decision):
+    """Краткое описание решения для журнала и статуса"""
+    text = decision["mode"]
+    if decision.get("delay"):
+        text += f" (гибернация через {decision['delay'] // 60} мин)"
+    return text
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Разнесение действий парка машин во времени
+
+Когда сотни машин с одинаковым расписанием засыпают и просыпаются в одну
+секунду, получаются скачки тока и нагрузки на сеть и файловые серверы.
+Каждый хост получает постоянное смещение в пределах окна window секунд,
+вычисленное из хеша его идентификатора (/etc/machine-id): выключение
+выполняется позже off_time на смещение, пробуждение - раньше on_time на
+смещение (к on_time машина все равно готова).
+
+Окно делится на слоты по slot секунд. Если задан cap - не больше cap машин
+группы начинают действие в одном слоте. Для гарантии нужен список машин
+группы (members): машины упорядочиваются по хешу и занимают слоты по cap
+штук; если слотов в окне не хватает, окно удлиняется - ограничение важнее.
+Без списка слот выбирается по хешу, ограничение выполняется в среднем.
+
+Настройка (в политике службы - раздел "stagger"):
+    {"window": 900, "slot": 30, "group": "lab-1", "cap": 20,
+     "members": ["<machine-id или имя>", ...]}
+
+Примеры:
+    python3 stagger.py offset --window 900
+    python3 stagger.py simulate -n 300 --window 900 --slot 30 --cap 20 --members
+"""
+import sys
+import math
+import socket
+import hashlib
+import argparse
+import datetime
+
+MACHINE_ID = "/etc/machine-id"
+DEFAULTS = {
+    "window": 0,
+    "slot": 30,
+    "group": "",
+    "cap": 0,
+    "members": [],
+}
+
+
+def host_identity(path=MACHINE_ID):
+    """Постоянный идентификатор хоста: machine-id, иначе имя хоста"""
+    try:
+        with open(path) as f:
+            identity = f.read().strip()
+        if identity:
+            return identity
+    except OSError:
+        pass
+    return socket.gethostname()
+
+
+def load_config(data):
+    """Настройка разнесения с проверкой полей, ValueError при ошибке"""
+    config = dict(DEFAULTS)
+    config.update(data or {})
+    for field in ("window", "slot", "cap"):
+        if not isinstance(config[field], int) or config[field] < 0:
+            raise ValueError(f"stagger.{field}: нужно целое число >= 0")
+    if config["slot"] == 0:
+        raise ValueError("stagger.slot: нужно целое число > 0")
+    if not isinstance(config["members"], list):
+        raise ValueError("stagger.members: нужен список")
+    return config
+
+
+def hash_fraction(identity, salt):
+    """Число в [0, 1) из хеша идентификатора - одно и то же при каждом запуске"""
+    digest = hashlib.sha256(f"{salt}\0{identity}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def slot_count(config):
+    return max(1, config["window"] // config["slot"])
+
+
+def member_slots(config):
+    """Слоты машин из списка группы: по cap машин на слот в порядке хешей"""
+    if not config["cap"]:
+        return {}
+    group = config["group"]
+    ranked = sorted(set(config["members"]), key=lambda member: (hash_fraction(member, group), member))
+    return {member: rank // config["cap"] for rank, member in enumerate(ranked)}
+
+
+def host_slot(identity, config, slots=None):
+    """Номер слота хоста (slots - заранее посчитанный member_slots)"""
+    slots = member_slots(config) if slots is None else slots
+    if identity in slots:
+        return slots[identity]
+    return int(hash_fraction(identity, config["group"]) * slot_count(config))
+
+
+def offset(identity, config, slots=None):
+    """Смещение хоста в секундах: начало слота и доля слота (второй хеш)"""
+    if not config["window"]:
+        return 0.0
+    inside = hash_fraction(identity, f"{config['group']}/slot") * config["slot"]
+    return host_slot(identity, config, slots) * config["slot"] + inside
+
+
+def shift(moment, kind, identity, config):
+    """Момент действия с учетом смещения: выключение позже, включение раньше"""
+    seconds = datetime.timedelta(seconds=offset(identity, config))
+    return moment - seconds if kind == "on" else moment + seconds
+
+
+def simulate(count, config, busy=20, bucket=None, groups=1):
+    """Нагрузка парка из count машин: (кривая [(секунда, начали, заняты)], максимум по группам)
+
+    busy - сколько секунд машина создает нагрузку после начала действия
+    (засыпание, загрузка, обращения к серверам).
+    """
+    bucket = bucket or config["slot"]
+    hosts = [f"host-{index:05d}" for index in range(count)]
+    starts = []
+    peak_by_group = {}
+    for group_index in range(groups):
+        members = hosts[group_index::groups]
+        group_config = dict(config, group=f"{config['group'] or 'group'}-{group_index}")
+        if config["members"]:
+            group_config["members"] = members
+        slots = member_slots(group_config)
+        group_starts = [offset(host, group_config, slots) for host in members]
+        starts += group_starts
+        peak_by_group[group_config["group"]] = peak_per_slot(group_starts, group_config["slot"])
+    starts.sort()
+    end = (max(starts) if starts else 0) + busy
+    curve = []
+    for index in range(int(math.ceil(end / bucket)) + 1):
+        low, high = index * bucket, (index + 1) * bucket
+        started = sum(1 for start in starts if low <= start < high)
+        active = sum(1 for start in starts if start < high and start + busy > low)
+        curve.append((low, started, active))
+    return curve, peak_by_group
+
+
+def peak_per_slot(starts, slot):
+    """Наибольшее число начал действия в одном слоте"""
+    counts = {}
+    for start in starts:
+        index = int(start // slot)
+        counts[index] = counts.get(index, 0) + 1
+    return max(counts.values(), default=0)
+
+
+def print_curve(curve, width=50):
+    """Кривая нагрузки псевдографикой"""
+    top = max((active for _, _, active in curve), default=0) or 1
+    print(f"{'Секунда':>8}{'Начали':>8}{'Заняты':>8}")
+    for second, started, active in curve:
+        bar = "#" * int(round(active / top * width))
+        print(f"{second:>8}{started:>8}{active:>8}  {bar}")
+
+
+def cmd_offset(args):
+    config = load_config({"window": args.window, "slot": args.slot, "group": args.group})
+    identity = args.identity or host_identity()
+    print(f"{identity}: смещение {offset(identity, config):.1f} с")
+    return 0
+
+
+def cmd_simulate(args):
+    config = load_config({"window": args.window, "slot": args.slot, "group": args.group,
+                          "cap": args.cap, "members": ["*"] if args.members else []})
+    for title, current in (("Без разнесения", dict(config, window=0)), ("С разнесением", config)):
+        curve, peaks = simulate(args.count, current, args.busy, args.bucket, args.groups)
+        print(f"\n{title}: {args.count} машин, групп {args.groups}")
+        print_curve(curve)
+        for group, peak in sorted(peaks.items()):
+            print(f"  {group}: не больше {peak} начал за {current['slot']} с")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Разнесение действий парка машин во времени")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    single = commands.add_parser("offset", help="смещение этого хоста")
+    single.add_argument("--identity", help="идентификатор (по умолчанию machine-id)")
+    single.add_argument("--window", type=int, default=900)
+    single.add_argument("--slot", type=int, default=DEFAULTS["slot"])
+    single.add_argument("--group", default="")
+    single.set_defaults(func=cmd_offset)
+
+    sim = commands.add_parser("simulate", help="кривая нагрузки для парка заданного размера")
+    sim.add_argument("-n", "--count", type=int, default=300)
+    sim.add_argument("--window", type=int, default=900)
+    sim.add_argument("--slot", type=int, default=DEFAULTS["slot"])
+    sim.add_argument("--group", default="")
+    sim.add_argument("--groups", type=int, default=1, help="число групп (машины делятся поровну)")
+    sim.add_argument("--cap", type=int, default=0, help="машин группы на слот")
+    sim.add_argument("--members", action="store_true", help="группам известен список машин")
+    sim.add_argument("--busy", type=int, default=20, help="секунд нагрузки от одной машины")
+    sim.add_argument("--bucket", type=int, help="ширина столбца кривой, с (по умолчанию слот)")
+    sim.set_defaults(func=cmd_simulate)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        print(f"stagger: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""Отправка состояния хоста центральному сборщику
+
+StatusReporter копит события (выполненные и неудачные действия,
+изменения расписания, пробуждения) и отправляет их пакетами: POST на
+адрес сборщика, тело - JSON, сжатый gzip (Content-Encoding: gzip).
+Пакет уходит, когда в нем BATCH_SIZE событий или первое событие ждет
+BATCH_DELAY секунд; раз в HEARTBEAT секунд отправляется пустой пакет -
+сборщик видит, что хост жив. В каждом пакете есть сводка "status":
+действующее расписание и ближайшее срабатывание (от программы), итог
+последнего действия и время последнего пробуждения.
+
+Если сборщик недоступен, пакет записывается в каталог очереди на диске
+(уже сжатым); перед сном и выключением (suspend) туда же сразу уходят
+неотправленные события. Размер очереди ограничен SPOOL_LIMIT байт -
+при переполнении удаляются самые старые пакеты. Очередь отправляется
+по порядку после пробуждения (resume) с паузой RESUME_DELAY на подъем
+сети, а при ошибках - с растущей паузой (BACKOFF_MIN..BACKOFF_MAX).
+Ответ 4xx (кроме 408 и 429) означает, что сборщик пакет не примет -
+такой пакет удаляется, чтобы не задерживать остальные.
+
+Для проверки без сервера есть FakeCollector - HTTP-сборщик на loopback.
+
+Примеры:
+    python3 status_reporter.py collector --port 8765
+    python3 status_reporter.py send http://127.0.0.1:8765/report
+    python3 status_reporter.py flush http://collector/report --spool ~/.cache/timemaster/report-spool
+    python3 status_reporter.py selftest
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import socket
+import argparse
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SPOOL_DIR = os.path.expanduser("~/.cache/timemaster/report-spool")
+BATCH_SIZE = 50
+BATCH_DELAY = 30
+HEARTBEAT = 900
+# Очередь на диске, байт (пакеты хранятся сжатыми)
+SPOOL_LIMIT = 5 * 1024 * 1024
+# Пауза перед отправкой после пробуждения - сеть поднимается не сразу
+RESUME_DELAY = 5
+BACKOFF_MIN = 5
+BACKOFF_MAX = 600
+# После suspend отправка ждет пробуждения, но не дольше (сон мог не состояться)
+SUSPEND_HOLD = 60
+SEND_TIMEOUT = 10
+# События, меняющие сводку "последнее действие"
+ACTION_EVENTS = ("action_done", "action_failed")
+
+
+def _log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def _iso(moment):
+    return datetime.datetime.fromtimestamp(moment).isoformat(timespec="seconds")
+
+
+class PermanentError(Exception):
+    """Сборщик отверг пакет - повтор не поможет"""
+
+
+def post(url, body, timeout=SEND_TIMEOUT):
+    """Отправка сжатого тела; OSError при временной ошибке, PermanentError - при отказе"""
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        if 400 <= e.code < 500 and e.code not in (408, 429):
+            raise PermanentError(f"HTTP {e.code}")
+        raise OSError(f"HTTP {e.code}")
+
+
+class Spool:
+    """Очередь сжатых пакетов в каталоге, ограниченная по размеру"""
+
+    def __init__(self, directory=SPOOL_DIR, limit=SPOOL_LIMIT):
+        self.directory = directory
+        self.limit = limit
+        self.counter = 0
+        self.dropped = 0
+
+    def files(self):
+        """Пакеты в порядке записи"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.directory, n) for n in names if n.endswith(".json.gz"))
+
+    def put(self, body):
+        os.makedirs(self.directory, exist_ok=True)
+        self.counter += 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self.counter:06d}.json.gz"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        self.trim()
+
+    def trim(self):
+        """Удаление самых старых пакетов сверх limit"""
+        files = self.files()
+        sizes = [os.path.getsize(p) for p in files]
+        total = sum(sizes)
+        for path, size in zip(files, sizes):
+            if total <= self.limit:
+                break
+            os.unlink(path)
+            total -= size
+            self.dropped += 1
+
+    def size(self):
+        return sum(os.path.getsize(p) for p in self.files())
+
+
+class StatusReporter:
+    """Пакетная отправка событий хоста с очередью на диске
+
+    status() - сводка программы (расписание, ближайшее срабатывание),
+    добавляется в каждый пакет.
+    """
+
+    def __init__(self, url, spool_dir=SPOOL_DIR, app="timemaster", status=None, log=_log,
+                 batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY, heartbeat=HEARTBEAT,
+                 spool_limit=SPOOL_LIMIT, sender=post):
+        self.url = url
+        self.spool = Spool(spool_dir, spool_limit)
+        self.app = app
+        self.status = status
+        self.log = log
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.heartbeat = heartbeat
+        self.sender = sender
+        self.host = socket.gethostname()
+        self.cond = threading.Condition()
+        self.events = []
+        self.first_at = None
+        self.last_sent = time.monotonic()
+        self.last_action = None
+        self.last_resume = None
+        self.hold_until = 0.0
+        self.retry_at = 0.0
+        self.backoff = 0
+        self.sent = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Остановка: неотправленные события - в очередь на диске"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(SEND_TIMEOUT + 1)
+        with self.cond:
+            self._spool_events()
+
+    # Вызовы из программы (любой поток)
+
+    def report(self, kind, **data):
+        with self.cond:
+            event = {"type": kind, "time": datetime.datetime.now().isoformat(timespec="seconds"), **data}
+            if kind in ACTION_EVENTS:
+                self.last_action = event
+            if not self.events:
+                self.first_at = time.monotonic()
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def suspend(self):
+        """Перед сном или выключением: события сразу на диск, отправка ждет пробуждения"""
+        with self.cond:
+            self._spool_events()
+            self.hold_until = time.monotonic() + SUSPEND_HOLD
+
+    def resume(self, suspended_at, resumed_at):
+        """Пробуждение (секунды эпохи): событие и отправка очереди после паузы на сеть"""
+        self.report("resumed", suspended_at=_iso(suspended_at), resumed_at=_iso(resumed_at))
+        with self.cond:
+            self.last_resume = _iso(resumed_at)
+            self.hold_until = 0.0
+            self.backoff = 0
+            self.retry_at = time.monotonic() + RESUME_DELAY
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {"url": self.url, "queued": len(self.events), "spooled": len(self.spool.files()),
+                    "spool_bytes": self.spool.size(), "dropped": self.spool.dropped,
+                    "sent": self.sent, "backoff": self.backoff}
+
+    # Пакеты
+
+    def _body(self, events):
+        status = {"last_action": self.last_action, "last_resume": self.last_resume}
+        if self.status:
+            try:
+                status.update(self.status())
+            except Exception as e:
+                self.log(f"Сводка состояния не получена: {e}")
+        payload = {"host": self.host, "app": self.app,
+                   "sent": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "status": status, "events": events}
+        return gzip.compress(json.dumps(payload, ensure_ascii=False, default=str).encode())
+
+    def _take_events(self):
+        events, self.events, self.first_at = self.events, [], None
+        return events
+
+    def _spool_events(self):
+        if not self.events:
+            return
+        events = self._take_events()
+        try:
+            self.spool.put(self._body(events))
+        except OSError as e:
+            self.log(f"Очередь отчетов недоступна, потеряно событий: {len(events)} ({e})")
+
+    def _send(self, body):
+        """Отправка вне блокировки: True - доставлено или отвергнуто навсегда"""
+        try:
+            self.sender(self.url, body)
+        except PermanentError as e:
+            self.log(f"Сборщик отверг пакет отчета ({e}), пакет удален")
+            return True
+        except OSError as e:
+            with self.cond:
+                self.backoff = min(BACKOFF_MAX, max(BACKOFF_MIN, self.backoff * 2))
+                # Разброс, чтобы парк после сбоя сети не приходил к сборщику одновременно
+                self.retry_at = time.monotonic() + self.backoff * random.uniform(0.8, 1.2)
+            self.log(f"Сборщик недоступен ({e}), повтор через {self.backoff} с")
+            return False
+        with self.cond:
+            self.backoff = 0
+            self.sent += 1
+            self.last_sent = time.monotonic()
+        return True
+
+    def _next_job(self):
+        """Ожидание работы: ("spool", путь), ("batch", тело) или None при остановке"""
+        with self.cond:
+            while self.running:
+                now = time.monotonic()
+                wait_until = max(self.hold_until, self.retry_at)
+                if now < wait_until:
+                    self.cond.wait(wait_until - now)
+                    continue
+                files = self.spool.files()
+                if files:
+                    return "spool", files[0]
+                due = self.first_at + self.batch_delay if self.events else self.last_sent + self.heartbeat
+                if len(self.events) >= self.batch_size or now >= due:
+                    return "batch", self._body(self._take_events())
+                self.cond.wait(due - now)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            kind, item = job
+            if kind == "spool":
+                try:
+                    with open(item, "rb") as f:
+                        body = f.read()
+                except OSError as e:
+                    self.log(f"Пакет очереди не прочитан: {e}")
+                    body = None
+                if body is None or self._send(body):
+                    try:
+                        os.unlink(item)
+                    except OSError:
+                        pass
+            elif not self._send(item):
+                with self.cond:
+                    try:
+                        self.spool.put(item)
+                    except OSError as e:
+                        self.log(f"Очередь отчетов недоступна, пакет потерян: {e}")
+
+
+class FakeCollector:
+    """HTTP-сборщик на loopback: принятые пакеты в batches, down=True - отвечать 503"""
+
+    def __init__(self, port=0):
+        collector = self
+        self.batches = []
+        self.down = False
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if collector.down:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                try:
+                    if self.headers.get("Content-Encoding") == "gzip":
+                        body = gzip.decompress(body)
+                    batch = json.loads(body)
+                except (OSError, ValueError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                with collector.lock:
+                    collector.batches.append(batch)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/report"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def events(self):
+        with self.lock:
+            return [event for batch in self.batches for event in batch["events"]]
+
+
+def cmd_collector(args):
+    collector = FakeCollector(args.port).start()
+    print(f"Сборщик: {collector.url} (Ctrl+C - выход)")
+    seen = 0
+    try:
+        while True:
+            time.sleep(1)
+            with collector.lock:
+                batches = collector.batches[seen:]
+                seen = len(collector.batches)
+            for batch in batches:
+                print(json.dumps(batch, ensure_ascii=False, indent=2))
+    except KeyboardInterrupt:
+        collector.stop()
+    return 0
+
+
+def cmd_send(args):
+    reporter = StatusReporter(args.url, args.spool)
+    reporter.report("test", message=args.message)
+    post(args.url, reporter._body(reporter._take_events()))
+    print("Отправлено")
+    return 0
+
+
+def cmd_flush(args):
+    spool = Spool(args.spool)
+    files = spool.files()
+    for path in files:
+        with open(path, "rb") as f:
+            post(args.url, f.read())
+        os.unlink(path)
+    print(f"Отправлено пакетов из очереди: {len(files)}")
+    return 0
+
+
+def cmd_selftest(args):
+    """Тесты модуля: tests/test_status_reporter.py"""
+    import tests
+    return tests.run("status_reporter")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отправка состояния хоста сборщику")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collector = commands.add_parser("collector", help="тестовый сборщик на loopback")
+    collector.add_argument("--port", type=int, default=8765)
+    collector.set_defaults(func=cmd_collector)
+    send = commands.add_parser("send", help="отправить тестовое событие")
+    send.add_argument("url")
+    send.add_argument("--message", default="проверка")
+    send.add_argument("--spool", default=SPOOL_DIR)
+    send.set_defaults(func=cmd_send)
+    flush = commands.add_parser("flush", help="отправить очередь с диска")
+    flush.add_argument("url")
+    flush.add_argument("--spool", default=SPOOL_DIR)
+    flush.set_defaults(func=cmd_flush)
+    selftest = commands.add_parser("selftest", help="проверка с тестовым сборщиком")
+    selftest.set_defaults(func=cmd_selftest)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, PermanentError) as e:
+        print(f"status_reporter: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
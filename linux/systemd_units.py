@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Компиляция расписания в таймеры и службы systemd
+
+Таймеры systemd выполняют расписание без резидентного процесса Python:
+для времени выключения создается таймер с oneshot-службой systemctl,
+для времени включения - таймер с WakeSystem=true, который будит машину через RTC.
+Установленные юниты сравниваются с требуемыми, поэтому перезаписываются
+и перезагружаются только изменившиеся.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import datetime
+import subprocess
+
+from schedule_model import (
+    DAYS_OF_WEEK_SHORT, SYSTEMCTL_VERBS, AUTO, detect_format, parse_hhmm,
+    task_weekdays, next_one_shot
+)
+
+SYSTEM_UNIT_DIR = "/etc/systemd/system"
+USER_UNIT_DIR = os.path.expanduser("~/.config/systemd/user")
+SYSTEMCTL = "/usr/bin/systemctl"
+WEEK_PREFIX = "timemaster-"
+TASKS_PREFIX = "sleep-scheduler-"
+# По этой строке отличаем свои юниты от установленных вручную
+MARKER = "# Сгенерировано TimeMaster, не редактировать вручную"
+
+SYSTEMD_DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DAY_SLUGS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def unit_verb(action):
+    """Глагол systemctl для юнита
+
+    Таймер не запускает планировщик режима сна, поэтому "Авто" в юнитах -
+    suspend-then-hibernate: момент гибернации выбирает сам systemd.
+    """
+    if action == AUTO:
+        return "suspend-then-hibernate"
+    return SYSTEMCTL_VERBS.get(action)
+
+
+def on_calendar(time_str, weekdays=None, date=None):
+    """Выражение OnCalendar= для времени ЧЧ:ММ по дням недели или на конкретную дату"""
+    hour, minute = parse_hhmm(time_str)
+    clock = f"{hour:02d}:{minute:02d}:00"
+    if date is not None:
+        return f"{date:%Y-%m-%d} {clock}"
+    if weekdays is None or len(weekdays) == 7:
+        return f"*-*-* {clock}"
+    return f"{','.join(SYSTEMD_DAYS[d] for d in sorted(weekdays))} *-*-* {clock}"
+
+
+def render_timer(description, calendar, wake=False):
+    """Текст .timer юнита"""
+    lines = [
+        MARKER,
+        "[Unit]",
+        f"Description={description}",
+        "",
+        "[Timer]",
+        f"OnCalendar={calendar}",
+        "AccuracySec=1s",
+        # Пропущенные действия не догоняем при загрузке
+        "Persistent=false",
+    ]
+    if wake:
+        lines.append("WakeSystem=true")
+    lines += ["", "[Install]", "WantedBy=timers.target", ""]
+    return "\n".join(lines)
+
+
+def render_service(description, verb=None):
+    """Текст oneshot .service юнита; без глагола служба только фиксирует пробуждение"""
+    exec_start = f"{SYSTEMCTL} {verb}" if verb else "/bin/true"
+    return "\n".join([
+        MARKER,
+        "[Unit]",
+        f"Description={description}",
+        "",
+        "[Service]",
+        "Type=oneshot",
+        f"ExecStart={exec_start}",
+        ""
+    ])
+
+
+def _add_pair(units, name, description, calendar, verb=None, wake=False):
+    """Добавление пары timer/service с общим именем"""
+    units[f"{name}.timer"] = render_timer(description, calendar, wake=wake)
+    units[f"{name}.service"] = render_service(description, verb)
+
+
+def units_from_week(schedule, prefix=WEEK_PREFIX):
+    """Юниты для недельной таблицы config["schedule"] версии TimeMaster"""
+    units = {}
+    for index, day in enumerate(DAYS_OF_WEEK_SHORT):
+        entry = schedule.get(day) or {}
+        if not entry.get("enabled", False):
+            continue
+        slug = DAY_SLUGS[index]
+
+        off_time = entry.get("off_time")
+        verb = unit_verb(entry.get("action", "Сон"))
+        if off_time and verb:
+            _add_pair(
+                units, f"{prefix}{slug}-off",
+                f"TimeMaster: {entry.get('action', 'Сон')} ({day} {off_time})",
+                on_calendar(off_time, [index]), verb=verb
+            )
+
+        on_time = entry.get("on_time")
+        if on_time:
+            _add_pair(
+                units, f"{prefix}{slug}-wake",
+                f"TimeMaster: включение ({day} {on_time})",
+                on_calendar(on_time, [index]), wake=True
+            )
+    return units
+
+
+def units_from_tasks(schedules, prefix=TASKS_PREFIX, now=None):
+    """Юниты для списка задач settings["schedules"] USB-версии"""
+    now = now or datetime.datetime.now()
+    units = {}
+    for task in schedules:
+        verb = unit_verb(task.get("action"))
+        if not verb or not task.get("time"):
+            continue
+        weekdays = task_weekdays(task)
+        if weekdays is None:
+            calendar = on_calendar(task["time"], date=next_one_shot(task["time"], now))
+        else:
+            calendar = on_calendar(task["time"], weekdays)
+        # ID задачи содержит кириллицу, в имени юнита используем хеш
+        digest = hashlib.sha1(str(task.get("id")).encode("utf-8")).hexdigest()[:10]
+        _add_pair(
+            units, f"{prefix}task-{digest}",
+            f"Sleep Scheduler: {task['action']} в {task['time']} ({task.get('repeat', '')})",
+            calendar, verb=verb
+        )
+    return units
+
+
+def units_from_config(data, prefix=None, now=None):
+    """Юниты для конфигурации любого из двух форматов"""
+    if detect_format(data) == "week":
+        return units_from_week(data["schedule"], prefix or WEEK_PREFIX)
+    return units_from_tasks(data["schedules"], prefix or TASKS_PREFIX, now)
+
+
+def installed_units(unit_dir, prefix):
+    """Ранее сгенерированные юниты в каталоге: имя -> содержимое"""
+    units = {}
+    if not os.path.isdir(unit_dir):
+        return units
+    for name in os.listdir(unit_dir):
+        if not name.startswith(prefix) or not name.endswith((".timer", ".service")):
+            continue
+        try:
+            with open(os.path.join(unit_dir, name), "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            continue
+        if content.startswith(MARKER):
+            units[name] = content
+    return units
+
+
+def diff_units(wanted, installed):
+    """Разница между требуемыми и установленными юнитами: (изменены, удалены)"""
+    changed = sorted(name for name, content in wanted.items() if installed.get(name) != content)
+    removed = sorted(name for name in installed if name not in wanted)
+    return changed, removed
+
+
+def _write_atomic(path, content):
+    """Атомарная запись файла через временный файл"""
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_file, path)
+
+
+def sync_units(wanted, unit_dir, prefix, user=False, dry_run=False, runner=subprocess.run):
+    """Приведение установленных юнитов к требуемым, возвращает (изменены, удалены)"""
+    changed, removed = diff_units(wanted, installed_units(unit_dir, prefix))
+    if dry_run or not (changed or removed):
+        return changed, removed
+
+    systemctl = [SYSTEMCTL, "--user"] if user else [SYSTEMCTL]
+    stale_timers = [name for name in removed if name.endswith(".timer")]
+    if stale_timers:
+        runner(systemctl + ["disable", "--now"] + stale_timers, check=False)
+
+    os.makedirs(unit_dir, exist_ok=True)
+    for name in removed:
+        os.remove(os.path.join(unit_dir, name))
+    for name in changed:
+        _write_atomic(os.path.join(unit_dir, name), wanted[name])
+
+    runner(systemctl + ["daemon-reload"], check=True)
+    # Таймер перезапускаем, если изменился он сам или его служба
+    timers = sorted({
+        name.rsplit(".", 1)[0] + ".timer" for name in changed
+    } & set(wanted))
+    if timers:
+        runner(systemctl + ["enable"] + timers, check=True)
+        runner(systemctl + ["restart"] + timers, check=True)
+    return changed, removed
+
+
+def export_config(data, user=False, unit_dir=None, prefix=None, dry_run=False):
+    """Экспорт конфигурации в systemd, возвращает (изменены, удалены)"""
+    if prefix is None:
+        prefix = WEEK_PREFIX if detect_format(data) == "week" else TASKS_PREFIX
+    if unit_dir is None:
+        unit_dir = USER_UNIT_DIR if user else SYSTEM_UNIT_DIR
+    wanted = units_from_config(data, prefix)
+    return sync_units(wanted, unit_dir, prefix, user=user, dry_run=dry_run)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт расписания в таймеры systemd")
+    parser.add_argument("--config", required=True,
+                        help="config.json TimeMaster или /etc/sleep-scheduler.json")
+    parser.add_argument("--unit-dir", help="каталог юнитов (по умолчанию системный)")
+    parser.add_argument("--prefix", help="префикс имен юнитов")
+    parser.add_argument("--user", action="store_true", help="пользовательский менеджер systemd")
+    parser.add_argument("--dry-run", action="store_true", help="только показать изменения")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.config, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        changed, removed = export_config(
+            data, user=args.user, unit_dir=args.unit_dir,
+            prefix=args.prefix, dry_run=args.dry_run
+        )
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Ошибка экспорта: {e}", file=sys.stderr)
+        return 1
+
+    for name in changed:
+        print(f"записан: {name}")
+    for name in removed:
+        print(f"удален: {name}")
+    if changed or removed:
+        print(f"Записано юнитов: {len(changed)}, удалено: {len(removed)}")
+    else:
+        print("Юниты актуальны, изменений нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""Компактная модель задач с числовыми кодами, не зависящая от языка
+
+Задача - запись из целых чисел:
+    action   код действия (POWEROFF, SUSPEND, ...); названия - ACTION_LABELS,
+             только для интерфейса;
+    minute   минута суток (NO_TIME - время не задано);
+    days     битовая маска дней недели (бит 0 - понедельник), 0 - разовая задача;
+    kind     KIND_OFF - действие, KIND_ON - включение (недельная таблица TimeMaster);
+    enabled  день включен (для задач USB-версии всегда 1).
+
+Оба формата файлов переводятся в модель и обратно без потерь:
+    недельная таблица TimeMaster (config["schedule"]) - по две записи на день
+        с ID "Mon-off" / "Mon-on", действие хранится в обеих;
+    список задач USB-версии (settings["schedules"]) - по записи на задачу.
+Остальные ключи файла (настройки, автозапуск) переносятся как есть.
+
+TaskTable хранит записи столбцами array - для больших списков задач
+(сотни тысяч) это в разы меньше памяти, чем словари.
+
+Примеры:
+    python3 task_model.py migrate ~/.config/timemaster/config.json -o tasks.json
+    python3 task_model.py migrate tasks.json --to tasks -o /etc/sleep-scheduler.json
+    python3 task_model.py bench -n 100000
+"""
+import sys
+import json
+import time
+import array
+import random
+import argparse
+import tracemalloc
+
+from schedule_model import (
+    DAYS_OF_WEEK_SHORT, DAY_CODES, AUTO, SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP,
+    DISPLAY_OFF, DISPLAY_DIM, DISPLAY_BLANK, detect_format
+)
+
+# Коды действий - часть формата файла, порядок не менять
+POWEROFF, SUSPEND, HIBERNATE, REBOOT, AUTO_MODE, SUSPEND_HIBERNATE, HYBRID = range(7)
+SCREEN_OFF, SCREEN_DIM, SCREEN_BLANK = range(7, 10)
+ACTION_LABELS = ["Выключить", "Сон", "Гибернация", "Перезагрузка", AUTO,
+                 SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP, DISPLAY_OFF, DISPLAY_DIM, DISPLAY_BLANK]
+ACTION_BY_LABEL = {label: code for code, label in enumerate(ACTION_LABELS)}
+# Действия с экраном: выполняет GUI в сеансе пользователя (display_power)
+SCREEN_ACTIONS = (SCREEN_OFF, SCREEN_DIM, SCREEN_BLANK)
+# Кнопки и списки действий питания в интерфейсе
+POWER_ACTIONS = (POWEROFF, REBOOT, SUSPEND, HIBERNATE)
+
+KIND_OFF, KIND_ON = 0, 1
+KIND_CODES = ["off", "on"]
+NO_TIME = 0xFFFF
+
+ONE_SHOT = 0
+EVERY_DAY = 0b1111111
+WEEKDAYS = 0b0011111
+WEEKEND = 0b1100000
+REPEAT_LABELS = {ONE_SHOT: "Один раз", EVERY_DAY: "Ежедневно", WEEKDAYS: "По будням", WEEKEND: "По выходным"}
+REPEAT_BY_LABEL = {label: mask for mask, label in REPEAT_LABELS.items()}
+REPEAT_ORDER = (ONE_SHOT, EVERY_DAY, WEEKDAYS, WEEKEND)
+
+FORMAT_VERSION = 1
+
+
+def action_code(label):
+    """Код действия по названию, ValueError для неизвестного"""
+    try:
+        return ACTION_BY_LABEL[label]
+    except KeyError:
+        raise ValueError(f"Неизвестное действие: {label}")
+
+
+def action_codes(labels):
+    """Коды действий для списка названий, неизвестные пропускаются"""
+    return {ACTION_BY_LABEL[label] for label in labels if label in ACTION_BY_LABEL}
+
+
+def is_screen_action(label):
+    return ACTION_BY_LABEL.get(label) in SCREEN_ACTIONS
+
+
+def minute_of_day(value):
+    """"ЧЧ:ММ" -> минута суток, пустое значение -> NO_TIME
+
+    Те же правила, что у parse_hhmm, но без strptime - в разы быстрее на больших файлах.
+    """
+    if value is None:
+        return NO_TIME
+    text = str(value).strip()
+    if not text:
+        return NO_TIME
+    hours, _, minutes = text.partition(":")
+    if (not hours.isdigit() or not minutes.isdigit() or len(hours) > 2 or len(minutes) > 2
+            or int(hours) > 23 or int(minutes) > 59):
+        raise ValueError(f"Неверный формат времени: {value}")
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minute(minute):
+    """Минута суток -> "ЧЧ:ММ" или None"""
+    return None if minute == NO_TIME else f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def day_mask(weekday):
+    return 1 << weekday
+
+
+def mask_weekdays(days):
+    """Маска -> список дней недели (0=пн)"""
+    return [day for day in range(7) if days & (1 << day)]
+
+
+class Task:
+    """Одна задача модели"""
+
+    __slots__ = ("id", "action", "minute", "days", "kind", "enabled")
+
+    def __init__(self, task_id, action, minute, days=ONE_SHOT, kind=KIND_OFF, enabled=1):
+        self.id = task_id
+        self.action = action
+        self.minute = minute
+        self.days = days
+        self.kind = kind
+        self.enabled = enabled
+
+    def __eq__(self, other):
+        return isinstance(other, Task) and self.row() == other.row()
+
+    def __repr__(self):
+        return f"Task{self.row()!r}"
+
+    def row(self):
+        """Запись для файла: [id, действие, минута, дни, вид, включена]"""
+        return [self.id, self.action, self.minute, self.days, self.kind, self.enabled]
+
+    def due(self, minute, weekday):
+        """Срабатывает в минуту minute дня weekday (разовая - в любой день)"""
+        return (self.enabled and self.minute == minute
+                and (self.days == ONE_SHOT or self.days & (1 << weekday) != 0))
+
+
+class TaskTable:
+    """Задачи столбцами array; индекс строки - порядок добавления
+
+    by_minute - строки по минуте суток: проверка расписания смотрит только
+    задачи своей минуты.
+    """
+
+    def __init__(self, tasks=()):
+        self.ids = []
+        self.actions = array.array("B")
+        self.minutes = array.array("H")
+        self.days = array.array("B")
+        self.flags = array.array("B")  # бит 0 - KIND_ON, бит 1 - enabled
+        self.by_minute = {}
+        for task in tasks:
+            self.append(task)
+
+    def append(self, task):
+        rows = self.by_minute.get(task.minute)
+        if rows is None:
+            rows = self.by_minute[task.minute] = array.array("I")
+        rows.append(len(self.ids))
+        self.ids.append(task.id)
+        self.actions.append(task.action)
+        self.minutes.append(task.minute)
+        self.days.append(task.days)
+        self.flags.append(task.kind | (2 if task.enabled else 0))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        flags = self.flags[index]
+        return Task(self.ids[index], self.actions[index], self.minutes[index],
+                    self.days[index], flags & 1, flags >> 1)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self[index]
+
+    def due(self, minute, weekday):
+        """Индексы включенных действий, срабатывающих в минуту minute дня weekday"""
+        bit = 1 << weekday
+        days, flags = self.days, self.flags
+        return [index for index in self.by_minute.get(minute, ())
+                if flags[index] == 2 and (days[index] == ONE_SHOT or days[index] & bit)]
+
+
+def from_week(schedule):
+    """Недельная таблица TimeMaster -> задачи (по две записи на день)"""
+    tasks = []
+    for weekday, day in enumerate(DAYS_OF_WEEK_SHORT):
+        entry = schedule.get(day)
+        if entry is None:
+            continue
+        action = action_code(entry.get("action", "Сон"))
+        enabled = 1 if entry.get("enabled") else 0
+        for kind, field in ((KIND_OFF, "off_time"), (KIND_ON, "on_time")):
+            tasks.append(Task(f"{DAY_CODES[weekday]}-{KIND_CODES[kind]}", action,
+                              minute_of_day(entry.get(field)), day_mask(weekday), kind, enabled))
+    return tasks
+
+
+def to_week(tasks):
+    """Задачи -> недельная таблица TimeMaster
+
+    Задача раскладывается на все дни своей маски. Разовые задачи и две задачи
+    на одно поле одного дня в таблицу не записать - ValueError, как в to_task_list.
+    """
+    schedule = {}
+    filled = {}
+    for task in tasks:
+        if task.days == ONE_SHOT:
+            raise ValueError(f"Разовую задачу {task.id} нельзя записать в недельную таблицу")
+        field = "off_time" if task.kind == KIND_OFF else "on_time"
+        for weekday in mask_weekdays(task.days):
+            day = DAYS_OF_WEEK_SHORT[weekday]
+            entry = schedule.get(day)
+            if entry is None:
+                entry = schedule[day] = {
+                    "enabled": bool(task.enabled), "on_time": None, "off_time": None,
+                    "action": ACTION_LABELS[task.action],
+                }
+            elif entry["enabled"] != bool(task.enabled):
+                raise ValueError(f"Задача {task.id}: день {day} другой задачей "
+                                 f"{'включен' if entry['enabled'] else 'выключен'}")
+            if (day, field) in filled:
+                raise ValueError(f"Задачи {filled[day, field]} и {task.id} занимают одно поле {field} дня {day}")
+            filled[day, field] = task.id
+            entry[field] = format_minute(task.minute)
+            # Действие дня задает выключение; у включения оно только повторяет его
+            if task.kind == KIND_OFF:
+                entry["action"] = ACTION_LABELS[task.action]
+    return {day: schedule[day] for day in DAYS_OF_WEEK_SHORT if day in schedule}
+
+
+def from_task_list(items):
+    """Список задач USB-версии -> задачи"""
+    tasks = []
+    for item in items:
+        try:
+            repeat = REPEAT_BY_LABEL[item["repeat"]]
+        except KeyError:
+            raise ValueError(f"Неизвестный повтор: {item.get('repeat')}")
+        tasks.append(Task(item["id"], action_code(item["action"]), minute_of_day(item["time"]), repeat))
+    return tasks
+
+
+def to_task_list(tasks):
+    """Задачи -> список задач USB-версии"""
+    items = []
+    for task in tasks:
+        if task.days not in REPEAT_LABELS or task.kind != KIND_OFF:
+            raise ValueError(f"Задачу {task.id} нельзя записать в формате USB-версии")
+        items.append({"id": task.id, "action": ACTION_LABELS[task.action],
+                      "time": format_minute(task.minute), "repeat": REPEAT_LABELS[task.days]})
+    return items
+
+
+def load(data):
+    """Файл любого формата -> (TaskTable, исходный формат, остальные ключи)
+
+    Поддерживаются недельная таблица, список задач и собственный формат модели.
+    """
+    if "task_model" in data:
+        rest = dict(data)
+        rest.pop("task_model")
+        model = rest.pop("tasks")
+        return TaskTable(Task(*row) for row in model), rest.pop("format"), rest
+    fmt = detect_format(data)
+    rest = dict(data)
+    if fmt == "week":
+        return TaskTable(from_week(rest.pop("schedule"))), fmt, rest
+    return TaskTable(from_task_list(rest.pop("schedules"))), fmt, rest
+
+
+def dump(table, fmt, rest):
+    """Запись в формате fmt: "week", "tasks" или "model" (исходный формат - в поле format)"""
+    if fmt == "week":
+        return {"schedule": to_week(table), **rest}
+    if fmt == "tasks":
+        return {"schedules": to_task_list(table), **rest}
+    raise ValueError(f"Неизвестный формат: {fmt}")
+
+
+def dump_model(table, fmt, rest):
+    """Собственный формат модели: строки задач и исходный формат для обратного перевода"""
+    return {"task_model": FORMAT_VERSION, "format": fmt,
+            "tasks": [task.row() for task in table], **rest}
+
+
+def cmd_migrate(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    table, fmt, rest = load(data)
+    target = args.to or ("model" if "task_model" not in data else fmt)
+    result = dump_model(table, fmt, rest) if target == "model" else dump(table, target, rest)
+    # Файл модели - одна строка: сотни тысяч записей с отступами занимают в разы больше
+    text = json.dumps(result, indent=None if target == "model" else 2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(f"Задач: {len(table)}, формат {fmt} -> {target}", file=sys.stderr)
+    return 0
+
+
+def sample_tasks(count, seed=0):
+    """Случайные задачи USB-версии для замера"""
+    rng = random.Random(seed)
+    labels = ACTION_LABELS[:5]
+    repeats = list(REPEAT_BY_LABEL)
+    return [{"id": f"task-{index}", "action": rng.choice(labels),
+             "time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", "repeat": rng.choice(repeats)}
+            for index in range(count)]
+
+
+def measure(build):
+    """Память (байты по tracemalloc) и время построения (без tracemalloc, он замедляет)"""
+    seconds = timed(build, repeat=1)
+    tracemalloc.start()
+    value = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, memory, seconds
+
+
+def timed(function, repeat=5):
+    """Лучшее время из repeat запусков"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def cmd_bench(args):
+    text = json.dumps({"schedules": sample_tasks(args.count, args.seed)}, ensure_ascii=False)
+    dicts, dict_memory, dict_load = measure(lambda: json.loads(text)["schedules"])
+    objects, object_memory, object_load = measure(lambda: from_task_list(json.loads(text)["schedules"]))
+    table, table_memory, table_load = measure(lambda: load(json.loads(text))[0])
+
+    # Одна проверка расписания: задачи минуты 22:30 в среду
+    weekday, hhmm, minute = 2, "22:30", 22 * 60 + 30
+    repeat_days = {"Ежедневно": range(7), "По будням": range(5), "По выходным": (5, 6)}
+
+    def scan_dicts():
+        return [task for task in dicts if task["time"] == hhmm
+                and (task["repeat"] == "Один раз" or weekday in repeat_days[task["repeat"]])]
+
+    results = [
+        ("словари (исходный формат)", dict_memory, dict_load, timed(scan_dicts)),
+        ("Task со __slots__", object_memory, object_load,
+         timed(lambda: [task for task in objects if task.due(minute, weekday)])),
+        ("TaskTable (array)", table_memory, table_load, timed(lambda: table.due(minute, weekday))),
+    ]
+    assert len(scan_dicts()) == len(table.due(minute, weekday))
+    roundtrip = timed(lambda: dump(table, "tasks", {}), repeat=1)
+    assert dump(table, "tasks", {})["schedules"] == dicts
+
+    print(f"Задач: {args.count}")
+    print(f"{'Представление':<28}{'Память, МБ':>12}{'Загрузка, мс':>15}{'Проверка, мс':>15}")
+    for name, memory, load_seconds, scan_seconds in results:
+        print(f"{name:<28}{memory / 1e6:>12.1f}{load_seconds * 1e3:>15.1f}{scan_seconds * 1e3:>15.2f}")
+    print(f"Обратный перевод в формат USB-версии: {roundtrip * 1e3:.1f} мс")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Модель задач: перевод форматов и замер")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="перевод файла расписания между форматами")
+    migrate.add_argument("input", help="config.json TimeMaster, sleep-scheduler.json или файл модели")
+    migrate.add_argument("--to", choices=["model", "week", "tasks"],
+                         help="целевой формат (по умолчанию модель; из модели - исходный)")
+    migrate.add_argument("-o", "--output", help="файл результата (по умолчанию stdout)")
+    migrate.set_defaults(func=cmd_migrate)
+
+    bench = commands.add_parser("bench", help="память и скорость представлений задач")
+    bench.add_argument("-n", "--count", type=int, default=100000)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"task_model: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Разбор совпадающих задач USB-версии: одно действие на момент времени
+
+Проверка расписания идет каждые 15 секунд, и задача совпадает со временем
+всю свою минуту. Поэтому планировщик:
+  - выбирает задачи, момент срабатывания которых наступил в последние
+    DUE_WINDOW секунд и еще не выполнялся (пары "ID задачи, момент"
+    хранятся в файле - после перезагрузки за ту же минуту задача не
+    сработает повторно);
+  - из нескольких таких задач выполняет одну, по старшинству действий:
+    Выключить > Перезагрузка > Гибернация > Авто > Сон. Более "сильное"
+    действие поглощает остальные: после выключения усыплять уже нечего.
+
+Конфликтом считаются задачи, срабатывания которых в какой-либо день недели
+ближе CONFLICT_WINDOW минут: вторая либо будет поглощена, либо не успеет
+выполниться, пока машина спит после первой.
+
+Задачи с неверными полями (см. split_valid) не выполняются и не участвуют
+в поиске конфликтов - одна испорченная запись не останавливает проверку.
+"""
+import os
+import json
+import datetime
+import tempfile
+import threading
+
+from schedule_model import parse_hhmm, task_weekdays, next_one_shot, validate_task
+from task_model import (
+    POWEROFF, REBOOT, HIBERNATE, AUTO_MODE, SUSPEND, ONE_SHOT,
+    action_code, format_minute, from_task_list, mask_weekdays
+)
+
+FIRED_FILE = "/var/lib/sleep-scheduler/fired.json"
+# Старшинство действий: большее значение поглощает меньшее
+ACTION_PRECEDENCE = {
+    POWEROFF: 5,
+    REBOOT: 4,
+    HIBERNATE: 3,
+    AUTO_MODE: 2,
+    SUSPEND: 1,
+}
+# Задача срабатывает в течение своей минуты
+DUE_WINDOW = 60
+# Выполненные срабатывания храним двое суток
+KEEP_FIRED = 2 * 86400
+CONFLICT_WINDOW = 5
+WEEK_MINUTES = 7 * 24 * 60
+
+
+class FiredLog:
+    """Выполненные срабатывания: пары (ID задачи, момент)"""
+
+    def __init__(self, path=FIRED_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fired = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for task_id, moment in json.load(f):
+                    self.fired[(task_id, moment)] = datetime.datetime.fromisoformat(moment)
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def seen(self, task_id, occurrence):
+        with self.lock:
+            return (task_id, occurrence.isoformat()) in self.fired
+
+    def add(self, pairs, now=None):
+        """Отметка срабатываний; запись на диск до выполнения действия"""
+        now = now or datetime.datetime.now()
+        with self.lock:
+            for task_id, occurrence in pairs:
+                self.fired[(task_id, occurrence.isoformat())] = occurrence
+            limit = now - datetime.timedelta(seconds=KEEP_FIRED)
+            self.fired = {key: moment for key, moment in self.fired.items() if moment >= limit}
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".fired-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(sorted(self.fired), f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+def split_valid(tasks):
+    """Разделение задач на корректные и [(задача, текст ошибки)]"""
+    valid, invalid = [], []
+    for task in tasks:
+        try:
+            if not isinstance(task, dict) or not task.get("id"):
+                raise ValueError("у задачи нет ID")
+            validate_task(task)
+        except ValueError as e:
+            invalid.append((task, str(e)))
+            continue
+        valid.append(task)
+    return valid, invalid
+
+
+def occurrence_at(task, now):
+    """Момент срабатывания задачи, наступивший не раньше DUE_WINDOW секунд назад, или None"""
+    hour, minute = parse_hhmm(task["time"])
+    moment = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if moment > now:
+        moment -= datetime.timedelta(days=1)  # минута задачи могла начаться вчера (23:59)
+    if (now - moment).total_seconds() >= DUE_WINDOW:
+        return None
+    weekdays = task_weekdays(task)
+    if weekdays is not None and moment.weekday() not in weekdays:
+        return None
+    return moment
+
+
+def due_tasks(tasks, now, fired):
+    """Задачи, которые пора выполнить: [(задача, момент)] без уже выполненных"""
+    due = []
+    for task in split_valid(tasks)[0]:
+        occurrence = occurrence_at(task, now)
+        if occurrence is not None and not fired.seen(task["id"], occurrence):
+            due.append((task, occurrence))
+    return due
+
+
+def resolve(due):
+    """Одно действие из совпавших задач: ((задача, момент), [поглощенные])
+
+    При равном старшинстве выполняется задача, добавленная раньше.
+    """
+    ranks = [ACTION_PRECEDENCE.get(action_code(task["action"]), 0) for task, _ in due]
+    ranked = sorted(range(len(due)), key=lambda i: (-ranks[i], i))
+    return due[ranked[0]], [due[i] for i in ranked[1:]]
+
+
+def week_minutes(task, now):
+    """Минуты недели (0 - полночь понедельника), в которые срабатывает задача модели"""
+    if task.days == ONE_SHOT:
+        weekdays = [next_one_shot(format_minute(task.minute), now).weekday()]
+    else:
+        weekdays = mask_weekdays(task.days)
+    return [day * 1440 + task.minute for day in weekdays]
+
+
+def conflicts(tasks, now=None, window=CONFLICT_WINDOW):
+    """Конфликтующие задачи: {ID: множество ID задач, с которыми она совпадает}
+
+    Срабатывания всех задач сортируются по минуте недели, сравниваются
+    только соседние в пределах окна (с переходом через конец недели).
+    """
+    now = now or datetime.datetime.now()
+    tasks = split_valid(tasks)[0]
+    points = sorted((point, index) for index, task in enumerate(from_task_list(tasks))
+                    for point in week_minutes(task, now))
+    found = {}
+    count = len(points)
+    for position, (point, index) in enumerate(points):
+        for step in range(1, count):
+            other_point, other = points[(position + step) % count]
+            distance = (other_point - point) % WEEK_MINUTES
+            if distance > window:
+                break
+            if other != index:
+                found.setdefault(tasks[index]["id"], set()).add(tasks[other]["id"])
+                found.setdefault(tasks[other]["id"], set()).add(tasks[index]["id"])
+    return found
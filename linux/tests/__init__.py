@@ -0,0 +1,21 @@
+"""Тесты модулей TimeMaster (unittest; запускаются и из pytest)
+
+Запуск из каталога linux:
+    python3 -m unittest discover -s tests -t .
+    python3 -m pytest tests
+Команды selftest модулей запускают тесты своего модуля через run().
+"""
+import os
+import sys
+import unittest
+
+LINUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if LINUX_DIR not in sys.path:
+    sys.path.insert(0, LINUX_DIR)
+
+
+def run(module):
+    """Тесты tests/test_<module>.py с подробным выводом: 0 - успех, 1 - ошибки"""
+    suite = unittest.defaultTestLoader.loadTestsFromName(f"tests.test_{module}")
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    return 0 if result.wasSuccessful() else 1
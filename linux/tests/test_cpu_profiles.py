@@ -0,0 +1,95 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import cpu_profiles as cp
+
+POLICY0 = f"{cp.CPU_DIR}/cpufreq/policy0"
+
+
+class ProfileStateTest(unittest.TestCase):
+    """Переходы и откат на поддельном дереве sysfs"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="cpu-sysfs-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        cp.make_fake_sysfs(self.root)
+        self.state_path = os.path.join(self.root, "state.json")
+        self.original = cp.snapshot(self.root)
+        self.profiles = cp.load_profiles({"night": {"governor": "powersave", "epp": "power",
+                                                    "max_freq": "50%", "online": "0-1"}})
+        self.state = cp.ProfileState(self.state_path, self.root)
+        self.state.apply("night", self.profiles["night"])
+
+    def test_night_profile(self):
+        current = cp.snapshot(self.root)
+        self.assertEqual(current[f"{POLICY0}/scaling_governor"], "powersave")
+        self.assertEqual(current[f"{POLICY0}/energy_performance_preference"], "power")
+        self.assertEqual(current[f"{POLICY0}/scaling_max_freq"], "1500000")
+        self.assertEqual(current[f"{cp.CPU_DIR}/cpu3/online"], "0")
+        self.assertEqual(current[f"{cp.CPU_DIR}/cpu1/online"], "1")
+        self.assertEqual(cp.ProfileState(self.state_path, self.root).baseline, self.original)
+
+    def test_transition_and_restore(self):
+        state = cp.ProfileState(self.state_path, self.root)  # как после перезапуска службы
+        state.apply("performance", self.profiles["performance"])
+        current = cp.snapshot(self.root)
+        self.assertEqual(current[f"{cp.CPU_DIR}/cpu3/online"], "1")
+        self.assertEqual(current[f"{POLICY0}/scaling_max_freq"], "3000000")
+        self.assertEqual(current[f"{cp.CPU_DIR}/cpufreq/policy2/scaling_governor"], "performance")
+        state.restore()
+        self.assertEqual(cp.snapshot(self.root), self.original)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_write_error_rolls_back(self):
+        state = cp.ProfileState(self.state_path, self.root)
+        state.apply("performance", self.profiles["performance"])
+        # Запись в EPP последней политики не удается - все изменения откатываются
+        broken = os.path.join(self.root, cp.CPU_DIR, "cpufreq", "policy3", "energy_performance_preference")
+        before = cp.snapshot(self.root)
+        os.unlink(broken)
+        os.mkdir(broken)
+        state.baseline[os.path.relpath(broken, self.root)] = "balance_performance"
+        with self.assertRaises(OSError):
+            state.apply("night", self.profiles["night"])
+        after = cp.snapshot(self.root)
+        self.assertEqual(after, {k: v for k, v in before.items() if k in after})
+        self.assertEqual(state.profile, "performance")
+
+
+class TransitionTest(unittest.TestCase):
+
+    def test_rollback_skips_paths_missing_from_snapshot(self):
+        root = tempfile.mkdtemp(prefix="cpu-sysfs-")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        cp.make_fake_sysfs(root)
+        # Политика ядра, включаемого в этом же переходе: до записи ее нет
+        governor = f"{cp.CPU_DIR}/cpufreq/policy3/scaling_governor"
+        os.unlink(os.path.join(root, governor))
+        broken = f"{cp.CPU_DIR}/cpufreq/policy3/scaling_max_freq"
+        os.unlink(os.path.join(root, broken))
+        os.mkdir(os.path.join(root, broken))
+        target = cp.snapshot(root)
+        target[f"{POLICY0}/scaling_governor"] = "powersave"
+        target[governor] = "powersave"
+        target[broken] = "1000000"
+        with self.assertRaises(OSError) as raised:
+            cp.transition(target, root)
+        self.assertIn(broken, str(raised.exception))
+        self.assertEqual(cp.snapshot(root)[f"{POLICY0}/scaling_governor"], "schedutil")
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_window_across_midnight(self):
+        profiles = cp.load_profiles()
+        schedule = cp.load_schedule([{"profile": "powersave", "days": "all", "from": "22:00", "to": "07:00"}],
+                                    profiles)
+        self.assertEqual(cp.active_profile(schedule, datetime.datetime(2024, 1, 2, 3, 0)), "powersave")
+        self.assertIsNone(cp.active_profile(schedule, datetime.datetime(2024, 1, 2, 12, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import datetime
+import tempfile
+import unittest
+
+import energy_meter as em
+
+
+class FakeSampler(em.EnergySampler):
+    """Показания задаются тестом: только RAPL, во сне счетчик стоит"""
+
+    def __init__(self, path):
+        self.now, self.slept, self.rapl_uj = 1000.0, 0.0, 0
+        super().__init__(path, clock=lambda: self.now, sleep_clock=lambda: self.slept)
+
+    def read(self):
+        return {"time": self.now, "slept": self.slept, "rapl": {"package-0": (self.rapl_uj, 10 ** 12)},
+                "battery": None}
+
+    def step(self, seconds, watts, slept=0):
+        self.now += seconds
+        self.slept += slept
+        self.rapl_uj += int((seconds - slept) * watts * 1e6)
+        return self.sample()
+
+
+class SavingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.sampler = FakeSampler(os.path.join(self.tmp.name, "energy.json"))
+        self.sampler.sample()
+        self.day = datetime.date.fromtimestamp(self.sampler.now)
+
+    def savings(self, **kwargs):
+        return em.savings(self.sampler.days, self.day, self.day + datetime.timedelta(days=1), **kwargs)
+
+    def test_rapl_sleep_not_measured(self):
+        self.sampler.step(3600, 20)
+        self.sampler.step(7200, 20, slept=3600)
+        report = self.savings()
+        self.assertEqual(report["awake_watts"], 20)
+        self.assertIsNone(report["asleep_watts"])
+        self.assertIsNone(report["saved_kwh"])
+        self.assertEqual(report["unmeasured_hours"], 1)
+        self.assertIsNone(report["estimated_kwh"])
+        self.assertAlmostEqual(self.savings(asleep_estimate=2)["estimated_kwh"], 0.018)
+
+    def test_measured_sleep(self):
+        days = {self.day.isoformat(): [72000.0, 3600.0, 3600.0, 3600.0]}  # старый формат без 5-го поля
+        report = em.savings(days, self.day, self.day + datetime.timedelta(days=1))
+        self.assertEqual(report["asleep_watts"], 1)
+        self.assertAlmostEqual(report["saved_kwh"], 0.019)
+        self.assertEqual(report["estimated_kwh"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
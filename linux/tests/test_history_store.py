@@ -0,0 +1,22 @@
+import datetime
+import unittest
+
+import history_store as hs
+
+
+class ComplianceTest(unittest.TestCase):
+
+    def test_manual_and_thermal_not_counted(self):
+        store = hs.HistoryStore(":memory:")
+        store.record(hs.SCHEDULED, "Сон", "Пн")
+        store.record(hs.FIRED, "Сон", "Пн")
+        store.record(hs.SCHEDULED, "Сон", "Вт")
+        store.record(hs.FIRED, "Сон", hs.MANUAL)
+        store.record(hs.FIRED, "Гибернация", hs.THERMAL)
+        now = datetime.datetime.now()
+        report = store.weekday_compliance(now - datetime.timedelta(days=1), now + datetime.timedelta(days=1))
+        self.assertEqual(report[now.weekday()], (1, 2, 0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
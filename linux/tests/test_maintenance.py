@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+import maintenance
+
+
+def sleeper(seconds):
+    return [sys.executable, "-c", f"import time; time.sleep({seconds})"]
+
+
+class PackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.estimates = {"a": 50, "b": 40, "c": 30, "d": 20}
+        self.jobs = [{"name": n, "class": "x", "priority": 0} for n in self.estimates]
+
+    def test_long_first_short_fill(self):
+        planned, deferred = maintenance.pack(self.jobs, self.estimates,
+                                             {"max_parallel": 2, "classes": {"x": 2}}, 70)
+        self.assertEqual([j["name"] for j, _, _ in planned], ["a", "b", "c", "d"])
+        self.assertEqual(deferred, [])
+
+    def test_single_slot_defers_overflow(self):
+        _, deferred = maintenance.pack(self.jobs, self.estimates, {"max_parallel": 2, "classes": {}}, 110)
+        self.assertEqual([j["name"] for j in deferred], ["c"])
+
+
+class RunnerTest(unittest.TestCase):
+    """Параллельность классов, перенос и остановка на сроке на коротких заданиях"""
+
+    def test_run(self):
+        config = maintenance.load_config({"max_parallel": 2, "classes": {"cpu": 2}, "jobs": [
+            {"name": "net", "command": sleeper(0.6), "class": "network", "estimate": 1},
+            {"name": "cpu-1", "command": sleeper(0.3), "class": "cpu", "estimate": 1},
+            {"name": "cpu-2", "command": sleeper(0.3), "class": "cpu", "estimate": 1},
+            {"name": "io", "command": sleeper(0.3), "class": "io", "estimate": 1},
+            {"name": "big", "command": sleeper(10), "class": "io", "estimate": 3600},
+            {"name": "hang", "command": sleeper(30), "class": "hang", "estimate": 1, "timeout": 1},
+        ]})
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(maintenance, "POLL_INTERVAL", 0.05), \
+                mock.patch.object(maintenance, "KILL_GRACE", 1):
+            stats = maintenance.DurationStats(os.path.join(directory, "stats.json"))
+            runner = maintenance.MaintenanceRunner(config, stats, log=lambda message: None)
+            started = time.monotonic()
+            results = {r["name"]: r for r in
+                       runner.run(datetime.datetime.now() + datetime.timedelta(seconds=5))}
+            elapsed = time.monotonic() - started
+            for name in ("net", "cpu-1", "cpu-2", "io"):
+                self.assertEqual(results[name]["status"], "ok", name)
+            self.assertEqual(results["big"]["status"], "deferred")
+            self.assertEqual(results["hang"]["status"], "killed")
+            self.assertLess(elapsed, 2.5)  # разные классы - одновременно
+            self.assertEqual(stats.report()["net"]["samples"], 1)
+            self.assertNotIn("hang", stats.report())
+            for _ in range(3):
+                stats.add("net", 100)
+            self.assertEqual(stats.estimate(config["jobs"][0]), 100)
+
+
+class PlanCyclesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = maintenance.load_config({"jobs": [{"name": "net", "command": ["true"]}]})
+        self.start = datetime.datetime(2024, 1, 1, 22, 0)
+
+    def events(self, action):
+        return [{"time": self.start, "kind": "off", "action": action, "users": ["u"]},
+                {"time": self.start + datetime.timedelta(hours=9), "kind": "on", "action": None,
+                 "users": ["u"]}]
+
+    def test_cycle_after_delay_until_on(self):
+        cycles = maintenance.plan_cycles(self.events("Сон"), self.config)
+        self.assertEqual(len(cycles), 1)
+        self.assertEqual(cycles[0]["time"], self.start + datetime.timedelta(hours=1))
+        self.assertEqual(cycles[0]["deadline"], self.start + datetime.timedelta(hours=8, minutes=30))
+
+    def test_no_cycle_after_reboot(self):
+        self.assertEqual(maintenance.plan_cycles(self.events("Перезагрузка"), self.config), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
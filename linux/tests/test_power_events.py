@@ -0,0 +1,53 @@
+import time
+import unittest
+
+import power_events as pe
+
+
+class PowerRulesTest(unittest.TestCase):
+    """Правила на синтетических событиях: заряд, отключение сети с отменой, крышка, простой"""
+
+    def setUp(self):
+        self.executed = []
+        rules = pe.PowerRules(pe.load_rules([
+            {"on": "battery_below", "percent": 5, "action": "Гибернация"},
+            {"on": "ac_unplugged", "delay": 0.3, "action": "Сон"},
+            {"on": "lid_closed", "action": "Сон"},
+            {"on": "user_idle", "minutes": 0.005, "action": "Гибернация"},
+        ]), lambda action, reason: self.executed.append(action))
+        self.source = pe.PowerEventSource(rules.handle, root="/nonexistent", netlink=False, lid=False)
+        self.source.state.update({"ac_online": True, "battery": 50, "battery_status": "Charging"})
+        self.source.start()
+        self.addCleanup(self.source.stop)
+
+    def inject(self, events, wait=0.6):
+        for event in events:
+            self.source.inject(event)
+        time.sleep(wait)
+        return self.executed
+
+    def test_ac_replugged_cancels(self):
+        self.assertEqual(self.inject([{"type": "ac", "online": False}, {"type": "ac", "online": True}]), [])
+
+    def test_battery_on_ac_ignored(self):
+        self.assertEqual(self.inject([{"type": "battery", "capacity": 5, "status": "Charging"}], 0.2), [])
+
+    def test_battery_low_once(self):
+        executed = self.inject([{"type": "ac", "online": False},
+                                {"type": "battery", "capacity": 5, "status": "Discharging"},
+                                {"type": "battery", "capacity": 4, "status": "Discharging"}])
+        self.assertEqual(sorted(executed), ["Гибернация", "Сон"])
+
+    def test_lid(self):
+        self.assertEqual(self.inject([{"type": "lid", "closed": True}], 0.2), ["Сон"])
+
+    def test_idle(self):
+        # Простой прервали раньше срока - ничего; простой идет час - сразу
+        self.assertEqual(self.inject([{"type": "idle", "idle": True, "since": time.time()},
+                                      {"type": "idle", "idle": False}]), [])
+        self.assertEqual(self.inject([{"type": "idle", "idle": True, "since": time.time() - 3600}], 0.2),
+                         ["Гибернация"])
+
+
+if __name__ == "__main__":
+    unittest.main()
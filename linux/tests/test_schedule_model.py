@@ -0,0 +1,46 @@
+import time
+import datetime
+import unittest
+
+import schedule_model as model
+
+
+class NextFiresTest(unittest.TestCase):
+    """Поиск срабатываний на таблице по умолчанию (без on_time)"""
+
+    def setUp(self):
+        self.now = datetime.datetime(2024, 1, 1, 12, 0)
+        self.schedule = model.default_config()["schedule"]
+
+    def test_no_on_time_bounded_to_week(self):
+        started = time.monotonic()
+        self.assertIsNone(model.next_on_time(self.schedule, self.now))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_default_offs(self):
+        self.assertEqual([f[2] for f in model.next_week_fires(self.schedule, self.now, 3)], ["off"] * 3)
+
+    def test_on_time(self):
+        self.schedule["Ср"]["on_time"] = "07:30"
+        self.assertEqual(model.next_on_time(self.schedule, self.now), datetime.datetime(2024, 1, 3, 7, 30))
+        self.assertEqual(model.next_on_time(self.schedule, datetime.datetime(2024, 1, 3, 8, 0)),
+                         datetime.datetime(2024, 1, 10, 7, 30))
+
+    def test_invalid_time_skipped(self):
+        self.schedule["Пт"]["off_time"] = "23.00"
+        fires = model.next_week_fires(self.schedule, self.now, 10)
+        self.assertEqual(len(fires), 10)
+        self.assertNotIn("Пт", [f[1] for f in fires])
+
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_leading_zeros(self):
+        self.assertEqual(model.normalize_hhmm("7:5"), "07:05")
+        self.assertIsNone(model.normalize_hhmm(" "))
+        with self.assertRaises(ValueError):
+            model.normalize_hhmm("25:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
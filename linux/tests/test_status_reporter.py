@@ -0,0 +1,77 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+import status_reporter as sr
+
+EVENTS = 200
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+class StatusReporterTest(unittest.TestCase):
+    """Пакеты и очередь при недоступном сборщике и перед сном на тестовом сборщике"""
+
+    def setUp(self):
+        for name, value in (("RESUME_DELAY", 0.2), ("BACKOFF_MIN", 0.2)):
+            patcher = mock.patch.object(sr, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.collector = sr.FakeCollector().start()
+        self.addCleanup(self.collector.stop)
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool_dir.cleanup)
+        self.reporter = sr.StatusReporter(self.collector.url, self.spool_dir.name,
+                                          status=lambda: {"next_fire": "test"},
+                                          log=lambda message: None, batch_size=EVENTS // 4, batch_delay=0.3)
+        self.reporter.start()
+        self.addCleanup(self.reporter.stop)
+
+    def test_batches(self):
+        for i in range(EVENTS):
+            self.reporter.report("action_done", action="Сон", n=i)
+        self.assertTrue(wait_for(lambda: len(self.collector.events()) == EVENTS, 5))
+        self.assertLessEqual(len(self.collector.batches), 5)
+        status = self.collector.batches[-1]["status"]
+        self.assertEqual(status["next_fire"], "test")
+        self.assertEqual(status["last_action"]["n"], EVENTS - 1)
+
+    def test_spool_when_down_and_before_sleep(self):
+        self.collector.down = True
+        self.reporter.report("action_failed", action="Сон", error="нет сети")
+        self.assertTrue(wait_for(lambda: len(self.reporter.spool.files()) == 1, 3))
+        self.reporter.suspend()
+        self.reporter.report("action_started", action="Гибернация")
+        self.reporter.suspend()
+        self.assertEqual(len(self.reporter.spool.files()), 2)
+        # После пробуждения очередь отправляется по порядку
+        self.collector.down = False
+        now = time.time()
+        self.reporter.resume(now - 3600, now)
+        self.assertTrue(wait_for(lambda: [e["type"] for e in self.collector.events()] ==
+                                 ["action_failed", "action_started", "resumed"], 5))
+        self.assertEqual(self.reporter.spool.files(), [])
+
+
+class SpoolTest(unittest.TestCase):
+
+    def test_size_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spool = sr.Spool(os.path.join(directory, "small"), limit=2000)
+            for _ in range(20):
+                spool.put(os.urandom(300))
+            self.assertLessEqual(spool.size(), 2000)
+            self.assertEqual(spool.dropped, 14)
+
+
+if __name__ == "__main__":
+    unittest.main()
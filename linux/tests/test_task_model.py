@@ -0,0 +1,50 @@
+import unittest
+
+import task_model as tm
+
+
+def usb_tasks(*items):
+    return tm.from_task_list([{"id": task_id, "action": action, "time": hhmm, "repeat": repeat}
+                              for task_id, action, hhmm, repeat in items])
+
+
+class ToWeekTest(unittest.TestCase):
+
+    def test_week_roundtrip(self):
+        week = {
+            "Пн": {"enabled": True, "on_time": "07:00", "off_time": None, "action": "Гибернация"},
+            "Вт": {"enabled": False, "on_time": None, "off_time": "22:00", "action": "Сон"},
+        }
+        self.assertEqual(tm.to_week(tm.from_week(week)), week)
+
+    def test_task_expanded_to_every_day(self):
+        week = tm.to_week(usb_tasks(("a", "Сон", "22:30", "Ежедневно")))
+        self.assertEqual(list(week), ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"])
+        self.assertEqual(week["Ср"], {"enabled": True, "on_time": None, "off_time": "22:30", "action": "Сон"})
+
+    def test_weekend_and_weekdays_together(self):
+        week = tm.to_week(usb_tasks(("a", "Сон", "22:30", "По будням"), ("b", "Выключить", "23:30", "По выходным")))
+        self.assertEqual(week["Пт"]["action"], "Сон")
+        self.assertEqual(week["Сб"]["off_time"], "23:30")
+        self.assertEqual(week["Вс"]["action"], "Выключить")
+
+    def test_collision_raises(self):
+        with self.assertRaises(ValueError):
+            tm.to_week(usb_tasks(("a", "Сон", "22:30", "Ежедневно"), ("b", "Выключить", "23:30", "По будням")))
+
+    def test_one_shot_raises(self):
+        with self.assertRaises(ValueError):
+            tm.to_week(usb_tasks(("c", "Сон", "22:30", "Один раз")))
+
+
+class TaskTableTest(unittest.TestCase):
+
+    def test_due(self):
+        table = tm.TaskTable(usb_tasks(("a", "Сон", "22:30", "По будням"), ("b", "Сон", "22:30", "Один раз")))
+        self.assertEqual(table.due(22 * 60 + 30, 2), [0, 1])
+        self.assertEqual(table.due(22 * 60 + 30, 6), [1])
+        self.assertEqual(tm.dump(table, "tasks", {})["schedules"][0]["repeat"], "По будням")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import time
+import tempfile
+import unittest
+
+import thermal_watch as tw
+
+
+class ThermalWatchTest(unittest.TestCase):
+    """Правила на поддельном дереве hwmon: ожидание, гистерезис, профиль, частота опроса"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.paths = tw.make_fake_hwmon(self.root, {"coretemp/Package id 0": 50, "coretemp/Core 0": 48,
+                                                    "nvme/Composite": 40, "thermal/x86_pkg_temp": 50})
+        self.executed, self.profiles, self.events = [], [], []
+        self.now = 0.0
+        rules = tw.load_rules([
+            {"sensor": "coretemp/*", "above": 85, "clear": 75, "for": 10, "action": "cpu:powersave"},
+            {"sensor": "thermal/*", "above": 95, "action": "Гибернация"},
+        ], profiles={"powersave": {}})
+        self.watch = tw.ThermalWatch(rules, lambda action, reason: self.executed.append(action),
+                                     set_profile=self.profiles.append, root=self.root,
+                                     on_event=lambda e: self.events.append(e["event"]),
+                                     clock=lambda: self.now)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def set_temp(self, name, value, moment=None):
+        if moment is not None:
+            self.now = moment
+        tw.set_fake_temp(self.paths[name], value)
+        return self.watch.sample()
+
+    def test_sensors_found(self):
+        self.assertEqual(sorted(tw.sensors(self.root)), sorted(self.paths))
+
+    def test_poll_interval(self):
+        self.watch.sample()
+        self.assertEqual(self.watch.interval, tw.SLOW_INTERVAL)
+        self.set_temp("coretemp/Core 0", 82)
+        self.assertEqual(self.watch.interval, 3 * tw.SECONDS_PER_DEGREE)
+
+    def test_trip_hysteresis_and_clear(self):
+        self.watch.sample()
+        self.set_temp("coretemp/Core 0", 86)
+        self.set_temp("coretemp/Core 0", 84, moment=5)
+        # Кратковременный всплеск не срабатывает
+        self.assertEqual(self.profiles, [])
+        self.assertEqual(self.events, ["above"])
+        for moment in (6, 12, 17):
+            self.set_temp("coretemp/Core 0", 87, moment=moment)
+        self.assertEqual(self.profiles, ["powersave"])
+        self.assertEqual(self.events, ["above", "above", "tripped"])
+        # Выше clear профиль остается, ниже - исходный
+        self.set_temp("coretemp/Core 0", 80)
+        self.assertEqual(self.profiles, ["powersave"])
+        self.set_temp("coretemp/Core 0", 74)
+        self.assertEqual(self.profiles, ["powersave", None])
+        self.assertEqual(self.events[-1], "cleared")
+        self.assertEqual(len(self.watch.status()["events"]), len(self.events))
+
+    def test_power_action_once(self):
+        self.watch.sample()
+        self.set_temp("thermal/x86_pkg_temp", 97)
+        self.set_temp("thermal/x86_pkg_temp", 96)
+        time.sleep(0.1)  # действие выполняется в отдельном потоке
+        self.assertEqual(self.executed, ["Гибернация"])
+
+    def test_missing_sensor_skipped(self):
+        os.unlink(self.paths["nvme/Composite"])
+        self.assertNotIn("nvme/Composite", self.watch.sample())
+
+
+class LoadRulesTest(unittest.TestCase):
+
+    def test_cpu_profile_needs_service(self):
+        with self.assertRaises(ValueError):
+            tw.load_rules([{"above": 90, "action": "cpu:powersave"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
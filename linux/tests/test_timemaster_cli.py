@@ -0,0 +1,64 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import timemaster_cli as cli
+
+
+class CliTest(unittest.TestCase):
+    """Команды на файле config.json без запущенного экземпляра"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.config = os.path.join(self.tmp.name, "config.json")
+
+    def run_cli(self, *argv):
+        with redirect_stdout(io.StringIO()) as output:
+            code = cli.main(["--config", self.config, "--offline", *argv])
+        return code, output.getvalue()
+
+    def schedule(self):
+        with open(self.config, encoding="utf-8") as f:
+            return json.load(f)["schedule"]
+
+    def test_set_normalizes_times(self):
+        # GUI сравнивает время строкой с now.strftime("%H:%M")
+        code, _ = self.run_cli("set", "--days", "Mon-Fri", "--on", "7:5", "--off", "23:0")
+        self.assertEqual(code, 0)
+        schedule = self.schedule()
+        for day in ("Пн", "Пт"):
+            self.assertEqual((schedule[day]["on_time"], schedule[day]["off_time"]), ("07:05", "23:00"))
+
+    def test_import_csv_normalizes_times(self):
+        path = os.path.join(self.tmp.name, "week.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("day,enabled,on_time,off_time,action\nMon,true,8:7,22:3,suspend\n")
+        code, _ = self.run_cli("import", path)
+        self.assertEqual(code, 0)
+        self.assertEqual(self.schedule()["Пн"],
+                         {"enabled": True, "on_time": "08:07", "off_time": "22:03", "action": "Сон"})
+
+    def test_set_rejects_bad_time(self):
+        code, _ = self.run_cli("set", "--days", "Mon", "--off", "25:00")
+        self.assertEqual(code, 1)
+
+
+class EnergyTest(unittest.TestCase):
+
+    def test_unmeasured_sleep_reported_unknown(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "energy.json")
+            with open(path, "w") as f:
+                json.dump({}, f)
+            with redirect_stdout(io.StringIO()) as output:
+                code = cli.main(["--offline", "energy", "--file", path, "--weeks", "1"])
+        self.assertEqual(code, 0)
+        self.assertIn("неизвестно", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
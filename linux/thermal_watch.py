@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""Защита от перегрева: датчики hwmon и thermal_zone, действия с гистерезисом
+
+Датчики читаются из sysfs: /sys/class/hwmon/hwmonN/tempM_input (имя датчика
+"микросхема/метка", например "coretemp/Package id 0") и
+/sys/class/thermal/thermal_zoneN/temp ("thermal/тип зоны", например
+"thermal/x86_pkg_temp"); значения - в тысячных долях градуса. Частота
+опроса зависит от запаса до порогов: вдали от них - раз в SLOW_INTERVAL
+секунд, у самого порога и пока ждем подтверждения - раз в FAST_INTERVAL.
+
+Правила (раздел "thermal_rules" политики службы или settings GUI):
+    {"sensor": "coretemp/*", "above": 90, "clear": 80, "for": 30, "action": "cpu:powersave"}
+    {"sensor": "thermal/*", "above": 98, "action": "Гибернация"}
+sensor - шаблон имени (fnmatch), берется самый горячий из подходящих;
+действие выполняется, если температура держится не ниже above в течение
+for секунд, и повторно - только после остывания до clear (по умолчанию
+above - 5). "cpu:профиль" - профиль процессора из cpu_profiles (только в
+службе) действует, пока датчик не остынет; действия питания выполняются
+тем же путем, что и остальные действия (правила питания службы,
+execute_action в GUI). Переходы (above, tripped, cleared) попадают в
+журнал событий.
+
+Примеры:
+    python3 thermal_watch.py show
+    python3 thermal_watch.py monitor --rule 'coretemp/*:85:75:Сон'
+    python3 thermal_watch.py selftest
+"""
+import os
+import sys
+import glob
+import time
+import fnmatch
+import argparse
+import datetime
+import threading
+import collections
+
+import schedule_model as model
+
+HWMON_DIR = "sys/class/hwmon"
+THERMAL_DIR = "sys/class/thermal"
+CPU_PREFIX = "cpu:"
+# Опрос: секунд на градус запаса до порога, в пределах [FAST, SLOW]
+FAST_INTERVAL = 2.0
+SLOW_INTERVAL = 60.0
+SECONDS_PER_DEGREE = 3.0
+DEFAULT_HYSTERESIS = 5.0
+EVENT_LOG_SIZE = 200
+
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def sensors(root="/"):
+    """Датчики температуры: {имя: путь к файлу значения}"""
+    found = {}
+
+    def add(name, path):
+        unique, number = name, 2
+        while unique in found:
+            unique, number = f"{name}#{number}", number + 1
+        found[unique] = path
+
+    chips = glob.glob(os.path.join(root, HWMON_DIR, "hwmon*"))
+    for chip in sorted(chips, key=lambda p: int(p.rsplit("hwmon", 1)[1] or 0)):
+        chip_name = _read_text(os.path.join(chip, "name")) or os.path.basename(chip)
+        inputs = glob.glob(os.path.join(chip, "temp*_input"))
+        for path in sorted(inputs, key=lambda p: int(os.path.basename(p)[4:-6] or 0)):
+            channel = os.path.basename(path)[:-len("_input")]
+            label = _read_text(os.path.join(chip, f"{channel}_label")) or channel
+            add(f"{chip_name}/{label}", path)
+    zones = glob.glob(os.path.join(root, THERMAL_DIR, "thermal_zone*"))
+    for zone in sorted(zones, key=lambda p: int(p.rsplit("thermal_zone", 1)[1] or 0)):
+        kind = _read_text(os.path.join(zone, "type")) or os.path.basename(zone)
+        add(f"thermal/{kind}", os.path.join(zone, "temp"))
+    return found
+
+
+def read_temps(paths):
+    """Текущие температуры, °C; датчики с ошибкой чтения пропускаются"""
+    temps = {}
+    for name, path in paths.items():
+        value = _read_text(path)
+        try:
+            temps[name] = int(value) / 1000.0
+        except (TypeError, ValueError):
+            continue
+    return temps
+
+
+def load_rules(items, profiles=None):
+    """Проверка правил, ValueError при ошибке; profiles - профили процессора службы"""
+    rules = []
+    for item in items or []:
+        try:
+            above = float(item["above"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"В правиле перегрева нужен порог above: {item}")
+        rule = {
+            "sensor": str(item.get("sensor", "*")),
+            "above": above,
+            "clear": float(item.get("clear", above - DEFAULT_HYSTERESIS)),
+            "for": float(item.get("for", 0)),
+            "action": item.get("action"),
+            "profile": None,
+        }
+        if rule["clear"] >= above or rule["for"] < 0:
+            raise ValueError(f"Правило перегрева {rule['sensor']}: нужно clear < above и for >= 0")
+        if str(rule["action"]).startswith(CPU_PREFIX):
+            if profiles is None:
+                raise ValueError("Профили процессора в правилах перегрева доступны только в службе")
+            rule["profile"] = rule["action"][len(CPU_PREFIX):]
+            if rule["profile"] not in profiles:
+                raise ValueError(f"Неизвестный профиль процессора: {rule['profile']}")
+        else:
+            rule["action"] = model.action_name(rule["action"])
+        rules.append(rule)
+    return rules
+
+
+def describe_rule(rule):
+    return f"{rule['sensor']} не ниже {rule['above']:g}°C"
+
+
+class ThermalWatch:
+    """Поток опроса датчиков; execute(действие, причина), set_profile(профиль или None)"""
+
+    def __init__(self, rules, execute, set_profile=None, root="/", on_event=None,
+                 clock=time.monotonic):
+        self.execute = execute
+        self.set_profile = set_profile
+        self.root = root
+        self.on_event = on_event
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.paths = sensors(root)
+        self.readings = {}
+        self.interval = SLOW_INTERVAL
+        self.events = collections.deque(maxlen=EVENT_LOG_SIZE)
+        self.profile = None
+        self._reset(rules)
+
+    def _reset(self, rules):
+        self.rules = rules
+        # Состояние правила: normal -> pending (ждем for) -> tripped (до остывания до clear)
+        self.states = [{"state": "normal", "since": None, "value": None, "sensor": None}
+                       for _ in rules]
+
+    def start(self):
+        if not self.paths:
+            log("Датчики температуры не найдены")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            self._apply_profile(None)
+
+    def update(self, rules):
+        """Новые правила: состояние сбрасывается, профиль перегрева снимается"""
+        with self.lock:
+            self._reset(rules)
+            self._apply_profile(None)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                log(f"Ошибка опроса датчиков: {e}")
+            self.stop_event.wait(self.interval)
+
+    def sample(self):
+        """Один опрос: переходы правил и интервал до следующего опроса"""
+        temps = read_temps(self.paths)
+        now = self.clock()
+        with self.lock:
+            self.readings = temps
+            margins = []
+            for rule, state in zip(self.rules, self.states):
+                matched = {name: t for name, t in temps.items() if fnmatch.fnmatchcase(name, rule["sensor"])}
+                if not matched:
+                    continue
+                sensor = max(matched, key=matched.get)
+                value = matched[sensor]
+                state["value"], state["sensor"] = value, sensor
+                if state["state"] == "normal" and value >= rule["above"]:
+                    state["state"], state["since"] = "pending", now
+                    self._event("above", rule, state)
+                if state["state"] == "pending":
+                    if value < rule["above"]:
+                        state["state"], state["since"] = "normal", None
+                    elif now - state["since"] >= rule["for"]:
+                        state["state"] = "tripped"
+                        self._trip(rule, state)
+                elif state["state"] == "tripped" and value <= rule["clear"]:
+                    state["state"], state["since"] = "normal", None
+                    self._event("cleared", rule, state)
+                    self._refresh_profile()
+                if state["state"] == "pending":
+                    margins.append(0.0)
+                elif state["state"] == "tripped":
+                    margins.append(value - rule["clear"])
+                else:
+                    margins.append(rule["above"] - value)
+            self.interval = self._interval(margins)
+        return temps
+
+    def _interval(self, margins):
+        if not margins:
+            return SLOW_INTERVAL
+        return max(FAST_INTERVAL, min(SLOW_INTERVAL, min(margins) * SECONDS_PER_DEGREE))
+
+    def _trip(self, rule, state):
+        self._event("tripped", rule, state)
+        if rule["profile"] is not None:
+            self._refresh_profile()
+            return
+        reason = f"перегрев: {state['sensor']} {state['value']:.0f}°C"
+        # Действие выполняется вне блокировки: уход в сон занимает время
+        threading.Thread(target=self.execute, args=[rule["action"], reason], daemon=True).start()
+
+    def _refresh_profile(self):
+        """Профиль последнего сработавшего правила процессора или исходный"""
+        active = [rule["profile"] for rule, state in zip(self.rules, self.states)
+                  if rule["profile"] is not None and state["state"] == "tripped"]
+        self._apply_profile(active[-1] if active else None)
+
+    def _apply_profile(self, profile):
+        if profile == self.profile or self.set_profile is None:
+            return
+        self.profile = profile
+        try:
+            self.set_profile(profile)
+        except Exception as e:
+            log(f"Ошибка профиля процессора при перегреве: {e}")
+
+    def _event(self, kind, rule, state):
+        event = {
+            "time": time.time(),
+            "event": kind,
+            "sensor": state["sensor"],
+            "temp": round(state["value"], 1),
+            "threshold": rule["clear"] if kind == "cleared" else rule["above"],
+            "action": rule["action"],
+        }
+        self.events.append(event)
+        if self.on_event is not None:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                log(f"Ошибка записи события перегрева: {e}")
+
+    def status(self):
+        with self.lock:
+            return {
+                "readings": dict(self.readings),
+                "interval": self.interval,
+                "profile": self.profile,
+                "rules": [{"sensor": rule["sensor"], "above": rule["above"], "clear": rule["clear"],
+                           "action": rule["action"], "state": state["state"], "value": state["value"]}
+                          for rule, state in zip(self.rules, self.states)],
+                "events": list(self.events),
+            }
+
+
+def make_fake_hwmon(root, temps):
+    """Дерево sysfs для проверки: {имя датчика: °C}; возвращает {имя: путь файла}"""
+    paths = {}
+    chips = {}
+    zones = 0
+    for name, value in temps.items():
+        chip, label = name.split("/", 1)
+        if chip == "thermal":
+            zone = os.path.join(root, THERMAL_DIR, f"thermal_zone{zones}")
+            zones += 1
+            os.makedirs(zone, exist_ok=True)
+            with open(os.path.join(zone, "type"), "w") as f:
+                f.write(label + "\n")
+            path = os.path.join(zone, "temp")
+        else:
+            if chip not in chips:
+                chips[chip] = [os.path.join(root, HWMON_DIR, f"hwmon{len(chips)}"), 0]
+                os.makedirs(chips[chip][0], exist_ok=True)
+                with open(os.path.join(chips[chip][0], "name"), "w") as f:
+                    f.write(chip + "\n")
+            directory, count = chips[chip]
+            chips[chip][1] = count + 1
+            with open(os.path.join(directory, f"temp{count + 1}_label"), "w") as f:
+                f.write(label + "\n")
+            path = os.path.join(directory, f"temp{count + 1}_input")
+        paths[name] = path
+        set_fake_temp(path, value)
+    return paths
+
+
+def set_fake_temp(path, value):
+    with open(path, "w") as f:
+        f.write(f"{int(value * 1000)}\n")
+
+
+def parse_rule_arg(text):
+    """Правило из командной строки: "шаблон:above:clear:действие" """
+    sensor, above, clear, action = text.rsplit(":", 3)
+    return {"sensor": sensor, "above": float(above), "clear": float(clear), "action": action}
+
+
+def cmd_show(args):
+    temps = read_temps(sensors(args.root))
+    if not temps:
+        print("Датчики температуры не найдены")
+    for name, value in sorted(temps.items()):
+        print(f"{name}: {value:.1f}°C")
+    return 0
+
+
+def cmd_monitor(args):
+    """Опрос с правилами без выполнения действий"""
+    rules = load_rules([parse_rule_arg(r) for r in args.rule], profiles={})
+
+    def execute(action, reason):
+        log(f"Действие (не выполняется): {action} - {reason}")
+
+    def on_event(event):
+        log(f"{event['event']}: {event['sensor']} {event['temp']}°C (порог {event['threshold']:g})")
+
+    watch = ThermalWatch(rules, execute, set_profile=lambda p: log(f"Профиль процессора: {p or 'исходный'}"),
+                         root=args.root, on_event=on_event)
+    try:
+        while True:
+            temps = watch.sample()
+            hottest = max(temps.values()) if temps else None
+            log(f"Максимум {hottest if hottest is None else f'{hottest:.1f}°C'}, "
+                f"следующий опрос через {watch.interval:.0f} с")
+            time.sleep(watch.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def cmd_selftest(args):
+    """Тесты модуля: tests/test_thermal_watch.py"""
+    import tests
+    return tests.run("thermal_watch")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Защита от перегрева по датчикам hwmon")
+    parser.add_argument("--root", default="/", help="корень sysfs (для поддельного дерева)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="текущие температуры").set_defaults(func=cmd_show)
+    monitor = commands.add_parser("monitor", help="опрос с правилами без выполнения действий")
+    monitor.add_argument("--rule", action="append", default=[],
+                         help="правило \"шаблон:above:clear:действие\"")
+    monitor.set_defaults(func=cmd_monitor)
+    commands.add_parser("selftest", help="проверка на поддельном дереве hwmon").set_defaults(func=cmd_selftest)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"thermal_watch: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Временная шкала ближайших 7 дней на одном холсте Tk
+
+Каждый день - строка, по горизонтали - время суток. Срабатывания
+показываются метками: выключение/сон (off) - в верхней половине строки,
+включение (on) - в нижней, отложенные действия (delayed) - на всю высоту.
+День или задача с неверным временем не ломает шкалу: вместо срабатываний
+в начале строки ставится серая метка invalid с текстом ошибки.
+Подпись события появляется при наведении - на холсте нет тысяч текстов.
+
+Timeline.set_events сравнивает новые события со старыми по ключу (вид,
+время, действие, ID) и создает/удаляет только изменившиеся элементы
+холста; остальные не трогаются. Полный пересчет координат - только при
+изменении размера холста и смене дня (строки сдвигаются).
+"""
+import datetime
+import itertools
+
+from schedule_model import DAYS_OF_WEEK_SHORT, week_fires, task_fires, parse_hhmm
+
+DAYS = 7
+LABEL_WIDTH = 80
+HEADER_HEIGHT = 20
+RIGHT_PAD = 10
+MARKER_WIDTH = 3
+HOUR_STEP = 3
+COLORS = {
+    "off": "#e74c3c",
+    "on": "#2ecc71",
+    "delayed": "#f39c12",
+    "invalid": "#95a5a6",
+}
+GRID_COLOR = "#7f8c8d"
+NOW_COLOR = "#3498db"
+KIND_TITLES = {
+    "off": "",
+    "on": "Включение",
+    "delayed": "Отложено: ",
+    "invalid": "Ошибка в расписании: ",
+}
+
+
+def week_events(schedule, now, days=DAYS):
+    """События недельной таблицы TimeMaster на days дней вперед"""
+    start = _day_start(now)
+    end = start + datetime.timedelta(days=days)
+    valid, events = {}, []
+    for day, entry in schedule.items():
+        try:
+            for field in ("off_time", "on_time"):
+                parse_hhmm(entry.get(field))
+        except (TypeError, ValueError):
+            if entry.get("enabled") and day in DAYS_OF_WEEK_SHORT:
+                # Метка в начале ближайшей строки этого дня недели
+                offset = (DAYS_OF_WEEK_SHORT.index(day) - start.weekday()) % 7
+                events.append({"time": start + datetime.timedelta(days=offset), "kind": "invalid",
+                               "action": f"{day}: время {entry.get(field)!r}", "id": day})
+            continue
+        valid[day] = entry
+    events += [{"time": moment, "kind": kind, "action": action or "", "id": day}
+               for moment, day, kind, action in itertools.takewhile(lambda f: f[0] < end, week_fires(valid, now))]
+    return events
+
+
+def task_events(tasks, pending, now, days=DAYS):
+    """События задач USB-версии и отложенных действий {ID: (таймер, действие, время)}"""
+    end = _day_start(now) + datetime.timedelta(days=days)
+    events = []
+    for task in tasks:
+        try:
+            fires = list(itertools.takewhile(lambda m: m < end, task_fires(task, now)))
+        except (KeyError, TypeError, ValueError):
+            events.append({"time": _day_start(now), "kind": "invalid",
+                           "action": f"{task.get('action')} {task.get('time')!r}", "id": task.get("id")})
+            continue
+        events += [{"time": moment, "kind": "off", "action": task["action"], "id": task["id"]}
+                   for moment in fires]
+    for action_id, (_, action, moment) in pending.items():
+        if now <= moment < end:
+            events.append({"time": moment, "kind": "delayed", "action": action, "id": action_id})
+    return events
+
+
+def event_key(event):
+    return event["kind"], event["time"].isoformat(), event["action"], event.get("id")
+
+
+def event_title(event):
+    if event["kind"] == "invalid":
+        return f"{KIND_TITLES['invalid']}{event['action']}"
+    return f"{event['time']:%d.%m %H:%M} — {KIND_TITLES[event['kind']]}{event['action']}"
+
+
+def _day_start(moment):
+    return datetime.datetime.combine(moment.date(), datetime.time())
+
+
+class Timeline:
+    """Шкала на холсте canvas (tk.Canvas или CTkCanvas)"""
+
+    def __init__(self, canvas, days=DAYS):
+        self.canvas = canvas
+        self.days = days
+        self.items = {}    # ключ события -> (событие, ID метки)
+        self.by_item = {}  # ID метки -> событие
+        self.start = None
+        self.now = None
+        self.size = (0, 0)
+        self.now_line = None
+        self.tooltip = None
+        self.tooltip_bg = None
+        canvas.bind("<Configure>", self._on_configure)
+        canvas.bind("<Motion>", self._on_motion)
+        canvas.bind("<Leave>", lambda _: self._hide_tooltip())
+
+    # Геометрия
+
+    def _row_height(self):
+        return max(12, (self.size[1] - HEADER_HEIGHT) / self.days)
+
+    def _x(self, moment):
+        width = max(1, self.size[0] - LABEL_WIDTH - RIGHT_PAD)
+        minutes = moment.hour * 60 + moment.minute + moment.second / 60
+        return LABEL_WIDTH + width * minutes / 1440
+
+    def _marker_coords(self, event):
+        row = (event["time"].date() - self.start.date()).days
+        top = HEADER_HEIGHT + row * self._row_height()
+        height = self._row_height()
+        x = self._x(event["time"])
+        if event["kind"] == "off":
+            y0, y1 = top + 2, top + height / 2
+        elif event["kind"] == "on":
+            y0, y1 = top + height / 2, top + height - 2
+        else:
+            y0, y1 = top + 2, top + height - 2
+        return x - MARKER_WIDTH / 2, y0, x + MARKER_WIDTH / 2, y1
+
+    # Обновление
+
+    def set_events(self, events, now=None):
+        """Новый список событий: (добавлено, удалено) элементов холста"""
+        now = now or datetime.datetime.now()
+        start = _day_start(now)
+        end = start + datetime.timedelta(days=self.days)
+        new = {event_key(e): e for e in events if start <= e["time"] < end}
+        removed = [key for key in self.items if key not in new]
+        for key in removed:
+            _, item = self.items.pop(key)
+            self.by_item.pop(item, None)
+            self.canvas.delete(item)
+        day_changed = start != self.start
+        self.start, self.now = start, now
+        added = 0
+        for key, event in new.items():
+            if key in self.items:
+                continue
+            item = self.canvas.create_rectangle(*self._marker_coords(event), width=0,
+                                                fill=COLORS[event["kind"]], tags=("event", event["kind"]))
+            self.items[key] = (event, item)
+            self.by_item[item] = event
+            added += 1
+        if day_changed:
+            self.relayout()
+        else:
+            self._place_now()
+        return added, len(removed)
+
+    def relayout(self):
+        """Сетка заново и координаты всех меток (размер холста или день изменились)"""
+        if self.start is None:
+            return
+        self.canvas.delete("grid")
+        width, height = self.size
+        row_height = self._row_height()
+        for row in range(self.days):
+            date = self.start + datetime.timedelta(days=row)
+            top = HEADER_HEIGHT + row * row_height
+            self.canvas.create_line(0, top, width, top, fill=GRID_COLOR, tags="grid")
+            self.canvas.create_text(6, top + row_height / 2, anchor="w", tags="grid", fill=GRID_COLOR,
+                                    text=f"{DAYS_OF_WEEK_SHORT[date.weekday()]} {date:%d.%m}")
+        for hour in range(0, 25, HOUR_STEP):
+            x = LABEL_WIDTH + (width - LABEL_WIDTH - RIGHT_PAD) * hour / 24
+            self.canvas.create_line(x, HEADER_HEIGHT, x, height, fill=GRID_COLOR, dash=(2, 4), tags="grid")
+            self.canvas.create_text(x, HEADER_HEIGHT / 2, text=f"{hour:02d}", fill=GRID_COLOR, tags="grid")
+        self.canvas.tag_lower("grid")
+        for event, item in self.items.values():
+            self.canvas.coords(item, *self._marker_coords(event))
+        self._place_now()
+
+    def _place_now(self):
+        if self.now is None:
+            return
+        top = HEADER_HEIGHT
+        x = self._x(self.now)
+        coords = (x, top, x, top + self._row_height())
+        if self.now_line is None:
+            self.now_line = self.canvas.create_line(*coords, fill=NOW_COLOR, width=2)
+        else:
+            self.canvas.coords(self.now_line, *coords)
+        self.canvas.tag_raise(self.now_line)
+
+    # События холста
+
+    def _on_configure(self, event):
+        size = (event.width, event.height)
+        if size != self.size:
+            self.size = size
+            self.relayout()
+
+    def _on_motion(self, event):
+        found = [item for item in self.canvas.find_overlapping(event.x - 3, event.y - 3, event.x + 3, event.y + 3)
+                 if item in self.by_item]
+        if not found:
+            self._hide_tooltip()
+            return
+        text = "\n".join(event_title(self.by_item[item]) for item in found[:5])
+        if len(found) > 5:
+            text += f"\n… еще {len(found) - 5}"
+        anchor = "ne" if event.x > self.size[0] / 2 else "nw"
+        if self.tooltip is None:
+            self.tooltip = self.canvas.create_text(event.x, event.y + 14, text=text, anchor=anchor,
+                                                   fill="white", font=("Arial", 10))
+            self.tooltip_bg = self.canvas.create_rectangle(self.canvas.bbox(self.tooltip), fill="#2c3e50", width=0)
+        else:
+            self.canvas.itemconfigure(self.tooltip, text=text, anchor=anchor)
+            self.canvas.coords(self.tooltip, event.x, event.y + 14)
+            self.canvas.coords(self.tooltip_bg, *self.canvas.bbox(self.tooltip))
+        self.canvas.tag_raise(self.tooltip_bg)
+        self.canvas.tag_raise(self.tooltip)
+
+    def _hide_tooltip(self):
+        if self.tooltip is not None:
+            self.canvas.delete(self.tooltip)
+            self.canvas.delete(self.tooltip_bg)
+            self.tooltip = None
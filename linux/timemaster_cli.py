@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""Командная строка TimeMaster для массовых операций с расписанием
+
+Если запущен экземпляр TimeMaster, изменения передаются ему через API
+управления (применяются сразу, без перезапуска). Иначе config.json
+редактируется атомарно. Модуль не импортирует Tk и PIL.
+
+Примеры:
+    timemaster show
+    timemaster set --days Mon-Fri --off 23:00 --action suspend
+    timemaster export --format csv -o lab.csv
+    timemaster import lab.csv
+    timemaster next -n 5
+    timemaster energy --weeks 4
+"""
+import os
+import io
+import sys
+import csv
+import json
+import argparse
+import datetime
+
+import schedule_model as model
+import energy_meter
+from control_client import ControlClient, ControlError
+
+CSV_FIELDS = ["day", "enabled", "on_time", "off_time", "action"]
+ACTION_CSV_CODES = {action: code for code, action in model.ACTION_CODES.items()}
+
+
+class FileBackend:
+    """Работа с config.json напрямую (экземпляр TimeMaster не запущен)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.config = model.load_config(path)
+
+    def get_schedule(self):
+        return self.config["schedule"]
+
+    def update_days(self, days):
+        schedule = {**self.config["schedule"], **days}
+        errors = model.validate_schedule(schedule)
+        if errors:
+            raise ValueError("; ".join(errors))
+        self.config["schedule"] = schedule
+        model.save_config(self.config, self.path)
+        notify_daemon({day: schedule[day] for day in days})
+
+    def next_fires(self, count):
+        fires = model.next_week_fires(self.get_schedule(), datetime.datetime.now(), count)
+        return [fire_to_dict(fire) for fire in fires]
+
+
+class InstanceBackend:
+    """Работа через API управления запущенного TimeMaster"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_schedule(self):
+        return self.client.call("schedule.get")["schedule"]
+
+    def update_days(self, days):
+        self.client.call("schedule.update", days=days)
+
+    def next_fires(self, count):
+        return self.client.call("fires.next", count=count)["fires"]
+
+
+def notify_daemon(days):
+    """Сообщение системной службе (если она есть) об измененных днях {день: запись}"""
+    if not os.path.exists(model.DAEMON_SOCKET):
+        return
+    try:
+        with ControlClient(model.DAEMON_SOCKET, timeout=2) as client:
+            client.call("schedule.update", days=days)
+    except (OSError, ControlError) as e:
+        print(f"timemaster: системная служба не уведомлена: {e}", file=sys.stderr)
+
+
+def fire_to_dict(fire):
+    """Срабатывание недельной таблицы в виде словаря для JSON и вывода"""
+    moment, day, kind, action = fire
+    return {"time": moment.isoformat(), "day": day, "kind": kind, "action": action}
+
+
+def open_backend(args):
+    """Подключение к запущенному экземпляру или работа с файлом"""
+    if not args.offline and os.path.exists(args.socket):
+        try:
+            return InstanceBackend(ControlClient(args.socket))
+        except OSError:
+            pass  # сокет остался от завершившегося процесса
+    return FileBackend(args.config)
+
+
+def normalize_entry(entry):
+    """Приведение записи дня к формату конфигурации"""
+    result = {
+        "enabled": entry.get("enabled", False),
+        "on_time": entry.get("on_time") or None,
+        "off_time": entry.get("off_time") or None,
+        "action": model.action_name(entry.get("action") or "Сон", display=True),
+    }
+    if isinstance(result["enabled"], str):
+        result["enabled"] = result["enabled"].strip().lower() in ("1", "true", "yes", "да")
+    model.validate_day(result)
+    # "7:5" -> "07:05": GUI сравнивает время строкой с now.strftime("%H:%M")
+    for field in ("on_time", "off_time"):
+        result[field] = model.normalize_hhmm(result[field])
+    return result
+
+
+def schedule_from_json(data):
+    """Недельная таблица из JSON: полный config.json или только таблица"""
+    table = data.get("schedule", data)
+    return {model.day_key(day): normalize_entry(entry) for day, entry in table.items()}
+
+
+def schedule_from_csv(text):
+    """Недельная таблица из CSV с колонками day,enabled,on_time,off_time,action"""
+    schedule = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        schedule[model.day_key(row["day"])] = normalize_entry(row)
+    return schedule
+
+
+def schedule_to_csv(schedule):
+    """CSV с англоязычными кодами дней и действий"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=CSV_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for index, day in enumerate(model.DAYS_OF_WEEK_SHORT):
+        entry = schedule.get(day)
+        if entry is None:
+            continue
+        writer.writerow({
+            "day": model.DAY_CODES[index],
+            "enabled": "true" if entry.get("enabled") else "false",
+            "on_time": entry.get("on_time") or "",
+            "off_time": entry.get("off_time") or "",
+            "action": ACTION_CSV_CODES.get(entry.get("action"), entry.get("action")),
+        })
+    return output.getvalue()
+
+
+def read_schedule_file(path, file_format=None):
+    """Чтение таблицы из JSON или CSV (формат по расширению, если не указан)"""
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "json"
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    if file_format == "csv":
+        return schedule_from_csv(text)
+    return schedule_from_json(json.loads(text))
+
+
+def changed_days(current, new):
+    """Только изменившиеся дни - их и отправляем в планировщик"""
+    return {day: entry for day, entry in new.items() if current.get(day) != entry}
+
+
+def cmd_show(backend, args):
+    schedule = backend.get_schedule()
+    print(f"{'День':<4} {'Вкл':<4} {'Включение':<10} {'Выключение':<11} Действие")
+    for day in model.DAYS_OF_WEEK_SHORT:
+        entry = schedule.get(day, {})
+        print(f"{day:<4} {'да' if entry.get('enabled') else 'нет':<4} "
+              f"{entry.get('on_time') or '-':<10} {entry.get('off_time') or '-':<11} "
+              f"{entry.get('action', '-')}")
+    return 0
+
+
+def cmd_export(backend, args):
+    schedule = backend.get_schedule()
+    if args.format == "csv":
+        text = schedule_to_csv(schedule)
+    else:
+        text = json.dumps({"schedule": schedule}, indent=4, ensure_ascii=False) + "\n"
+    if args.output and args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+def cmd_import(backend, args):
+    new = read_schedule_file(args.file, args.format)
+    days = changed_days(backend.get_schedule(), new)
+    if days:
+        backend.update_days(days)
+    print(f"Изменено дней: {len(days)}")
+    return 0
+
+
+def cmd_set(backend, args):
+    current = backend.get_schedule()
+    new = {}
+    for day in model.parse_days(args.days):
+        entry = dict(current.get(day) or model.default_config()["schedule"][day])
+        if args.on is not None:
+            entry["on_time"] = None if args.on.lower() in ("", "none", "-") else args.on
+        if args.off is not None:
+            entry["off_time"] = None if args.off.lower() in ("", "none", "-") else args.off
+        if args.action is not None:
+            entry["action"] = args.action
+        if args.enabled is not None:
+            entry["enabled"] = args.enabled
+        new[day] = normalize_entry(entry)
+    days = changed_days(current, new)
+    if days:
+        backend.update_days(days)
+    print(f"Изменено дней: {len(days)}")
+    return 0
+
+
+def cmd_validate(backend, args):
+    if args.file:
+        try:
+            read_schedule_file(args.file, args.format)
+            errors = []
+        except (KeyError, ValueError) as e:
+            errors = [str(e)]
+    else:
+        errors = model.validate_schedule(backend.get_schedule())
+    for error in errors:
+        print(f"Ошибка: {error}")
+    if not errors:
+        print("Расписание корректно")
+    return 1 if errors else 0
+
+
+def cmd_next(backend, args):
+    fires = backend.next_fires(args.count)
+    if args.json:
+        print(json.dumps(fires, indent=2, ensure_ascii=False))
+        return 0
+    for fire in fires:
+        moment = datetime.datetime.fromisoformat(fire["time"])
+        what = fire["action"] if fire["kind"] == "off" else "Включение"
+        print(f"{moment:%Y-%m-%d %H:%M} {fire['day']}  {what}")
+    if not fires:
+        print("Срабатываний нет")
+    return 0
+
+
+def cmd_energy(backend, args):
+    weeks = energy_meter.weekly_savings(energy_meter.load_days(args.file), args.weeks,
+                                        asleep_estimate=args.sleep_watts)
+    if args.json:
+        print(json.dumps([{"week_start": start.isoformat(), **report} for start, report in weeks],
+                         indent=2, ensure_ascii=False))
+        return 0
+    print(f"{'Неделя с':<11} {'Работа, Вт':>10} {'Сон, Вт':>8} {'Сон, ч':>7} "
+          f"{'Сэкономлено, кВт·ч':>19} {'Оценка, кВт·ч':>14}")
+    for start, report in weeks:
+        awake = "-" if report["awake_watts"] is None else f"{report['awake_watts']:.1f}"
+        asleep = "-" if report["asleep_watts"] is None else f"{report['asleep_watts']:.1f}"
+        saved = "неизвестно" if report["saved_kwh"] is None else f"{report['saved_kwh']:.2f}"
+        estimated = "-" if report["estimated_kwh"] is None else f"{report['estimated_kwh']:.2f}"
+        print(f"{start:%Y-%m-%d}  {awake:>10} {asleep:>8} {report['asleep_hours']:>7.1f} "
+              f"{saved:>19} {estimated:>14}")
+    print(f"Итого сэкономлено (измерено): "
+          f"{sum(r['saved_kwh'] or 0.0 for _, r in weeks):.2f} кВт·ч")
+    unmeasured = sum(r["unmeasured_hours"] for _, r in weeks)
+    if unmeasured:
+        if args.sleep_watts is None:
+            print(f"Сон без измерения: {unmeasured:.1f} ч, экономия неизвестна "
+                  f"(задайте --sleep-watts для оценки)")
+        else:
+            print(f"Оценка за {unmeasured:.1f} ч сна без измерения при {args.sleep_watts:g} Вт: "
+                  f"{sum(r['estimated_kwh'] or 0.0 for _, r in weeks):.2f} кВт·ч")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="timemaster", description="Управление расписанием TimeMaster")
+    parser.add_argument("--config", default=model.CONFIG_FILE, help="путь к config.json")
+    parser.add_argument("--socket", default=model.CONTROL_SOCKET, help="сокет запущенного TimeMaster")
+    parser.add_argument("--offline", action="store_true",
+                        help="не подключаться к запущенному экземпляру, править файл")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("show", help="показать расписание").set_defaults(func=cmd_show)
+
+    export = commands.add_parser("export", help="экспорт расписания в JSON/CSV")
+    export.add_argument("--format", choices=["json", "csv"], default="json")
+    export.add_argument("-o", "--output", help="файл (по умолчанию stdout)")
+    export.set_defaults(func=cmd_export)
+
+    imp = commands.add_parser("import", help="импорт расписания из JSON/CSV")
+    imp.add_argument("file", help="файл или '-' для stdin")
+    imp.add_argument("--format", choices=["json", "csv"])
+    imp.set_defaults(func=cmd_import)
+
+    edit = commands.add_parser("set", help="массовое изменение дней")
+    edit.add_argument("--days", required=True, help="дни: Mon-Fri, Sat,Sun, all")
+    edit.add_argument("--on", help="время включения ЧЧ:ММ или none")
+    edit.add_argument("--off", help="время выключения ЧЧ:ММ или none")
+    edit.add_argument("--action", help="suspend, hibernate, poweroff, reboot, auto, display-off, display-dim, display-blank")
+    state = edit.add_mutually_exclusive_group()
+    state.add_argument("--enable", dest="enabled", action="store_true", default=None)
+    state.add_argument("--disable", dest="enabled", action="store_false")
+    edit.set_defaults(func=cmd_set)
+
+    check = commands.add_parser("validate", help="проверка расписания или файла")
+    check.add_argument("file", nargs="?", help="файл JSON/CSV (по умолчанию текущее расписание)")
+    check.add_argument("--format", choices=["json", "csv"])
+    check.set_defaults(func=cmd_validate)
+
+    upcoming = commands.add_parser("next", help="ближайшие срабатывания")
+    upcoming.add_argument("-n", "--count", type=int, default=10)
+    upcoming.add_argument("--json", action="store_true", help="вывод в JSON")
+    upcoming.set_defaults(func=cmd_next)
+
+    energy = commands.add_parser("energy", help="сэкономленная сном энергия по неделям")
+    energy.add_argument("-w", "--weeks", type=int, default=4)
+    energy.add_argument("--file", default=energy_meter.ENERGY_FILE, help="файл суточных сумм")
+    energy.add_argument("--sleep-watts", type=float,
+                        help="оценка мощности сна (Вт) для сна, не покрытого счетчиками")
+    energy.add_argument("--json", action="store_true", help="вывод в JSON")
+    energy.set_defaults(func=cmd_energy)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        backend = open_backend(args)
+        return args.func(backend, args)
+    except (OSError, ValueError, KeyError, ControlError) as e:
+        print(f"timemaster: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,720 @@
+#!/usr/bin/env python3
+"""Системная служба TimeMaster для многопользовательских машин
+
+Одна привилегированная служба вместо GUI-планировщика в каждом сеансе:
+читает ~/.config/timemaster/config.json всех пользователей, объединяет их
+по политике администратора (/etc/timemaster/policy.json) и ведет одну
+кучу таймеров на всех. Пользовательские GUI и CLI работают без прав root
+и сообщают службе об изменениях через сокет /run/timemaster/daemon.sock.
+
+Пример политики:
+    {
+        "users": ["*"],
+        "groups": ["lab"],
+        "actions": ["Сон", "Гибернация"],
+        "windows": [{"days": "Mon-Fri", "from": "20:00", "to": "07:00"}],
+        "merge": "latest",
+        "stagger": {"window": 900, "slot": 30, "group": "lab", "cap": 20},
+        "power_rules": [{"on": "battery_below", "percent": 5, "action": "Гибернация"}],
+        "cpu_schedule": [{"profile": "powersave", "days": "all", "from": "22:00", "to": "07:00"}],
+        "maintenance": {"delay": 60, "margin": 30,
+                        "jobs": [{"name": "upgrade", "command": ["apt-get", "-y", "upgrade"]}]},
+        "thermal_rules": [{"sensor": "coretemp/*", "above": 90, "clear": 80, "for": 30,
+                           "action": "cpu:powersave"},
+                          {"sensor": "thermal/*", "above": 98, "action": "Гибернация"}]
+    }
+
+merge = "latest" - в каждый день выполняется только самое позднее выключение
+(никого не усыпляют раньше его собственного времени), включение - самое раннее;
+merge = "any" - выполняется выключение каждого пользователя.
+stagger - разнесение действий парка машин (см. stagger.py): выключение позже,
+включение раньше на постоянное для этой машины смещение в пределах окна.
+power_rules - действия по событиям питания (заряд, отключение сети, крышка,
+простой пользователя; см. power_events.py), события приходят от ядра и
+D-Bus без опроса. Простой - по IdleHint logind и по хранителям экрана,
+о которых GUI сеансов сообщают методом idle.report (см. idle_watch.py).
+cpu_schedule / cpu_profiles - профили процессора (регулятор, EPP, предел
+частоты, ядра) по окнам времени для машин, которые не усыпляются; вне окон
+возвращается исходное состояние (см. cpu_profiles.py).
+maintenance - обслуживание во время сна: через delay минут после выключения
+машина просыпается по RTC, выполняет задания (обновления, резервные копии)
+до срока за margin минут до включения и возвращается в тот же режим сна
+(см. maintenance.py).
+thermal_rules - защита от перегрева по датчикам hwmon/thermal_zone: профиль
+процессора, пока датчик не остынет, или действие питания тем же путем, что
+и power_rules; переходы записываются в журнал событий (см. thermal_watch.py).
+
+Будильник RTC ставится раньше включения на упреждение из wake_planner:
+p95 измеренного времени от будильника до готовности (запуск службы,
+пробуждение, отчет GUI о загруженном автозапуске через wake.ready).
+"""
+import os
+import sys
+import pwd
+import grp
+import json
+import heapq
+import signal
+import argparse
+import datetime
+import itertools
+import threading
+
+import schedule_model as model
+import power_actions
+import power_events
+import control_api
+import cpu_profiles
+import history_store
+import idle_watch
+import maintenance
+import sleep_planner
+import stagger
+import task_model
+import thermal_watch
+import wake_planner
+
+POLICY_FILE = "/etc/timemaster/policy.json"
+HISTORY_FILE = "/var/lib/timemaster/history.sqlite"
+USER_CONFIG = os.path.join(".config", "timemaster", "config.json")
+HORIZON_DAYS = 8
+RESCAN_INTERVAL = 60
+# Пропущенное выключение (например, машина спала) не догоняем позже этого срока
+MAX_LATENESS = datetime.timedelta(minutes=2)
+# Будильник RTC ближе этого срока к моменту ухода в сон может не успеть сработать
+MIN_WAKE_DELAY = datetime.timedelta(minutes=1)
+# Цикл обслуживания после загрузки по будильнику догоняем в пределах этого срока
+MAINTENANCE_LATENESS = datetime.timedelta(minutes=15)
+# После обслуживания ближе этого срока к включению машина больше не засыпает
+MIN_RESLEEP = datetime.timedelta(minutes=15)
+
+DEFAULT_POLICY = {
+    "users": ["*"],
+    "groups": [],
+    "actions": list(model.ACTIONS),
+    "windows": [],
+    "merge": "latest",
+    "min_uid": 1000,
+    "power_rules": [],
+    "cpu_profiles": {},
+    "cpu_schedule": [],
+    "maintenance": {},
+    "thermal_rules": [],
+}
+
+
+def log(message):
+    """Журнал службы (stdout попадает в journald)"""
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def load_policy(path=POLICY_FILE):
+    """Политика администратора с проверкой полей"""
+    policy = dict(DEFAULT_POLICY)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            policy.update(json.load(f))
+    if policy["merge"] not in ("latest", "any"):
+        raise ValueError(f"Неизвестный режим объединения: {policy['merge']}")
+    policy["actions"] = [model.action_name(a) for a in policy["actions"]]
+    # Логика плана - по кодам task_model, названия остаются в файле и журнале
+    policy["parsed_actions"] = task_model.action_codes(policy["actions"])
+    policy["parsed_windows"] = model.parse_windows(policy["windows"])
+    policy["stagger"] = stagger.load_config(policy.get("stagger"))
+    policy["parsed_power_rules"] = power_events.load_rules(policy["power_rules"])
+    policy["parsed_cpu_profiles"] = cpu_profiles.load_profiles(policy["cpu_profiles"])
+    policy["parsed_cpu_schedule"] = cpu_profiles.load_schedule(policy["cpu_schedule"],
+                                                               policy["parsed_cpu_profiles"])
+    policy["parsed_maintenance"] = maintenance.load_config(policy["maintenance"])
+    policy["parsed_thermal_rules"] = thermal_watch.load_rules(policy["thermal_rules"],
+                                                              policy["parsed_cpu_profiles"])
+    return policy
+
+
+def in_windows(policy, moment):
+    """Разрешено ли действие питания в момент moment по окнам политики"""
+    if not policy["parsed_windows"]:
+        return True
+    return model.in_windows(policy["parsed_windows"], moment)
+
+
+def user_allowed(policy, user):
+    """Может ли пользователь управлять питанием общей машины"""
+    if "*" in policy["users"] or user["name"] in policy["users"]:
+        return True
+    return bool(set(user["groups"]) & set(policy["groups"]))
+
+
+def read_user_schedule(user):
+    """Недельная таблица пользователя; файл открывается без перехода по ссылкам"""
+    fd = os.open(user["path"], os.O_RDONLY | os.O_NOFOLLOW)
+    with os.fdopen(fd, "r", encoding="utf-8") as f:
+        # Служба работает от root - читаем только файл, принадлежащий пользователю
+        if os.fstat(f.fileno()).st_uid != user["uid"]:
+            raise PermissionError(f"{user['path']} не принадлежит {user['name']}")
+        schedule = json.load(f).get("schedule", {})
+    valid = {}
+    for day in model.DAYS_OF_WEEK_SHORT:
+        try:
+            model.validate_day(schedule[day])
+            valid[day] = schedule[day]
+        except (KeyError, ValueError) as e:
+            log(f"{user['name']}: день {day} пропущен ({e})")
+    return valid
+
+
+def merge_plan(users, policy, now, days=HORIZON_DAYS, identity=None, weekdays=None):
+    """Объединенный план всех пользователей: события {time, kind, action, users, date}
+
+    С разнесением (policy["stagger"]) время событий сдвигается на смещение хоста identity.
+    weekdays - только дни недели из этого множества (0=пн) для частичного обновления.
+    """
+    events = []
+    for offset in range(days):
+        date = now.date() + datetime.timedelta(days=offset)
+        if weekdays is not None and date.weekday() not in weekdays:
+            continue
+        day = model.DAYS_OF_WEEK_SHORT[date.weekday()]
+        offs, ons = [], []
+        for user in users:
+            entry = user["schedule"].get(day)
+            if not entry or not entry.get("enabled") or not user_allowed(policy, user):
+                continue
+            off_clock = model.parse_hhmm(entry.get("off_time"))
+            # Действия с экраном выполняет GUI в сеансе пользователя
+            code = task_model.ACTION_BY_LABEL.get(entry.get("action"))
+            if off_clock and code in policy["parsed_actions"] and code not in task_model.SCREEN_ACTIONS:
+                moment = datetime.datetime.combine(date, datetime.time(*off_clock))
+                if in_windows(policy, moment):
+                    offs.append((moment, entry["action"], user["name"]))
+            on_clock = model.parse_hhmm(entry.get("on_time"))
+            if on_clock:
+                ons.append((datetime.datetime.combine(date, datetime.time(*on_clock)), user["name"]))
+
+        if offs and policy["merge"] == "latest":
+            latest = max(offs)
+            events.append({"time": latest[0], "kind": "off", "action": latest[1],
+                           "users": sorted({o[2] for o in offs}), "date": date})
+        else:
+            # Совпадающие по времени выключения одного дня - одно событие
+            for moment, group in itertools.groupby(sorted(offs), key=lambda o: o[0]):
+                group = list(group)
+                events.append({"time": moment, "kind": "off", "action": group[-1][1],
+                               "users": sorted({o[2] for o in group}), "date": date})
+        if ons:
+            earliest = min(ons)
+            events.append({"time": earliest[0], "kind": "on", "action": None,
+                           "users": sorted({o[1] for o in ons}), "date": date})
+    if policy["stagger"]["window"]:
+        identity = identity or stagger.host_identity()
+        for event in events:
+            event["time"] = stagger.shift(event["time"], event["kind"], identity, policy["stagger"])
+    return sorted((e for e in events if e["time"] > now), key=lambda e: e["time"])
+
+
+class ScheduleDaemon:
+    """Планировщик с одной кучей таймеров для всех пользователей"""
+
+    def __init__(self, policy_path=POLICY_FILE, socket_path=model.DAEMON_SOCKET,
+                 dry_run=False, rtc_path=power_actions.RTC_WAKEALARM, history=None, planner=None,
+                 maintenance_stats=maintenance.STATS_FILE):
+        self.policy_path = policy_path
+        self.socket_path = socket_path
+        self.dry_run = dry_run
+        self.rtc_path = rtc_path
+        self.history = history
+        self.planner = planner
+        self.policy = load_policy(policy_path)
+        self.users = {}  # имя -> запись пользователя с расписанием
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.running = True
+        self.last_scan = None
+        self.last_cycle = None
+        self.server = None
+        self.identity = stagger.host_identity()
+        self.power_rules = power_events.PowerRules(self.policy["parsed_power_rules"], self.power_action)
+        self.power_source = None
+        self.idle = idle_watch.IdleState()
+        self.cpu = cpu_profiles.ProfileScheduler(self.policy["parsed_cpu_schedule"],
+                                                 self.policy["parsed_cpu_profiles"],
+                                                 cpu_profiles.ProfileState(), dry_run=dry_run)
+        self.maintenance = maintenance.MaintenanceRunner(self.policy["parsed_maintenance"],
+                                                         maintenance.DurationStats(maintenance_stats),
+                                                         dry_run=dry_run, log=log)
+        self.thermal = thermal_watch.ThermalWatch(self.policy["parsed_thermal_rules"], self.thermal_action,
+                                                  set_profile=self.cpu.set_override,
+                                                  on_event=self.thermal_event)
+
+    def scan_users(self, only_uid=None):
+        """Перечитывание изменившихся файлов пользователей, True если что-то изменилось"""
+        changed = False
+        # При точечном пересканировании остальные пользователи не трогаются
+        seen = {name for name, u in self.users.items()
+                if only_uid is not None and u["uid"] != only_uid}
+        for entry in pwd.getpwall():
+            if entry.pw_uid < self.policy["min_uid"] or entry.pw_uid == 65534:
+                continue
+            if only_uid is not None and entry.pw_uid != only_uid:
+                continue
+            path = os.path.join(entry.pw_dir, USER_CONFIG)
+            try:
+                mtime = os.lstat(path).st_mtime
+            except OSError:
+                continue
+            seen.add(entry.pw_name)
+            known = self.users.get(entry.pw_name)
+            if known and known["mtime"] == mtime:
+                continue
+            user = {
+                "name": entry.pw_name,
+                "uid": entry.pw_uid,
+                "path": path,
+                "mtime": mtime,
+                "groups": [g.gr_name for g in grp.getgrall() if entry.pw_name in g.gr_mem]
+                          + [grp.getgrgid(entry.pw_gid).gr_name],
+            }
+            try:
+                user["schedule"] = read_user_schedule(user)
+            except (OSError, ValueError) as e:
+                log(f"{entry.pw_name}: расписание не прочитано ({e})")
+                continue
+            self.users[entry.pw_name] = user
+            changed = True
+            log(f"Загружено расписание пользователя {entry.pw_name}")
+        for name in set(self.users) - seen:
+            del self.users[name]
+            changed = True
+        self.last_scan = datetime.datetime.now()
+        return changed
+
+    def rebuild(self):
+        """Пересборка кучи таймеров по объединенному плану"""
+        now = datetime.datetime.now()
+        # План со вчерашнего дня: после выключения по расписанию служба стартует
+        # уже на загрузке по будильнику обслуживания, когда само выключение в прошлом
+        since = now - datetime.timedelta(days=1)
+        events = merge_plan(list(self.users.values()), self.policy, since,
+                            days=HORIZON_DAYS + 1, identity=self.identity)
+        self._load_heap(events, now, since)
+
+    def update_days(self, name, days):
+        """Замена дней недели одного пользователя: пересчитываются только эти дни"""
+        now = datetime.datetime.now()
+        since = now - datetime.timedelta(days=1)
+        self.users[name]["schedule"].update(days)
+        weekdays = {model.DAYS_OF_WEEK_SHORT.index(day) for day in days}
+        fresh = merge_plan(list(self.users.values()), self.policy, since, days=HORIZON_DAYS + 1,
+                           identity=self.identity, weekdays=weekdays)
+        # Циклы обслуживания зависят от соседних дней - их пересчитывает _load_heap
+        kept = [e for _, _, e in self.heap
+                if e["kind"] != "maintenance" and e["date"].weekday() not in weekdays]
+        self._load_heap(kept + fresh, now, since)
+
+    def _load_heap(self, events, now, since):
+        """Куча из событий плана и циклов обслуживания между ними"""
+        cycles = [c for c in maintenance.plan_cycles(events, self.policy["parsed_maintenance"])
+                  if c["time"] > max(now - MAINTENANCE_LATENESS, self.last_cycle or since)]
+        events = [e for e in events if e["time"] > now] + cycles
+        self.heap = [(e["time"], next(self.counter), e) for e in events]
+        heapq.heapify(self.heap)
+        self.cond.notify_all()
+
+    def refresh(self, only_uid=None):
+        """Пересканирование пользователей и пересборка плана при изменениях"""
+        with self.cond:
+            if self.scan_users(only_uid) or not self.heap:
+                self.rebuild()
+
+    def reload_policy(self):
+        """Перечитывание политики (SIGHUP)"""
+        with self.cond:
+            try:
+                self.policy = load_policy(self.policy_path)
+                self.power_rules.update(self.policy["parsed_power_rules"])
+                self.cpu.update(self.policy["parsed_cpu_schedule"], self.policy["parsed_cpu_profiles"])
+                self.maintenance.update(self.policy["parsed_maintenance"])
+                self.thermal.update(self.policy["parsed_thermal_rules"])
+                log("Политика перечитана")
+            except (OSError, ValueError) as e:
+                log(f"Ошибка политики, оставлена прежняя: {e}")
+            self.scan_users()
+            self.rebuild()
+
+    def next_wake(self, after):
+        """Ближайшее время включения после момента after"""
+        wakes = [e["time"] for _, _, e in self.heap if e["kind"] == "on" and e["time"] > after]
+        return min(wakes) if wakes else None
+
+    def next_maintenance(self, after, wake):
+        """Время цикла обслуживания между моментом after и включением wake"""
+        cycles = [e["time"] for _, _, e in self.heap
+                  if e["kind"] == "maintenance" and after < e["time"] < (wake or e["time"])]
+        return min(cycles) if cycles else None
+
+    def run(self):
+        """Главный цикл: ожидание ближайшего таймера из общей кучи"""
+        self.refresh()
+        while self.running:
+            with self.cond:
+                now = datetime.datetime.now()
+                if (now - self.last_scan).total_seconds() >= RESCAN_INTERVAL:
+                    if self.scan_users():
+                        self.rebuild()
+                if not self.heap:
+                    self.cond.wait(RESCAN_INTERVAL)
+                    self.rebuild()
+                    continue
+                moment, _, event = self.heap[0]
+                if moment > now:
+                    self.cond.wait(min(RESCAN_INTERVAL, (moment - now).total_seconds()))
+                    continue
+                heapq.heappop(self.heap)
+                if event["kind"] == "maintenance":
+                    self.last_cycle = event["time"]
+                if not self.heap:
+                    self.rebuild()
+                wake = self.next_wake(moment)
+                cycle = self.next_maintenance(moment, wake)
+            self.fire(event, now, wake, cycle)
+
+    def fire(self, event, now, wake, cycle=None):
+        """Выполнение события плана (cycle - время обслуживания до включения)"""
+        users = ", ".join(event["users"])
+        if event["kind"] == "on":
+            log(f"Время включения ({users})")
+            return
+        if event["kind"] == "maintenance":
+            threading.Thread(target=self.run_maintenance, args=(event,), daemon=True).start()
+            return
+        self.record(history_store.SCHEDULED, event["action"], users)
+        if now - event["time"] > MAX_LATENESS:
+            log(f"Пропущено устаревшее действие {event['action']} на {event['time']:%H:%M}")
+            self.record(history_store.FAILED, event["action"], users, "пропущено: опоздание")
+            return
+        # Машина проснется к обслуживанию раньше включения
+        wake_at = cycle or wake
+        action, decision = sleep_planner.resolve(event["action"], wake_at, now)
+        if decision is not None:
+            log(f"Авто: {sleep_planner.describe(decision)} ({decision['reason']})")
+            self.record(history_store.PLANNED, action, users,
+                        json.dumps(decision, ensure_ascii=False, default=str))
+        log(f"Выполнение по расписанию: {action} ({users})")
+        if self.dry_run:
+            return
+        if decision is not None:
+            try:
+                sleep_planner.apply_delay(decision)
+            except OSError as e:
+                log(f"Задержка гибернации не задана: {e}")
+        if wake_at and power_actions.rtc_wake_supported(self.rtc_path):
+            alarm = self.wake_alarm(action, wake_at, now)
+            try:
+                power_actions.set_rtc_wake(alarm, self.rtc_path)
+                purpose = maintenance.MAINTENANCE.lower() if cycle else "готовность"
+                log(f"Пробуждение RTC: {alarm:%Y-%m-%d %H:%M:%S} ({purpose} к {wake_at:%H:%M})")
+                if self.planner is not None:
+                    self.planner.expect(action, alarm.timestamp())
+            except OSError as e:
+                log(f"Ошибка программирования RTC: {e}")
+        ok, error = power_actions.run_action(action)
+        if ok:
+            self.record(history_store.FIRED, action, users)
+        else:
+            log(f"Ошибка выполнения {action}: {error}")
+            self.record(history_store.FAILED, action, users, error)
+
+    def run_maintenance(self, event):
+        """Цикл обслуживания и возврат в исходный режим сна (отдельный поток)"""
+        users = ", ".join(event["users"])
+        now = datetime.datetime.now()
+        if now >= event["deadline"]:
+            log(f"Обслуживание пропущено: срок {event['deadline']:%H:%M} уже прошел")
+            return
+        log(f"Обслуживание до {event['deadline']:%H:%M} ({users})")
+        results = self.maintenance.run(event["deadline"])
+        self.record(history_store.FIRED, maintenance.MAINTENANCE, users,
+                    json.dumps(results, ensure_ascii=False))
+        if self.dry_run or not results:
+            return
+        now = datetime.datetime.now()
+        if event["on"] - now < MIN_RESLEEP:
+            log(f"До включения в {event['on']:%H:%M} меньше {MIN_RESLEEP}, сон не возобновляется")
+            return
+        if self.user_active():
+            log("Пользователь работает за машиной, сон после обслуживания не возобновляется")
+            return
+        # Возврат в тот же режим сна с будильником к исходному включению
+        self.fire({"time": now, "kind": "off", "action": event["action"], "users": event["users"]},
+                  now, event["on"])
+
+    def user_active(self):
+        """Работает ли кто-то за машиной (logind и хранители экрана сеансов)"""
+        idle, _ = idle_watch.read_logind_idle()
+        return not (idle or self.idle.current()[0])
+
+    def power_action(self, action, reason):
+        """Выполнение правила питания (вызывается из потока событий питания)"""
+        source = f"питание: {reason}"
+        now = datetime.datetime.now()
+        with self.cond:
+            wake = self.next_wake(now)
+        self.record(history_store.SCHEDULED, action, source)
+        self.run_rule_action(action, source, wake, now, f"Правило питания ({reason})")
+
+    def thermal_action(self, action, reason):
+        """Действие правила перегрева: срабатывание записано thermal_event, не в расписании"""
+        now = datetime.datetime.now()
+        with self.cond:
+            wake = self.next_wake(now)
+        self.run_rule_action(action, history_store.THERMAL, wake, now, f"Перегрев ({reason})")
+
+    def run_rule_action(self, action, source, wake, now, title):
+        """Выполнение действия правила с записью решения "Авто" и результата"""
+        action, decision = sleep_planner.resolve(action, wake, now)
+        if decision is not None:
+            self.record(history_store.PLANNED, action, source,
+                        json.dumps(decision, ensure_ascii=False, default=str))
+        log(f"{title}: {action}")
+        if self.dry_run:
+            return
+        ok, error = power_actions.run_action(action)
+        if ok:
+            self.record(history_store.FIRED, action, source)
+        else:
+            log(f"Ошибка выполнения {action}: {error}")
+            self.record(history_store.FAILED, action, source, error)
+
+    def idle_changed(self, state):
+        """Итоговый простой изменился - событие для правил питания"""
+        if state is None or self.power_source is None:
+            return
+        idle, since = state
+        self.power_source.inject({"type": "idle", "idle": idle, "since": since})
+
+    def on_logind_idle(self, idle, since):
+        self.idle_changed(self.idle.set_logind(idle, since))
+
+    def thermal_event(self, event):
+        """Переход правила перегрева - в журнал службы и журнал событий"""
+        log(f"Перегрев ({event['event']}): {event['sensor']} {event['temp']}°C, "
+            f"порог {event['threshold']:g}°C, действие {event['action']}")
+        self.record(history_store.THERMAL, event["action"], event["sensor"],
+                    json.dumps(event, ensure_ascii=False))
+
+    def wake_alarm(self, action, wake, now):
+        """Момент будильника: раньше on_time на упреждение, выученное для действия"""
+        if self.planner is None:
+            return wake
+        alarm = wake - datetime.timedelta(seconds=self.planner.lead(action))
+        return min(wake, max(alarm, now + MIN_WAKE_DELAY))
+
+    def record(self, kind, action=None, source=None, detail=None):
+        """Запись в журнал событий, если он подключен"""
+        if self.history is None:
+            return
+        try:
+            self.history.record(kind, action, source, detail)
+        except Exception as e:
+            log(f"Ошибка записи в журнал: {e}")
+
+    def on_resume(self, suspended_at, resumed_at, slept):
+        """Пробуждение системы: запись периода сна в журнал"""
+        log(f"Пробуждение после сна ({slept / 60:.0f} мин)")
+        if self.history is not None:
+            self.history.record_sleep(suspended_at, resumed_at)
+        self.mark_ready(resumed_at)
+
+    def mark_ready(self, moment=None):
+        """Отметка готовности системы после пробуждения для расчета упреждения"""
+        if self.planner is None:
+            return None
+        try:
+            duration = self.planner.ready(moment)
+        except OSError as e:
+            log(f"Ошибка сохранения истории готовности: {e}")
+            return None
+        if duration is not None:
+            log(f"Готовность через {duration:.0f} с после будильника")
+        return duration
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.server:
+            self.server.stop()
+
+    # Методы API управления (вызываются из потока сервера)
+
+    def _user_by_uid(self, uid):
+        try:
+            return pwd.getpwuid(uid).pw_name
+        except KeyError:
+            raise ValueError(f"Неизвестный пользователь uid={uid}")
+
+    def rpc_status(self, peer):
+        name = self._user_by_uid(peer[1])
+        with self.cond:
+            user = self.users.get(name)
+            return {
+                "daemon": True,
+                "user": name,
+                "registered": user is not None,
+                "allowed": user_allowed(self.policy, user or {"name": name, "groups": []}),
+                "users": len(self.users),
+                "stagger_offset": round(stagger.offset(self.identity, self.policy["stagger"])),
+                "cpu_profile": self.cpu.state.profile,
+            }
+
+    def rpc_schedule_reload(self, peer):
+        self.refresh(only_uid=peer[1])
+        return self.rpc_status(peer)
+
+    def rpc_schedule_update(self, peer, days):
+        """Измененные дни расписания {день: запись} без перечитывания файла"""
+        name = self._user_by_uid(peer[1])
+        valid = {}
+        for day, entry in days.items():
+            day = model.day_key(day)
+            model.validate_day(entry)
+            valid[day] = entry
+        with self.cond:
+            user = self.users.get(name)
+            if user is not None:
+                try:
+                    # Файл уже сохранен GUI - периодическая проверка не должна читать его снова
+                    user["mtime"] = os.lstat(user["path"]).st_mtime
+                except OSError:
+                    pass
+                self.update_days(name, valid)
+                log(f"{name}: обновлены дни {', '.join(valid)}")
+        if user is None:
+            # Пользователь еще не известен службе - полное чтение его файла
+            self.refresh(only_uid=peer[1])
+        return self.rpc_status(peer)
+
+    def rpc_schedule_get(self, peer):
+        name = self._user_by_uid(peer[1])
+        with self.cond:
+            user = self.users.get(name)
+            return {"schedule": user["schedule"] if user else None}
+
+    def rpc_fires_next(self, peer, count=10):
+        name = self._user_by_uid(peer[1])
+        with self.cond:
+            events = [e for _, _, e in heapq.nsmallest(int(count), self.heap)]
+        # Чужие имена видит только root
+        return {"fires": [
+            {"time": e["time"].isoformat(), "kind": e["kind"], "action": e["action"],
+             "mine": name in e["users"],
+             **({"users": e["users"]} if peer[1] == 0 else {})}
+            for e in events
+        ]}
+
+    def rpc_wake_ready(self, peer):
+        # GUI пользователя загрузил автозапуск - машина готова к работе
+        return {"duration": self.mark_ready()}
+
+    def rpc_wake_lead(self):
+        return {"leads": self.planner.report() if self.planner else {}}
+
+    def rpc_maintenance_plan(self):
+        with self.cond:
+            cycles = [e for _, _, e in sorted(self.heap) if e["kind"] == "maintenance"]
+        if not cycles:
+            return {"cycle": None}
+        cycle = cycles[0]
+        planned, deferred = self.maintenance.plan((cycle["deadline"] - cycle["time"]).total_seconds())
+        return {
+            "cycle": {"time": cycle["time"].isoformat(), "deadline": cycle["deadline"].isoformat(),
+                      "action": cycle["action"]},
+            "jobs": [{"name": job["name"], "class": job["class"], "start": round(start),
+                      "end": round(end)} for job, start, end in planned],
+            "deferred": [job["name"] for job in deferred],
+            "stats": self.maintenance.stats.report(),
+        }
+
+    def rpc_thermal_status(self):
+        return self.thermal.status()
+
+    def rpc_policy_get(self):
+        return {key: value for key, value in self.policy.items() if not key.startswith("parsed_")}
+
+    def rpc_power_state(self):
+        return {"state": dict(self.power_source.state) if self.power_source else None}
+
+    def rpc_idle_report(self, peer, active):
+        # Хранитель экрана сеанса пользователя; None - сеанс закрывается
+        if active is not None and not isinstance(active, bool):
+            raise ValueError("active: нужно true, false или null")
+        self.idle_changed(self.idle.set_saver(peer[1], active))
+        idle, since = self.idle.current()
+        return {"idle": idle, "since": since}
+
+    def rpc_power_inject(self, peer, event):
+        # Синтетические события могут усыпить машину - только root
+        if peer[1] != 0:
+            raise ValueError("Внедрять события питания может только root")
+        if not isinstance(event, dict) or event.get("type") not in ("ac", "battery", "lid", "idle"):
+            raise ValueError(f"Неверное событие питания: {event}")
+        if self.power_source is None:
+            raise ValueError("Источник событий питания не запущен")
+        self.power_source.inject(event)
+        return {"injected": event}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Системная служба TimeMaster")
+    parser.add_argument("--policy", default=POLICY_FILE, help="файл политики администратора")
+    parser.add_argument("--socket", default=model.DAEMON_SOCKET, help="сокет управления")
+    parser.add_argument("--dry-run", action="store_true", help="не выполнять действия, только журнал")
+    parser.add_argument("--history", default=HISTORY_FILE,
+                        help="журнал событий SQLite ('' - не вести)")
+    parser.add_argument("--wake-state", default=wake_planner.STATE_FILE,
+                        help="история готовности для упреждения пробуждения ('' - без упреждения)")
+    parser.add_argument("--maintenance-stats", default=maintenance.STATS_FILE,
+                        help="длительности заданий обслуживания")
+    args = parser.parse_args(argv)
+
+    if os.geteuid() != 0 and not args.dry_run:
+        print("Служба должна работать от root (или используйте --dry-run)", file=sys.stderr)
+        return 1
+
+    history = history_store.HistoryStore(args.history) if args.history else None
+    planner = wake_planner.WakePlanner(args.wake_state) if args.wake_state else None
+    daemon = ScheduleDaemon(args.policy, args.socket, dry_run=args.dry_run, history=history,
+                            planner=planner, maintenance_stats=args.maintenance_stats)
+    os.makedirs(os.path.dirname(args.socket), mode=0o755, exist_ok=True)
+    # Подключаться может любой пользователь, права проверяются по SO_PEERCRED
+    daemon.server = control_api.ControlServer(args.socket, daemon, mode=0o666)
+    daemon.server.start()
+
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=daemon.reload_policy).start())
+    watcher = power_actions.ResumeWatcher(daemon.on_resume)
+    watcher.start()
+    daemon.power_source = power_events.PowerEventSource(daemon.power_rules.handle)
+    daemon.power_source.start()
+    idle = idle_watch.LogindIdle(daemon.on_logind_idle)
+    idle.start()
+    daemon.cpu.start()
+    daemon.thermal.start()
+    log(f"Служба запущена, сокет {args.socket}")
+    # Запуск службы после загрузки - первая отметка готовности после выключения
+    daemon.mark_ready()
+    daemon.run()
+    daemon.thermal.stop()
+    daemon.cpu.stop()
+    idle.stop()
+    daemon.power_source.stop()
+    watcher.stop()
+    log("Служба остановлена")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Сторож цикла событий Tk и профилирование работающего GUI по запросу
+
+LoopWatchdog ставит в цикл Tk короткий "пульс" (after каждые interval
+секунд) и измеряет, насколько он опаздывает. Фоновый поток замечает, что
+пульса нет дольше threshold, и один раз за зависание записывает стек
+главного потока - видно, какой обработчик держит цикл (диалог
+подтверждения, перестроение списка задач и т.п.). Когда цикл оживает,
+в журнал пишется длительность зависания.
+
+Diagnostics снимает профиль cProfile главного потока и снимки tracemalloc:
+    SIGUSR1 - начать/закончить профиль (результат: .pstats и текстовая сводка)
+    SIGUSR2 - снимок памяти (первый сигнал включает tracemalloc)
+Те же действия доступны через API управления GUI (debug.profile,
+debug.memory, debug.stats) и команды этого файла.
+
+Без запросов накладные расходы - один after и одно пробуждение потока
+за interval; cProfile и tracemalloc включаются только по запросу.
+
+Примеры:
+    python3 tk_watchdog.py profile --pid 1234          # повторить, чтобы остановить
+    python3 tk_watchdog.py profile --socket ~/.config/timemaster/timemaster.sock --seconds 20
+    python3 tk_watchdog.py memory --pid 1234
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import signal
+import cProfile
+import argparse
+import datetime
+import threading
+import traceback
+import tracemalloc
+
+from control_client import ControlClient, ControlError
+
+DEBUG_DIR = os.path.expanduser("~/.cache/timemaster/debug")
+STALL_THRESHOLD = 0.5
+HEARTBEAT = 0.2
+TRACE_FRAMES = 10
+TOP_LINES = 30
+
+
+def _log(message):
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def dump_path(directory, prefix, suffix):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"{prefix}-{stamp}-{os.getpid()}{suffix}")
+
+
+class LoopWatchdog:
+    """Измерение задержки цикла Tk и стек главного потока при зависании"""
+
+    def __init__(self, widget, dump_dir=DEBUG_DIR, threshold=STALL_THRESHOLD, interval=HEARTBEAT, log=_log):
+        self.widget = widget
+        self.dump_dir = dump_dir
+        self.threshold = threshold
+        self.interval = interval
+        self.log = log
+        self.main_ident = None
+        self.last_beat = 0.0
+        self.dumped_at = None  # пульс, на котором уже снят стек
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_dump = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """Вызывается из главного потока (в нем работает цикл Tk)"""
+        self.main_ident = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.widget.after(int(self.interval * 1000), self._beat)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = now - self.last_beat - self.interval
+        self.last_beat = now
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if lag > self.threshold:
+            self.stalls += 1
+            self.log(f"Цикл Tk не отвечал {lag + self.interval:.2f} с")
+        if not self.stop_event.is_set():
+            self.widget.after(int(self.interval * 1000), self._beat)
+
+    def _watch(self):
+        while not self.stop_event.wait(self.interval):
+            beat = self.last_beat
+            if time.monotonic() - beat - self.interval > self.threshold and self.dumped_at != beat:
+                self.dumped_at = beat
+                self.dump_stack()
+
+    def dump_stack(self):
+        """Запись стека главного потока в файл, путь к файлу"""
+        frame = sys._current_frames().get(self.main_ident)
+        if frame is None:
+            return None
+        text = "".join(traceback.format_stack(frame))
+        try:
+            path = dump_path(self.dump_dir, "stall", ".txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            self.log(f"Стек зависания не записан: {e}\n{text}")
+            return None
+        self.last_dump = path
+        self.log(f"Цикл Tk завис, стек главного потока: {path}")
+        return path
+
+    def stats(self):
+        return {"stalls": self.stalls, "max_lag": round(self.max_lag, 3), "last_dump": self.last_dump}
+
+
+class Diagnostics:
+    """cProfile и tracemalloc по сигналу или запросу"""
+
+    def __init__(self, dump_dir=DEBUG_DIR, log=_log):
+        self.dump_dir = dump_dir
+        self.log = log
+        self.profile = None
+        self.snapshot = None
+
+    def install_signals(self):
+        """Обработчики SIGUSR1/SIGUSR2 (только из главного потока)"""
+        signal.signal(signal.SIGUSR1, lambda *_: self.toggle_profile())
+        signal.signal(signal.SIGUSR2, lambda *_: self.memory_snapshot())
+
+    def start_profile(self):
+        """Начало профиля; профилируется поток, из которого вызван метод"""
+        if self.profile is not None:
+            return False
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        self.log("Профилирование начато")
+        return True
+
+    def stop_profile(self):
+        """Конец профиля: .pstats и текстовая сводка рядом, путь к .pstats"""
+        if self.profile is None:
+            return None
+        profile, self.profile = self.profile, None
+        profile.disable()
+        try:
+            path = dump_path(self.dump_dir, "profile", ".pstats")
+            profile.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(TOP_LINES)
+            with open(path[:-len(".pstats")] + ".txt", "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+        except OSError as e:
+            self.log(f"Ошибка записи профиля: {e}")
+            return None
+        self.log(f"Профиль записан: {path}")
+        return path
+
+    def toggle_profile(self):
+        if self.profile is None:
+            self.start_profile()
+        else:
+            self.stop_profile()
+
+    def profile_for(self, widget, seconds):
+        """Профиль цикла Tk на seconds секунд (из любого потока)"""
+        widget.after(0, self.start_profile)
+        widget.after(int(seconds * 1000), self.stop_profile)
+        return {"seconds": seconds, "dir": self.dump_dir}
+
+    def memory_snapshot(self):
+        """Снимок памяти и сравнение с предыдущим, путь к сводке; None при первом вызове"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.log("tracemalloc включен, следующий запрос запишет снимок")
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        try:
+            path = dump_path(self.dump_dir, "memory", ".txt")
+            snapshot.dump(path[:-len(".txt")] + ".tracemalloc")
+            current, peak = tracemalloc.get_traced_memory()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"Сейчас {current / 1e6:.1f} МБ, пик {peak / 1e6:.1f} МБ\n\nКрупнейшие места:\n")
+                for stat in snapshot.statistics("lineno")[:TOP_LINES]:
+                    f.write(f"{stat}\n")
+                if self.snapshot is not None:
+                    f.write("\nРост с прошлого снимка:\n")
+                    for stat in snapshot.compare_to(self.snapshot, "lineno")[:TOP_LINES]:
+                        f.write(f"{stat}\n")
+        except OSError as e:
+            self.log(f"Ошибка записи снимка памяти: {e}")
+            return None
+        self.snapshot = snapshot
+        self.log(f"Снимок памяти записан: {path}")
+        return path
+
+
+def cmd_profile(args):
+    if args.pid:
+        os.kill(args.pid, signal.SIGUSR1)
+        print(f"Профиль переключен в процессе {args.pid}, результат в {args.dir}")
+        return 0
+    with ControlClient(args.socket) as client:
+        print(client.call("debug.profile", seconds=args.seconds))
+    return 0
+
+
+def cmd_memory(args):
+    if args.pid:
+        os.kill(args.pid, signal.SIGUSR2)
+        print(f"Снимок памяти запрошен у процесса {args.pid}, результат в {args.dir}")
+        return 0
+    with ControlClient(args.socket) as client:
+        print(client.call("debug.memory"))
+    return 0
+
+
+def cmd_stats(args):
+    with ControlClient(args.socket) as client:
+        print(client.call("debug.stats"))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Профилирование работающего GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, func, help_text in (("profile", cmd_profile, "профиль cProfile главного потока"),
+                                  ("memory", cmd_memory, "снимок tracemalloc"),
+                                  ("stats", cmd_stats, "статистика зависаний цикла Tk")):
+        command = commands.add_parser(name, help=help_text)
+        target = command.add_mutually_exclusive_group(required=True)
+        if name != "stats":
+            target.add_argument("--pid", type=int, help="процесс GUI (сигнал SIGUSR1/SIGUSR2)")
+        target.add_argument("--socket", help="сокет API управления GUI")
+        command.add_argument("--seconds", type=float, default=10, help="длительность профиля через API")
+        command.add_argument("--dir", default=DEBUG_DIR, help="каталог результатов (для подсказки)")
+        command.set_defaults(func=func, pid=None)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ControlError) as e:
+        print(f"tk_watchdog: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Упреждение пробуждения по измеренному времени готовности
+
+on_time - момент, когда машина должна быть готова к работе (рабочий стол
+и программы автозапуска загружены), а не момент срабатывания RTC.
+Планировщик хранит скользящую историю длительностей "будильник RTC ->
+готовность" отдельно для хоста и действия, которым машина была усыплена
+(после сна готовность наступает быстрее, чем после выключения), и
+программирует будильник раньше on_time на p95 этих длительностей.
+
+Цикл измерения:
+    expect(action, wake_at)  - перед уходом в сон с будильником;
+    ready(moment)            - служба запустилась/система проснулась, GUI
+                               пользователя загрузил автозапуск; берется
+                               самая поздняя отметка в пределах READY_WINDOW;
+    lead(action)             - текущее упреждение в секундах.
+"""
+import os
+import json
+import time
+import socket
+import tempfile
+import threading
+
+from schedule_model import SUSPEND_THEN_HIBERNATE, HYBRID_SLEEP
+
+STATE_FILE = "/var/lib/timemaster/wake-lead.json"
+# Длительностей в истории на пару (хост, действие)
+HISTORY_SIZE = 50
+# Меньше замеров - используем упреждение по умолчанию
+MIN_SAMPLES = 3
+# Отметки готовности позже этого срока после будильника не относятся к пробуждению
+READY_WINDOW = 30 * 60
+# Запас сверх p95 и пределы упреждения, секунды
+MARGIN = 15
+MIN_LEAD = 30
+MAX_LEAD = 20 * 60
+DEFAULT_LEAD = {
+    "Сон": 60,
+    "Гибернация": 180,
+    "Выключить": 300,
+}
+# Режимы "Авто" учитываются вместе с режимом, из которого машина просыпается
+# (сон с гибернацией до будильника успевает уйти в гибернацию)
+LEAD_GROUPS = {
+    SUSPEND_THEN_HIBERNATE: "Гибернация",
+    HYBRID_SLEEP: "Сон",
+}
+
+
+def percentile(values, fraction):
+    """Перцентиль с линейной интерполяцией"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class WakePlanner:
+    """История готовности и расчет упреждения будильника RTC"""
+
+    def __init__(self, path=STATE_FILE, host=None, clock=time.time):
+        self.path = path
+        self.host = host or socket.gethostname()
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = {"samples": {}, "pending": None}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            self.state["samples"] = loaded.get("samples", {})
+            self.state["pending"] = loaded.get("pending")
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, action):
+        return f"{self.host}:{LEAD_GROUPS.get(action, action)}"
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".wake-lead-")
+        try:
+            # Файл читают и GUI пользователей (оценка задержек для "Авто")
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _finalize(self, now, force=False):
+        """Перенос завершенного замера в историю"""
+        pending = self.state["pending"]
+        if pending is None:
+            return False
+        if not force and now - pending["wake_at"] <= READY_WINDOW:
+            return False
+        self.state["pending"] = None
+        if pending.get("ready") is not None:
+            samples = self.state["samples"].setdefault(self._key(pending["action"]), [])
+            samples.append(round(pending["ready"], 1))
+            del samples[:-HISTORY_SIZE]
+        return True
+
+    def expect(self, action, wake_at):
+        """Перед уходом в сон: будильник установлен на wake_at (секунды эпохи)"""
+        with self.lock:
+            self._finalize(self.clock(), force=True)
+            self.state["pending"] = {"action": action, "wake_at": wake_at, "ready": None}
+            self._save()
+
+    def ready(self, moment=None):
+        """Отметка готовности; возвращает длительность от будильника или None"""
+        moment = self.clock() if moment is None else moment
+        with self.lock:
+            pending = self.state["pending"]
+            if pending is None:
+                return None
+            duration = moment - pending["wake_at"]
+            if duration < 0 or duration > READY_WINDOW:
+                # Проснулись раньше будильника (вручную) или отметка слишком поздняя
+                if self._finalize(moment):
+                    self._save()
+                return None
+            pending["ready"] = max(pending["ready"] or 0, duration)
+            self._save()
+            return duration
+
+    def samples(self, action):
+        with self.lock:
+            if self._finalize(self.clock()):
+                self._save()
+            return list(self.state["samples"].get(self._key(action), []))
+
+    def lead(self, action):
+        """Упреждение будильника в секундах для действия, которым машина усыплена"""
+        history = self.samples(action)
+        if len(history) < MIN_SAMPLES:
+            return DEFAULT_LEAD.get(LEAD_GROUPS.get(action, action), DEFAULT_LEAD["Выключить"])
+        return int(min(MAX_LEAD, max(MIN_LEAD, percentile(history, 0.95) + MARGIN)))
+
+    def report(self):
+        """Упреждение и число замеров по действиям этого хоста"""
+        return {
+            action: {"lead": self.lead(action), "samples": len(self.samples(action))}
+            for action in DEFAULT_LEAD
+        }
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""Пробуждение парка машин по Wake-on-LAN
+
+Для машин, которые выключаются полностью и не могут проснуться по RTC:
+сервер держит список групп (MAC, широковещательный адрес, расписание
+включения) и к каждому on_time группы (раньше на упреждение lead) рассылает
+"магические" пакеты. Отправка идет через неблокирующие UDP-сокеты
+всплесками по BURST пакетов с паузой BURST_INTERVAL - чтобы не забить
+коммутаторы и не потерять пакеты в очереди. Каждому хосту за попытку
+уходит COPIES копий пакета.
+
+Проснувшимся считается хост, который отвечает на TCP-подключение к
+check_port (отказ в подключении - тоже ответ: система загружена; с
+"check_open": true засчитывается только принятое подключение). Хосты,
+не ответившие за retry_after секунд, будят повторно (до RETRIES раз).
+Итоги по хостам копятся в STATS_FILE, команда report показывает долю
+успешных пробуждений по группам.
+
+Пример списка (/etc/timemaster/wol-roster.json):
+    {
+        "groups": {
+            "lab-1": {
+                "schedule": {"Пн": {"enabled": true, "on_time": "08:00",
+                                    "off_time": null, "action": "Выключить"}},
+                "lead": 300,
+                "hosts": [{"name": "pc-01", "mac": "aa:bb:cc:dd:ee:01",
+                           "broadcast": "10.0.1.255", "address": "10.0.1.11"}]
+            }
+        }
+    }
+schedule - недельная таблица TimeMaster (используется только on_time).
+
+Примеры:
+    sudo python3 wol_waker.py run
+    python3 wol_waker.py wake lab-1
+    python3 wol_waker.py report
+    python3 wol_waker.py selftest -n 50   # проверка на loopback без реальных машин
+"""
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+import argparse
+import datetime
+import tempfile
+import selectors
+import threading
+
+import schedule_model as model
+import wake_planner
+
+ROSTER_FILE = "/etc/timemaster/wol-roster.json"
+STATS_FILE = "/var/lib/timemaster/wol-stats.json"
+WOL_PORT = 9
+CHECK_PORT = 22
+# Пакетов во всплеске и пауза между всплесками, секунды
+BURST = 32
+BURST_INTERVAL = 0.5
+COPIES = 3
+# Повторное пробуждение не ответивших хостов
+RETRY_AFTER = 180
+RETRIES = 2
+PROBE_INTERVAL = 10
+PROBE_TIMEOUT = 2.0
+# Упреждение по умолчанию - время загрузки после выключения
+DEFAULT_LEAD = wake_planner.DEFAULT_LEAD["Выключить"]
+# Сколько последних пробуждений хоста хранить
+KEEP_RESULTS = 30
+# Рассылку, опоздавшую больше этого срока (сервер спал), пропускаем
+MAX_LATENESS = datetime.timedelta(minutes=10)
+
+
+def log(message):
+    """Журнал службы (stdout попадает в journald)"""
+    timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+    print(f"{timestamp} {message}", flush=True)
+
+
+def parse_mac(mac):
+    """MAC в любом из видов aa:bb:.., aa-bb-.., aabb.ccdd.. -> 6 байт"""
+    digits = "".join(ch for ch in str(mac) if ch not in ":-.")
+    if len(digits) != 12:
+        raise ValueError(f"Неверный MAC-адрес: {mac}")
+    try:
+        return bytes.fromhex(digits)
+    except ValueError:
+        raise ValueError(f"Неверный MAC-адрес: {mac}")
+
+
+def magic_packet(mac):
+    """Магический пакет: 6 байт 0xFF и 16 повторов MAC"""
+    return b"\xff" * 6 + parse_mac(mac) * 16
+
+
+def load_roster(path=ROSTER_FILE):
+    """Чтение и проверка списка групп, ValueError при ошибке"""
+    with open(path, "r", encoding="utf-8") as f:
+        roster = json.load(f)
+    groups = roster.get("groups")
+    if not isinstance(groups, dict):
+        raise ValueError("В списке нет раздела groups")
+    for name, group in groups.items():
+        schedule = group.get("schedule", {})
+        for day, entry in schedule.items():
+            if day not in model.DAYS_OF_WEEK_SHORT:
+                raise ValueError(f"{name}: неизвестный день {day}")
+            model.validate_day({"action": "Выключить", "off_time": None, **entry})
+        names = set()
+        for host in group.get("hosts", []):
+            parse_mac(host.get("mac"))
+            if not host.get("name") or host["name"] in names:
+                raise ValueError(f"{name}: у хоста нет имени или имя повторяется")
+            names.add(host["name"])
+    return roster
+
+
+def group_wakes(roster, after):
+    """Первые моменты рассылки групп позже after: [(момент, группа, on_time)]"""
+    wakes = []
+    for name, group in roster["groups"].items():
+        lead = datetime.timedelta(seconds=group.get("lead", DEFAULT_LEAD))
+        schedule = {day: {"action": "Выключить", "off_time": None, **entry}
+                    for day, entry in group.get("schedule", {}).items()}
+        moment = model.next_on_time(schedule, after + lead)
+        if moment is not None:
+            wakes.append((moment - lead, name, moment))
+    return sorted(wakes)
+
+
+class PacketSender:
+    """Отправка пакетов через неблокирующий UDP-сокет всплесками ограниченного размера"""
+
+    def __init__(self, burst=BURST, interval=BURST_INTERVAL, clock=time.monotonic, sleep=time.sleep):
+        self.burst = burst
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.next_burst = 0.0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_WRITE)
+
+    def send(self, packets):
+        """Отправка [(данные, (адрес, порт))]; возвращает число ошибок
+
+        Всплески общие для всех групп: одновременные рассылки идут по очереди.
+        """
+        errors = 0
+        with self.lock:
+            for start in range(0, len(packets), self.burst):
+                delay = self.next_burst - self.clock()
+                if delay > 0:
+                    self.sleep(delay)
+                for payload, target in packets[start:start + self.burst]:
+                    if not self._send_one(payload, target):
+                        errors += 1
+                self.next_burst = self.clock() + self.interval
+        return errors
+
+    def _send_one(self, payload, target):
+        while True:
+            try:
+                self.sock.sendto(payload, target)
+                return True
+            except BlockingIOError:
+                # Буфер отправки полон - ждем, пока освободится
+                self.selector.select(1.0)
+            except OSError as e:
+                log(f"Ошибка отправки на {target[0]}:{target[1]}: {e}")
+                return False
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+
+def probe(hosts, timeout=PROBE_TIMEOUT):
+    """Имена хостов, ответивших на TCP-подключение (неблокирующие connect всем сразу)"""
+    selector = selectors.DefaultSelector()
+    answered = set()
+    for host in hosts:
+        if not host.get("address"):
+            continue
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        accepted = (0,) if host.get("check_open") else (0, errno.ECONNREFUSED)
+        code = sock.connect_ex((host["address"], host.get("check_port", CHECK_PORT)))
+        if code in accepted:
+            answered.add(host["name"])
+            sock.close()
+        elif code in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            selector.register(sock, selectors.EVENT_WRITE, (host["name"], accepted))
+        else:
+            sock.close()
+    deadline = time.monotonic() + timeout
+    while selector.get_map():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        for key, _ in selector.select(left):
+            name, accepted = key.data
+            if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) in accepted:
+                answered.add(name)
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    selector.close()
+    return answered
+
+
+def wake_hosts(hosts, sender, retries=RETRIES, retry_after=RETRY_AFTER,
+               probe_interval=PROBE_INTERVAL, copies=COPIES, prober=probe,
+               clock=time.monotonic, wait=time.sleep):
+    """Пробуждение хостов с повторами: {имя: {"attempts", "up", "seconds"}}
+
+    Хосты без address нельзя проверить: им уходит одна попытка, up = None.
+    """
+    start = clock()
+    results = {host["name"]: {"attempts": 0, "up": None if not host.get("address") else False,
+                              "seconds": None} for host in hosts}
+    pending = list(hosts)
+    for attempt in range(retries + 1):
+        packets = []
+        for host in pending:
+            results[host["name"]]["attempts"] += 1
+            target = (host.get("broadcast", "255.255.255.255"), host.get("port", WOL_PORT))
+            packets += [(magic_packet(host["mac"]), target)] * copies
+        sender.send(packets)
+        pending = [host for host in pending if host.get("address")]
+        deadline = clock() + retry_after
+        while pending:
+            for name in prober(pending):
+                results[name]["up"] = True
+                results[name]["seconds"] = round(clock() - start, 1)
+            pending = [host for host in pending if not results[host["name"]]["up"]]
+            if not pending or clock() >= deadline:
+                break
+            wait(min(probe_interval, max(0.0, deadline - clock())))
+        if not pending:
+            break
+    return results
+
+
+class WakeStats:
+    """Итоги пробуждений по хостам и доля успешных по группам"""
+
+    def __init__(self, path=STATS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.hosts = json.load(f)
+        except (OSError, ValueError):
+            self.hosts = {}
+
+    def add(self, group, results, moment=None):
+        moment = (moment or datetime.datetime.now()).isoformat(timespec="seconds")
+        with self.lock:
+            for name, result in results.items():
+                history = self.hosts.setdefault(f"{group}/{name}", [])
+                history.append({"time": moment, **result})
+                del history[:-KEEP_RESULTS]
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".wol-stats-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.hosts, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def report(self):
+        """{группа: {"wakes", "up", "ratio", "first_try", "median_seconds"}}"""
+        groups = {}
+        with self.lock:
+            for key, history in self.hosts.items():
+                group = key.split("/", 1)[0]
+                entry = groups.setdefault(group, {"wakes": 0, "up": 0, "first_try": 0, "times": []})
+                for result in history:
+                    if result["up"] is None:
+                        continue  # хост без адреса - результат неизвестен
+                    entry["wakes"] += 1
+                    if result["up"]:
+                        entry["up"] += 1
+                        entry["first_try"] += result["attempts"] == 1
+                        entry["times"].append(result["seconds"])
+        for entry in groups.values():
+            times = sorted(entry.pop("times"))
+            entry["ratio"] = entry["up"] / entry["wakes"] if entry["wakes"] else None
+            entry["median_seconds"] = times[len(times) // 2] if times else None
+        return groups
+
+
+class FleetWaker:
+    """Сервер: рассылка пакетов группам по их расписанию"""
+
+    def __init__(self, roster_path=ROSTER_FILE, stats=None, sender=None, dry_run=False):
+        self.roster_path = roster_path
+        self.roster = load_roster(roster_path)
+        self.stats = stats
+        self.sender = sender or PacketSender()
+        self.dry_run = dry_run
+        self.changed = threading.Event()
+        self.stop_event = threading.Event()
+
+    def reload(self):
+        """Перечитывание списка (SIGHUP)"""
+        try:
+            self.roster = load_roster(self.roster_path)
+            log("Список групп перечитан")
+        except (OSError, ValueError) as e:
+            log(f"Ошибка списка групп, оставлен прежний: {e}")
+        self.changed.set()
+
+    def wake_group(self, name):
+        """Пробуждение группы с повторами и записью итогов"""
+        group = self.roster["groups"][name]
+        hosts = group.get("hosts", [])
+        log(f"Пробуждение группы {name}: {len(hosts)} хостов")
+        if self.dry_run:
+            return {}
+        results = wake_hosts(hosts, self.sender,
+                             retries=group.get("retries", RETRIES),
+                             retry_after=group.get("retry_after", RETRY_AFTER))
+        up = sum(1 for result in results.values() if result["up"])
+        checked = sum(1 for result in results.values() if result["up"] is not None)
+        log(f"Группа {name}: проснулись {up} из {checked} проверяемых")
+        missing = [host for host, result in results.items() if result["up"] is False]
+        if missing:
+            log(f"Группа {name}: не ответили {', '.join(sorted(missing))}")
+        if self.stats:
+            self.stats.add(name, results)
+        return results
+
+    def run(self):
+        """Главный цикл: ожидание ближайшей рассылки"""
+        after = datetime.datetime.now()
+        while not self.stop_event.is_set():
+            now = datetime.datetime.now()
+            wakes = group_wakes(self.roster, after)
+            if not wakes:
+                self.changed.wait(3600)
+                self.changed.clear()
+                continue
+            moment, _, on_time = wakes[0]
+            delay = (moment - now).total_seconds()
+            if delay > 0:
+                # Пересчет не реже раза в минуту: часы могли перевести или список изменился
+                self.changed.wait(min(delay, 60))
+                self.changed.clear()
+                continue
+            due = [group for when, group, _ in wakes if when == moment]
+            after = moment
+            if now - moment > MAX_LATENESS:
+                log(f"Пропущена устаревшая рассылка на {on_time:%H:%M}: {', '.join(due)}")
+                continue
+            log(f"Включение {on_time:%H:%M}: группы {', '.join(due)}")
+            for group in due:
+                threading.Thread(target=self.wake_group, args=[group], daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.changed.set()
+
+
+class FakeHost:
+    """Хост для проверки на loopback: принимает магические пакеты и "загружается"
+
+    После пакета со своим MAC через boot_delay секунд открывает TCP-порт.
+    drop_first - сколько первых пакетов потерять (проверка повторов),
+    None - хост не просыпается никогда.
+    """
+
+    def __init__(self, name, mac, boot_delay=0.2, drop_first=0):
+        self.name = name
+        self.mac = parse_mac(mac)
+        self.boot_delay = boot_delay
+        self.drop_first = drop_first
+        self.received = 0
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", 0))
+        self.udp.settimeout(0.2)
+        self.tcp = None
+        # Порт проверки резервируем заранее, слушать начинаем после "загрузки"
+        probe_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe_sock.bind(("127.0.0.1", 0))
+        self.check_port = probe_sock.getsockname()[1]
+        self.pending_tcp = probe_sock
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def roster_entry(self):
+        # На loopback закрытый порт отвечает отказом, поэтому нужен именно прием подключения
+        return {"name": self.name, "mac": self.mac.hex(":"), "broadcast": "127.0.0.1",
+                "port": self.udp.getsockname()[1], "address": "127.0.0.1",
+                "check_port": self.check_port, "check_open": True}
+
+    def _run(self):
+        while self.running:
+            try:
+                data = self.udp.recv(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if data != b"\xff" * 6 + self.mac * 16:
+                continue
+            self.received += 1
+            if self.drop_first is None or self.received <= self.drop_first or self.tcp:
+                continue
+            time.sleep(self.boot_delay)
+            self.tcp = self.pending_tcp
+            self.tcp.listen(8)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.udp.close()
+        self.pending_tcp.close()
+
+
+def cmd_run(args):
+    stats = WakeStats(args.stats) if args.stats else None
+    waker = FleetWaker(args.roster, stats, dry_run=args.dry_run)
+    signal.signal(signal.SIGTERM, lambda *_: waker.stop())
+    signal.signal(signal.SIGINT, lambda *_: waker.stop())
+    signal.signal(signal.SIGHUP, lambda *_: waker.reload())
+    log(f"Сервер Wake-on-LAN запущен, групп: {len(waker.roster['groups'])}")
+    waker.run()
+    log("Сервер Wake-on-LAN остановлен")
+    return 0
+
+
+def cmd_wake(args):
+    stats = WakeStats(args.stats) if args.stats else None
+    waker = FleetWaker(args.roster, stats)
+    for name in args.groups:
+        if name not in waker.roster["groups"]:
+            raise ValueError(f"Группа не найдена: {name}")
+    for name in args.groups:
+        waker.wake_group(name)
+    return 0
+
+
+def print_report(report):
+    print(f"{'Группа':<20}{'Пробуждений':>12}{'Успешно':>10}{'Доля':>8}{'С 1-й попытки':>15}{'Медиана, с':>12}")
+    for group, entry in sorted(report.items()):
+        ratio = f"{entry['ratio']:.0%}" if entry["ratio"] is not None else "-"
+        median = f"{entry['median_seconds']:.0f}" if entry["median_seconds"] is not None else "-"
+        print(f"{group:<20}{entry['wakes']:>12}{entry['up']:>10}{ratio:>8}{entry['first_try']:>15}{median:>12}")
+
+
+def cmd_report(args):
+    report = WakeStats(args.stats).report()
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    return 0
+
+
+def cmd_selftest(args):
+    """Проверка на loopback: часть хостов теряет первые пакеты, часть не просыпается"""
+    hosts = []
+    for index in range(args.count):
+        drop = None if index % 10 == 9 else (1 if index % 3 == 0 else 0)
+        hosts.append(FakeHost(f"fake-{index:03d}", f"02:00:00:00:{index // 256:02x}:{index % 256:02x}",
+                              drop_first=drop and drop * COPIES))
+    for host in hosts:
+        host.start()
+    sender = PacketSender(burst=args.burst, interval=args.burst_interval)
+    start = time.monotonic()
+    try:
+        results = wake_hosts([host.roster_entry() for host in hosts], sender, retries=2,
+                             retry_after=1.0, probe_interval=0.2, prober=lambda h: probe(h, 0.5))
+    finally:
+        sender.close()
+        for host in hosts:
+            host.stop()
+    stats = WakeStats(os.path.join(tempfile.mkdtemp(prefix="wol-selftest-"), "stats.json"))
+    stats.add("selftest", results)
+    print(f"Хостов: {len(hosts)}, время: {time.monotonic() - start:.1f} с")
+    print_report(stats.report())
+    expected = sum(1 for index in range(args.count) if index % 10 != 9)
+    up = sum(1 for result in results.values() if result["up"])
+    print("OK" if up == expected else f"Ошибка: проснулись {up}, ожидалось {expected}")
+    return 0 if up == expected else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пробуждение машин по Wake-on-LAN")
+    parser.add_argument("--roster", default=ROSTER_FILE, help="список групп и хостов")
+    parser.add_argument("--stats", default=STATS_FILE, help="итоги пробуждений ('' - не вести)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="сервер: пробуждение групп по расписанию")
+    run.add_argument("--dry-run", action="store_true", help="только журнал, без пакетов")
+    run.set_defaults(func=cmd_run)
+
+    wake = commands.add_parser("wake", help="разбудить группы сейчас")
+    wake.add_argument("groups", nargs="+")
+    wake.set_defaults(func=cmd_wake)
+
+    report = commands.add_parser("report", help="доля успешных пробуждений по группам")
+    report.add_argument("--json", action="store_true")
+    report.set_defaults(func=cmd_report)
+
+    selftest = commands.add_parser("selftest", help="проверка на loopback с имитацией хостов")
+    selftest.add_argument("-n", "--count", type=int, default=20)
+    selftest.add_argument("--burst", type=int, default=BURST)
+    selftest.add_argument("--burst-interval", type=float, default=0.05)
+    selftest.set_defaults(func=cmd_selftest)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"wol_waker: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())